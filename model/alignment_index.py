@@ -0,0 +1,247 @@
+import os
+import re
+from array import array
+import numpy as np
+from model.compressed_file import CompressedFile
+
+
+class AlignmentIndex:
+    """Sidecar index of the line structure of a generated alignment file
+
+       The index stores the byte offset of every line together with its
+       kind (separator, file header, source or target line) and the
+       ID of every (src)/(trg) line. It is written once next to the
+       alignment file and rebuilt automatically whenever size or
+       modification time of the alignment file change.
+    """
+    # kinds of lines in alignment files
+    OTHER = 0
+    SEPARATOR = 1
+    HEADER = 2
+    SRC = 3
+    TRG = 4
+    # kind of lines selected by the (src) and (trg) patterns of the search classes
+    LINE_PATTERNS = {r'\(src\)="[0-9]+">': SRC, r'\(trg\)="[0-9]+">': TRG}
+    # suffix of the directory holding all sidecar files of an alignment file
+    SIDECAR_SUFFIX = ".opusidx"
+    # increase whenever the layout of the stored arrays changes
+    VERSION = 1
+    # annotations (_#POS_#lemma) of parsed files
+    __annotation = re.compile(rb'_#[^ ]*')
+
+    def __init__(self, path, rebuild=False):
+        self.__path = path
+        self.__index_path = self.sidecar_path(path, "segments.npz")
+        self.__offsets = None
+        self.__kinds = None
+        self.__ids = None
+        self.__separators = None
+        self.__blocks = None
+        # load index from disk or (re)build it if it is missing or outdated
+        if rebuild or not self.__load():
+            self.__build()
+            self.__save()
+
+    @staticmethod
+    def get_pattern_kind(pattern):
+        """ Get kind of the lines selected by a (src) or (trg) pattern
+
+        @param pattern: compiled pattern or pattern of LINE_PATTERNS
+        @return: AlignmentIndex.SRC or AlignmentIndex.TRG
+        """
+        text = getattr(pattern, "pattern", pattern)
+        if text not in AlignmentIndex.LINE_PATTERNS:
+            raise ValueError(f"{text} is not a pattern for (src) or (trg) lines")
+        return AlignmentIndex.LINE_PATTERNS[text]
+
+    @staticmethod
+    def sidecar_path(path, name):
+        """ Get path of a sidecar file belonging to an alignment file
+
+        @param path: path of the alignment file
+        @param name: file name of the sidecar file
+        @return: path of the sidecar file (the directory is created when
+                 the file is written)
+        """
+        return os.path.join(f"{path}{AlignmentIndex.SIDECAR_SUFFIX}", name)
+
+    @staticmethod
+    def fingerprint(path):
+        """ Get size and modification time of a file to validate sidecars
+
+        @param path: path of the alignment file
+        @return: array with size and modification time (ns)
+        """
+        stat = os.stat(path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @staticmethod
+    def is_current(path, stored_fingerprint, stored_version, version):
+        """ Check whether a sidecar was built for the current alignment file
+
+        @param path: path of the alignment file
+        @param stored_fingerprint: fingerprint saved with the sidecar
+        @param stored_version: layout version saved with the sidecar
+        @param version: layout version expected by the reader
+        @return: True if the sidecar can be used
+        """
+        return int(stored_version) == version and \
+            np.array_equal(stored_fingerprint, AlignmentIndex.fingerprint(path))
+
+    def __load(self):
+        if not os.path.exists(self.__index_path):
+            return False
+        with np.load(self.__index_path, allow_pickle=False) as data:
+            if not self.is_current(self.__path, data["fingerprint"],
+                                   data["version"], self.VERSION):
+                return False
+            self.__offsets = data["offsets"]
+            self.__kinds = data["kinds"]
+            self.__ids = data["ids"]
+        return True
+
+    def __build(self):
+        offsets = array("q")
+        kinds = bytearray()
+        ids = array("q")
+        id_pattern = re.compile(rb'\((?:src|trg)\)="([0-9]+)">')
+        offset = 0
+        with CompressedFile.open(self.__path, "rb") as file_in:
+            for line in file_in:
+                offsets.append(offset)
+                offset += len(line)
+                line_id = -1
+                if line.startswith(b"="):
+                    kind = self.SEPARATOR
+                elif line.startswith(b"#"):
+                    kind = self.HEADER
+                elif line.startswith(b"(src)") or line.startswith(b"(trg)"):
+                    kind = self.SRC if line.startswith(b"(src)") else self.TRG
+                    # keep ID of line to look up alignments directly
+                    id_match = id_pattern.match(line)
+                    if id_match:
+                        line_id = int(id_match.group(1))
+                else:
+                    kind = self.OTHER
+                kinds.append(kind)
+                ids.append(line_id)
+        # add end of file to get length of last line
+        offsets.append(offset)
+        self.__offsets = np.frombuffer(offsets, dtype=np.int64)
+        self.__kinds = np.frombuffer(bytes(kinds), dtype=np.uint8)
+        self.__ids = np.frombuffer(ids, dtype=np.int64)
+
+    def __save(self):
+        # write to temporary file first so readers never see half an index
+        os.makedirs(os.path.dirname(self.__index_path), exist_ok=True)
+        tmp_path = f"{self.__index_path}.tmp.npz"
+        np.savez(tmp_path, offsets=self.__offsets, kinds=self.__kinds,
+                 ids=self.__ids, fingerprint=self.fingerprint(self.__path),
+                 version=np.int64(self.VERSION))
+        os.replace(tmp_path, self.__index_path)
+
+    def get_path(self):
+        return self.__path
+
+    def get_line_count(self):
+        return len(self.__kinds)
+
+    def get_offsets(self):
+        return self.__offsets
+
+    def get_kinds(self):
+        return self.__kinds
+
+    def get_ids(self):
+        return self.__ids
+
+    def get_memory_size(self):
+        # bytes of the arrays of the index in memory
+        arrays = [self.__offsets, self.__kinds, self.__ids, self.__separators, self.__blocks]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def get_separators(self):
+        if self.__separators is None:
+            self.__separators = np.flatnonzero(self.__kinds == self.SEPARATOR)
+        return self.__separators
+
+    def get_headers(self):
+        return np.flatnonzero(self.__kinds == self.HEADER)
+
+    def get_blocks(self):
+        """ Get the block (file pair) of every line, i.e. the number of
+            file headers before the line
+
+        @return: array with block number for every line
+        """
+        if self.__blocks is None:
+            is_header = self.__kinds == self.HEADER
+            self.__blocks = (np.cumsum(is_header) - is_header).astype(np.int32)
+        return self.__blocks
+
+    def get_segment_ranges(self, line_numbers):
+        """ Get first and last line of the segments (lines between two
+            separators) containing the given lines
+
+        @param line_numbers: line numbers within segments
+        @return: arrays with first and last line number of each segment
+        """
+        line_numbers = np.asarray(line_numbers, dtype=np.int64)
+        # add virtual separators before the first and after the last line
+        bounds = np.concatenate(([-1], self.get_separators(),
+                                 [self.get_line_count()]))
+        # position of the next separator to the right of each line
+        position = np.searchsorted(bounds, line_numbers, side="right")
+        first = bounds[position - 1] + 1
+        last = bounds[position] - 1
+        return first, last
+
+    @staticmethod
+    def strip_line_break(raw):
+        """ Remove line break from a raw line the same way reading in
+            text mode does
+
+        @param raw: line as bytes including line break
+        @return: line as bytes without line break
+        """
+        if raw.endswith(b"\n"):
+            raw = raw[:-1]
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+        return raw
+
+    @staticmethod
+    def clean_line(raw):
+        """ Remove line break and annotations (_#POS_#lemma) from a raw line
+            as Preprocessing does for decoded lines
+
+        @param raw: line as bytes including line break
+        @return: cleaned line as bytes
+        """
+        return AlignmentIndex.__annotation.sub(
+            b"", AlignmentIndex.strip_line_break(raw))
+
+    @staticmethod
+    def decode_line(raw):
+        """ Decode a raw line the same way reading in text mode does
+
+        @param raw: line as bytes including line break
+        @return: line as string without line break
+        """
+        return AlignmentIndex.strip_line_break(raw).decode("utf-8")
+
+    def read_lines(self, line_numbers):
+        """ Read single lines by seeking to their offsets
+
+        @param line_numbers: line numbers to be read
+        @return: list of lines (without line break) in the given order
+        """
+        lines = {}
+        with CompressedFile.open(self.__path, "rb") as file_in:
+            # read in file order to keep seeking forward
+            for number in sorted(set(int(elem) for elem in line_numbers)):
+                start = self.__offsets[number]
+                file_in.seek(start)
+                raw = file_in.read(self.__offsets[number + 1] - start)
+                lines[number] = self.decode_line(raw)
+        return [lines[int(number)] for number in line_numbers]
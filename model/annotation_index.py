@@ -0,0 +1,186 @@
+import os
+import re
+from array import array
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.compressed_file import CompressedFile
+
+
+class AnnotationIndex:
+    """Inverted index of the annotations (token_#POS_#lemma) of a
+       generated alignment file
+
+       For every lemma and every POS tag the index stores the tokens
+       carrying it, so lines can be looked up by annotation without
+       running a regex over the whole file. Tokens are stored as
+       line number and position of the token in the line.
+    """
+    VERSION = 1
+    # bits of a token key holding the position of the token in its line
+    POSITION_BITS = 16
+    # annotations that can be queried
+    FIELDS = ("lemma", "POS")
+    __id_pattern = re.compile(r'\((?:src|trg)\)="[0-9]+">')
+
+    def __init__(self, path, rebuild=False):
+        self.__path = path
+        self.__index_path = AlignmentIndex.sidecar_path(path, "annotations.npz")
+        self.__index = AlignmentIndex(path)
+        self.__vocabularies = {}
+        self.__starts = {}
+        self.__tokens = {}
+        if rebuild or not self.__load():
+            self.__build()
+            self.__save()
+        # look up entries of the vocabularies by value
+        self.__positions = {field: {value: position for position, value
+                                    in enumerate(self.__vocabularies[field])}
+                            for field in self.FIELDS}
+
+    @staticmethod
+    def split_annotations(text):
+        """ Split annotated text into tokens, POS tags and lemmas
+
+        @param text: text of a line without its ID
+        @return: lists with tokens, POS tags and lemmas
+        """
+        # split at white space and then at delimiter to get metadata
+        second_split = [elem.split("_#") for elem in text.strip().split()]
+        # get original string, POS and lemma of every token
+        try:
+            token = [elem[0] for elem in second_split]
+            POS = [elem[1] for elem in second_split]
+            lemma = [elem[2] for elem in second_split]
+        except IndexError:
+            POS = ["X" for elem in second_split]
+            lemma = [elem[0] for elem in second_split]
+        return token, POS, lemma
+
+    @staticmethod
+    def describe_query(query):
+        """ Get readable description of a query, e.g. for file names
+
+        @param query: dictionary with lemma and/or POS to search for
+        @return: description like "lemma diablo POS NOUN"
+        """
+        return " ".join(f"{field} {query[field]}"
+                        for field in AnnotationIndex.FIELDS
+                        if query.get(field) is not None)
+
+    def __load(self):
+        if not os.path.exists(self.__index_path):
+            return False
+        with np.load(self.__index_path, allow_pickle=False) as data:
+            if not AlignmentIndex.is_current(self.__path, data["fingerprint"],
+                                             data["version"], self.VERSION):
+                return False
+            for field in self.FIELDS:
+                self.__vocabularies[field] = data[f"{field}_vocabulary"].tolist()
+                self.__starts[field] = data[f"{field}_starts"]
+                self.__tokens[field] = data[f"{field}_tokens"]
+        return True
+
+    def __save(self):
+        arrays = {}
+        for field in self.FIELDS:
+            arrays[f"{field}_vocabulary"] = np.array(self.__vocabularies[field],
+                                                     dtype=str)
+            arrays[f"{field}_starts"] = self.__starts[field]
+            arrays[f"{field}_tokens"] = self.__tokens[field]
+        os.makedirs(os.path.dirname(self.__index_path), exist_ok=True)
+        tmp_path = f"{self.__index_path}.tmp.npz"
+        np.savez(tmp_path, fingerprint=AlignmentIndex.fingerprint(self.__path),
+                 version=np.int64(self.VERSION), **arrays)
+        os.replace(tmp_path, self.__index_path)
+
+    def __build(self):
+        kinds = self.__index.get_kinds()
+        ids = self.__index.get_ids()
+        entries = {field: {} for field in self.FIELDS}
+        values = {field: array("q") for field in self.FIELDS}
+        keys = array("q")
+        with CompressedFile.open(self.__path, "rb") as file_in:
+            for number, raw in enumerate(file_in):
+                # only (src) and (trg) lines with IDs are annotated
+                if kinds[number] not in (AlignmentIndex.SRC, AlignmentIndex.TRG) \
+                        or ids[number] < 0:
+                    continue
+                line = AlignmentIndex.decode_line(raw)
+                text = line[self.__id_pattern.match(line).end():]
+                token, POS, lemma = self.split_annotations(text)
+                for position, annotations in enumerate(zip(lemma, POS)):
+                    if position >> self.POSITION_BITS:
+                        break
+                    keys.append((number << self.POSITION_BITS) | position)
+                    for field, value in zip(self.FIELDS, annotations):
+                        values[field].append(
+                            entries[field].setdefault(value, len(entries[field])))
+        keys = np.frombuffer(keys, dtype=np.int64)
+        for field in self.FIELDS:
+            self.__vocabularies[field] = list(entries[field])
+            field_values = np.frombuffer(values[field], dtype=np.int64)
+            # group tokens by value, tokens of a value stay in file order
+            order = np.argsort(field_values, kind="stable")
+            self.__tokens[field] = keys[order]
+            self.__starts[field] = np.searchsorted(
+                field_values[order], np.arange(len(entries[field]) + 1))
+
+    def __postings(self, field, value, caseinsensitive):
+        if caseinsensitive:
+            value = value.lower()
+            positions = [position for position, entry
+                         in enumerate(self.__vocabularies[field])
+                         if entry.lower() == value]
+        else:
+            positions = [self.__positions[field][value]] \
+                if value in self.__positions[field] else []
+        starts = self.__starts[field]
+        return np.unique(np.concatenate(
+            [self.__tokens[field][starts[position]:starts[position + 1]]
+             for position in positions] + [np.empty(0, dtype=np.int64)]))
+
+    def get_lines(self, query, caseinsensitive=False):
+        """ Get lines with a token carrying all annotations of the query
+
+        @param query: dictionary with lemma and/or POS to search for
+        @param caseinsensitive: whether lemmas and POS tags ignore case
+        @return: sorted line numbers
+        """
+        # e.g. a regex given instead of a query
+        if not isinstance(query, dict) or \
+                all(query.get(field) is None for field in self.FIELDS):
+            raise ValueError(f"query needs at least one of {', '.join(self.FIELDS)}")
+        tokens = None
+        for field in self.FIELDS:
+            if query.get(field) is None:
+                continue
+            postings = self.__postings(field, query[field], caseinsensitive)
+            tokens = postings if tokens is None else \
+                np.intersect1d(tokens, postings, assume_unique=True)
+        return np.unique(tokens >> self.POSITION_BITS)
+
+    def get_matches_index_files(self, text_list, query, src_pattern,
+                                caseinsensitive=False):
+        """ Extract matches, corresponding files, and their indices in text
+            list (see Processing.get_matches_index_files)
+
+        @param text_list: list with all lines of the file
+        @param query: dictionary with lemma and/or POS to search for
+        @param src_pattern: compiled pattern for (src) or (trg) lines
+        @param caseinsensitive: whether lemmas and POS tags ignore case
+        @return: matches, indices in text list and files
+        """
+        matches = []
+        matches_index = []
+        files = []
+        blocks = self.__index.get_blocks()
+        labels = [""] + [f"{text_list[index - 1]}, {text_list[index]}"
+                         for index in self.__index.get_headers()]
+        for index in self.get_lines(query, caseinsensitive).tolist():
+            item = text_list[index]
+            # only keep lines of the language searched
+            if src_pattern.match(item):
+                matches.append(item)
+                matches_index.append(index)
+                files.append(labels[blocks[index]])
+        return matches, matches_index, files
@@ -0,0 +1,105 @@
+from model.bilingual_context import BilingualContext
+from model.bilingual_statistics import BilingualStats
+from model.monolingual_context import MonolingualContext
+from model.monolingual_statistics import MonolingualStats
+from model.search_session import SearchSession
+
+
+class BatchSearch(SearchSession):
+    """Search an alignment file for a list of regular expressions in a
+       single pass and write statistics and context files for each of them
+
+    """
+
+    def __init__(self, path, regexes, caseinsensitive=False, mapped=False, workers=1,
+                 trigrams=False, progress=None, pool=None, engine="re", timeout=None):
+        super().__init__(path, regexes=regexes, mapped=mapped, workers=workers,
+                         trigrams=trigrams, progress=progress, pool=pool, engine=engine,
+                         timeout=timeout)
+        self.__caseinsensitive = caseinsensitive
+
+    @staticmethod
+    def read_regexes(text):
+        """ Get regexes from uploaded text with one regex per line
+
+        @param text: content of the uploaded file
+        @return: list of regexes without empty lines
+        """
+        return [line.strip("\r") for line in text.split("\n")
+                if line.strip()]
+
+    def write_monolingual(self, lang, root_path, src=True, stats=True,
+                          context=True, parsed=False, pre_context=1,
+                          post_context=1, anno=True):
+        """ Write monolingual statistics and context files for every regex
+
+        @param lang: language that is searched
+        @param root_path: directory for the created files
+        @param src: search source language (otherwise target language)
+        @param stats: write statistics files
+        @param context: write context files
+        @param parsed: file is parsed
+        @param pre_context: number of lines before match
+        @param post_context: number of lines after match
+        @param anno: keep annotations for context
+        @return: dictionary with paths of created files for every regex
+        """
+        paths = {}
+        for regex in self.get_regexes():
+            paths[regex] = []
+            if context:
+                mono_context = MonolingualContext(
+                    path=self.get_path(), regex=regex, pre_context=pre_context,
+                    post_context=post_context, anno=anno, src=src,
+                    caseinsensitive=self.__caseinsensitive, search=self)
+                if len(mono_context.get_matches_context()) > 0:
+                    paths[regex].append(mono_context.write_context_qual_mono(
+                        lang=lang, root_path=root_path))
+                    paths[regex].append(mono_context.write_context_quant_mono(
+                        lang=lang, root_path=root_path))
+            if stats:
+                mono_matches = MonolingualStats(
+                    path=self.get_path(), regex=regex, src=src, parsed=parsed,
+                    caseinsensitive=self.__caseinsensitive, search=self)
+                if mono_matches.get_counts():
+                    paths[regex].append(mono_matches.write_monolingual_stats(
+                        lang=lang, root_path=root_path))
+        return paths
+
+    def write_bilingual(self, l1, l2, root_path, stats=True, context=True,
+                        parsed=False, pre_context=1, post_context=1, anno=True):
+        """ Write bilingual statistics and context files for every regex
+
+        @param l1: source language
+        @param l2: target language
+        @param root_path: directory for the created files
+        @param stats: write statistics files
+        @param context: write context files
+        @param parsed: file is parsed
+        @param pre_context: number of lines before match
+        @param post_context: number of lines after match
+        @param anno: keep annotations for context
+        @return: dictionary with paths of created files for every regex
+        """
+        paths = {}
+        for regex in self.get_regexes():
+            paths[regex] = []
+            if context:
+                bil_context = BilingualContext(
+                    path=self.get_path(), regex=regex, pre_context=pre_context,
+                    post_context=post_context, anno=anno,
+                    caseinsensitive=self.__caseinsensitive, search=self)
+                if len(bil_context.get_matches_context()) > 0:
+                    paths[regex].append(bil_context.write_context_qual_bil(
+                        l1=l1, l2=l2, root_path=root_path))
+                    paths[regex].append(bil_context.write_context_quant_bil(
+                        l1=l1, l2=l2, root_path=root_path))
+            if stats:
+                bil_matches = BilingualStats(
+                    path=self.get_path(), regex=regex, src_aggregate=True,
+                    parsed=parsed, caseinsensitive=self.__caseinsensitive,
+                    search=self)
+                if bil_matches.get_counts():
+                    paths[regex].append(bil_matches.write_bilingual_stats(
+                        l1=l1, l2=l2, root_path=root_path))
+        return paths
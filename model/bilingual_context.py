@@ -1,4 +1,5 @@
 from model.processing import Processing
+import numpy as np
 import pandas as pd
 
 
@@ -7,10 +8,16 @@ class BilingualContext:
 
     """
     def __init__(self, path, regex, pre_context=None, post_context=None,
-                 anno=True, caseinsensitive=False):
+                 anno=True, caseinsensitive=False, mapped=False, workers=1, trigrams=False,
+                 search=None):
         self.__path = path
         self.__regex = regex
         self.__caseinsensitive = caseinsensitive
+        self.__mapped = mapped
+        self.__workers = workers
+        self.__trigrams = trigrams
+        # shared search object (e.g. BatchSearch) instead of a new search
+        self.__search = search
         self.__src_pattern = r'\(src\)="[0-9]+">'
         self.__text_list, self.__matches, self.__indices, self.__files = Processing.perform_new_search(
                     self.__path,
@@ -19,11 +26,17 @@ class BilingualContext:
                     unparsed_stats_context=True,
                     mono_pattern=self.__src_pattern,
                     mono=False,
-                    caseinsensitive=self.__caseinsensitive)
+                    caseinsensitive=self.__caseinsensitive,
+                    mapped=self.__mapped,
+                    workers=self.__workers,
+                    trigrams=self.__trigrams,
+                    search=self.__search)
         self.__segments_l1 = None
-        self.__l1 = None
-        self.__l2 = None
         self.__segments_l2 = None
+        self.__segment_lines = []
+        self.__positions = None
+        self.__src_lines = None
+        self.__trg_lines = None
         self.__pre_context = pre_context
         self.__post_context = post_context
         self.__pre_context_list_src = []
@@ -46,45 +59,29 @@ class BilingualContext:
     def __process(self):
         # get whole segment for each match
         self.__segments = self.__get_segments()
-        # get separated lists for src and trg
-        self.__l1 = Processing.filter_alignment(self.__text_list, src=True)
-        self.__l2 = Processing.filter_alignment(self.__text_list, src=False)
-        # create dictionaries for looking up indices
-        self.__l1_dict = self.__lang_list_to_dict(self.__l1)
-        self.__l2_dict = self.__lang_list_to_dict(self.__l2)
+        # map line numbers to positions in src and trg lines
+        self.__positions, self.__src_lines, self.__trg_lines = \
+            Processing.get_language_map(self.__text_list)
         # extract all segments containing matches
         self.__extract_lang_segments()
-        # extract the start and end indices in src list for each segment
+        # extract the start and end indices in src lines for each segment
         self.__indices_src_first, self.__indices_src_last \
             = self.__extract_indices(src=True)
-        # extract the start and end indices in trg list for each segment
+        # extract the start and end indices in trg lines for each segment
         self.__indices_trg_first, self.__indices_trg_last \
             = self.__extract_indices(src=False)
 
-        # get pre-context for source_files
-        self.__pre_context_list_src = self.__set_pre_context(
-            self.__l1,
-            self.__indices_src_first,
-            self.__pre_context
-        )
-        # get post-context for source_files
-        self.__post_context_list_src = self.__set_post_context(
-            self.__l1,
-            self.__indices_src_last,
-            self.__post_context
-        )
-        # get pre-context for target
-        self.__pre_context_list_trg = self.__set_pre_context(
-            self.__l2,
-            self.__indices_trg_first,
-            self.__pre_context
-        )
-        # get post-context for target
-        self.__post_context_list_trg = self.__set_post_context(
-            self.__l2,
-            self.__indices_trg_last,
-            self.__post_context
-        )
+        # get pre- and post-context for source_files
+        headers = Processing.get_header_lines(self.__text_list)
+        self.__pre_context_list_src, self.__post_context_list_src = \
+            Processing.get_context(self.__text_list, self.__src_lines,
+                                   self.__indices_src_first, self.__indices_src_last,
+                                   headers, self.__pre_context, self.__post_context)
+        # get pre- and post-context for target
+        self.__pre_context_list_trg, self.__post_context_list_trg = \
+            Processing.get_context(self.__text_list, self.__trg_lines,
+                                   self.__indices_trg_first, self.__indices_trg_last,
+                                   headers, self.__pre_context, self.__post_context)
         # remove annotations
         if not self.__anno:
             self.__segments_l1 = Processing.remove_annotation(self.__segments_l1, nested=True)
@@ -97,6 +94,8 @@ class BilingualContext:
     def __get_segments(self):
         # initialise list of segments
         merged = []
+        # line numbers of the lines in each segment
+        self.__segment_lines = []
         # get segment for every match (nested list) based on indices of matches
         for index in self.__indices:
             pre = []  # initialise list for lines before match
@@ -128,16 +127,11 @@ class BilingualContext:
             # merge segments to one list
             # and append to (nested) list of segments
             merged.append(pre + [self.__text_list[index]] + post)
+            self.__segment_lines.append(
+                [index - count for count in range(1, len(pre) + 1)] + [index] +
+                [index + count for count in range(1, len(post) + 1)])
         return merged
 
-    @staticmethod
-    def __lang_list_to_dict(lst):
-        lang_dict = {}
-        for i, val in enumerate(lst):
-            if val not in lang_dict:
-                lang_dict[val] = i
-        return lang_dict
-
     def __extract_lang_segments(self):
         self.__segments_l1 = [[line for line in match
                                if line.startswith("(src)")]
@@ -146,45 +140,19 @@ class BilingualContext:
                                if line.startswith("(trg)")]
                               for match in self.__segments]
 
-    # get indices of first and last element of segments
-    # for source_files and target each
-    @staticmethod
-    def __extract_ind(sublst, dictionary):
+    def __extract_indices(self, src=True):
+        # get positions of first and last line of segments
+        # for source_files or target in the lines of their language
+        is_lang = np.zeros(len(self.__positions), dtype=bool)
+        is_lang[self.__src_lines if src else self.__trg_lines] = True
         first_ind = []
         last_ind = []
-        for elem in sublst:
-            # extract first and last elem in each segment match
-            first, last = elem[0], elem[-1]
-            # look up indices in dictionaries for each segment
-            # append indices to lists
-            first_ind.append(dictionary[first])
-            last_ind.append(dictionary[last])
+        for numbers in self.__segment_lines:
+            numbers = [number for number in numbers if is_lang[number]]
+            first_ind.append(self.__positions[numbers[0]])
+            last_ind.append(self.__positions[numbers[-1]])
         return first_ind, last_ind
 
-    def __extract_indices(self, src=True):
-        if src:
-            first, last = self.__extract_ind(self.__segments_l1,
-                                             self.__l1_dict)
-
-        else:
-            first, last = self.__extract_ind(self.__segments_l2,
-                                             self.__l2_dict)
-        return first, last
-
-    @staticmethod
-    def __set_pre_context(lst, indices, pre_context):
-        pre_context_list = [
-            lst[index - pre_context:index]
-            for index in indices]
-        return pre_context_list
-
-    @staticmethod
-    def __set_post_context(lst, indices, post_context):
-        post_context_list = [
-            lst[index + 1: index + 1 + post_context]
-            for index in indices]
-        return post_context_list
-
     def write_context_qual_bil(self, l1, l2, path=None, root_path=None):
         """ Write monolingual matches and their context to textfile for
             a qualitative analysis
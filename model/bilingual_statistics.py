@@ -1,8 +1,11 @@
-import ast
 import re
+import numpy as np
 import pandas as pd
 from collections import defaultdict
+from model.annotation_index import AnnotationIndex
+from model.line_table import LineTable
 from model.processing import Processing
+from model.streaming_stats import StreamingCounts
 
 
 class BilingualStats:
@@ -10,14 +13,30 @@ class BilingualStats:
        write them with their translations to a csv-file
 
     """
-    def __init__(self, path, regex, parsed=False, src_aggregate=False, caseinsensitive=False):
+    def __init__(self, path, regex=None, parsed=False, src_aggregate=False, caseinsensitive=False,
+                 mapped=False, workers=1, trigrams=False, query=None, columnar=False,
+                 search=None, memory_limit=None):
+        if (regex is None) == (query is None):
+            raise ValueError("give either a regex or a lemma/POS query")
         self.__path = path
-        self.__regex = regex
+        # lemma/POS query (e.g. {"lemma": "diablo"}) as alternative to regex
+        self.__query = query
+        self.__regex = regex if query is None \
+            else AnnotationIndex.describe_query(query)
         self.__parsed = parsed
         self.__src_aggregate = src_aggregate
         self.__src_pattern = r'\(src\)="[0-9]+">'
         self.__trg_pattern = r'\(trg\)="[0-9]+">'
         self.__caseinsensitive = caseinsensitive
+        self.__mapped = mapped
+        self.__workers = workers
+        self.__trigrams = trigrams
+        # shared search object (e.g. BatchSearch) instead of a new search
+        self.__search = search
+        self.__columnar = columnar
+        # memory limit in bytes for the counts of unparsed data (see StreamingCounts),
+        # parsed data is not affected
+        self.__memory_limit = memory_limit
         self.__matches_src_all = []
         self.__matches_clean = []
         self.__sets_files = []
@@ -32,7 +51,13 @@ class BilingualStats:
                     unparsed_stats_context=True,
                     mono=False,
                     mono_pattern=self.__src_pattern,
-                    caseinsensitive=self.__caseinsensitive
+                    caseinsensitive=self.__caseinsensitive,
+                    mapped=self.__mapped,
+                    workers=self.__workers,
+                    trigrams=self.__trigrams,
+                    query=self.__query,
+                    columnar=self.__columnar,
+                    search=self.__search
                 )
             self.__process_counts_unparsed()
         else:
@@ -44,7 +69,13 @@ class BilingualStats:
                     unparsed_stats_context=False,
                     mono=False,
                     mono_pattern=self.__src_pattern,
-                    caseinsensitive=self.__caseinsensitive
+                    caseinsensitive=self.__caseinsensitive,
+                    mapped=self.__mapped,
+                    workers=self.__workers,
+                    trigrams=self.__trigrams,
+                    query=self.__query,
+                    columnar=self.__columnar,
+                    search=self.__search
                 )
             # extract matches, translations and metadata
             self.__process_counts()
@@ -54,6 +85,9 @@ class BilingualStats:
 
                 @return:
                 """
+        if self.__memory_limit is not None:
+            self.__stream_counts_unparsed()
+            return
         # summarise multiple mappings, e.g. one line for source_files, two for target
         # remove "=" as separator, empty entries and files starting with "#"
         # self.__text_list = [elem for elem in self.__text_list if not elem.startswith("=") and not elem.startswith("#")
@@ -66,57 +100,92 @@ class BilingualStats:
         self.__extract_lang(src=True)
         self.__extract_lang(src=False)
 
-        # remove annotation
-        self.__matches_L1 = Processing.remove_annotation(self.__matches_L1, nested=False)
-        self.__matches_L2 = Processing.remove_annotation(self.__matches_L2, nested=False)
+        # store repeated matches once and remove annotation of distinct matches
+        tables, ids = [], []
+        for matches in (self.__matches_L1, self.__matches_L2):
+            table = LineTable()
+            matches_ids = table.add_all(matches)
+            table, mapping = table.map(
+                lambda match: Processing.remove_annotation([match], nested=False)[0])
+            tables.append(table)
+            ids.append(mapping[matches_ids])
+        self.__matches_L1, self.__matches_L2 = [table.get_all(elem) for table, elem
+                                                in zip(tables, ids)]
 
-        # create tuples to count combinations of source_files and translation
-        self.__match_combo = [elem for elem in zip(self.__matches_L1,
-                                                   self.__matches_L2)]
+        # create pairs of IDs to count combinations of source_files and translation
+        self.__match_combo = np.column_stack(ids)
         # create dictionary with counts
-        self.__counts_unparsed = Processing.get_counts(self.__match_combo)
+        self.__counts_unparsed = Processing.get_counts(self.__match_combo, tables)
+
+    def __stream_counts_unparsed(self):
+        # count alignments one by one with their files,
+        # partial counts are spilled to disk
+        self.__counts_unparsed = StreamingCounts(self.__memory_limit)
+        for index, file in zip(self.__indices, self.__files):
+            if self.__src_aggregate:
+                lines = self.__summarise_mapping(index)
+                if lines is None:
+                    continue
+            else:
+                lines = self.__get_mapping(index)
+            src, trg = Processing.remove_annotation(
+                [" ".join([line for line in lines if line.startswith("(src)")]),
+                 " ".join([line for line in lines if line.startswith("(trg)")])],
+                nested=False)
+            self.__counts_unparsed.add((src, trg), file)
+
+    def __get_mapping(self, index):
+        all_lines = [self.__text_list[index]]
+        # src src trg, 1st src as match
+        if self.__text_list[index + 2].startswith("(trg)") \
+                and self.__text_list[index + 1].startswith("(src)"):
+            all_lines.append(self.__text_list[index + 2])
+        # src trg trg
+        elif self.__text_list[index + 2].startswith("(trg)") \
+                and self.__text_list[index + 1].startswith("(trg)"):
+            all_lines.extend(self.__text_list[index + 1:index + 3])
+        # src src trg, 2nd src as match
+        elif self.__text_list[index + 1].startswith("(trg)") \
+                and self.__text_list[index - 1].startswith("(src)"):
+            all_lines.append(self.__text_list[index + 1])
+        # 1 src 1 trg
+        elif self.__text_list[index + 1].startswith("(trg)") \
+                and self.__text_list[index].startswith("(src)"):
+            all_lines.append(self.__text_list[index + 1])
+        return all_lines
 
     def __get_mappings(self):
         for index in self.__indices:
-            all_lines = [self.__text_list[index]]
-            # src src trg, 1st src as match
-            if self.__text_list[index + 2].startswith("(trg)") \
-                    and self.__text_list[index + 1].startswith("(src)"):
-                all_lines.append(self.__text_list[index + 2])
-            # src trg trg
-            elif self.__text_list[index + 2].startswith("(trg)") \
-                    and self.__text_list[index + 1].startswith("(trg)"):
-                all_lines.extend(self.__text_list[index + 1:index + 3])
-            # src src trg, 2nd src as match
-            elif self.__text_list[index + 1].startswith("(trg)") \
-                    and self.__text_list[index - 1].startswith("(src)"):
-                all_lines.append(self.__text_list[index + 1])
-            # 1 src 1 trg
-            elif self.__text_list[index + 1].startswith("(trg)") \
-                    and self.__text_list[index].startswith("(src)"):
-                all_lines.append(self.__text_list[index + 1])
-            self.__match_combo.append(all_lines)
+            self.__match_combo.append(self.__get_mapping(index))
+
+    def __summarise_mapping(self, index):
+        # src src trg, 1st src as match
+        if self.__text_list[index + 2].startswith("(trg)") \
+                and self.__text_list[index + 1].startswith("(src)"):
+            return self.__text_list[index:index + 3]
+        # src trg trg
+        elif self.__text_list[index + 2].startswith("(trg)") \
+                and self.__text_list[index + 1].startswith("(trg)"):
+            return self.__text_list[index:index + 3]
+        # src src trg, 2nd src as match
+        elif self.__text_list[index + 1].startswith("(trg)") \
+                and self.__text_list[index - 1].startswith("(src)"):
+            return self.__text_list[index - 1:index + 2]
+        # 1 src 1 trg
+        elif self.__text_list[index + 1].startswith("(trg)") \
+                and self.__text_list[index].startswith("(src)"):
+            return self.__text_list[index:index + 2]
+        return None
 
     def __summarise_mappings(self):
-        for index in self.__indices:
-            # src src trg, 1st src as match
-            if self.__text_list[index + 2].startswith("(trg)") \
-                    and self.__text_list[index + 1].startswith("(src)"):
-                self.__match_combo.append(self.__text_list[index:index + 3])
-            # src trg trg
-            elif self.__text_list[index + 2].startswith("(trg)") \
-                    and self.__text_list[index + 1].startswith("(trg)"):
-                self.__match_combo.append(self.__text_list[index:index + 3])
-            # src src trg, 2nd src as match
-            elif self.__text_list[index + 1].startswith("(trg)") \
-                    and self.__text_list[index - 1].startswith("(src)"):
-                self.__match_combo.append(
-                    self.__text_list[index - 1:index + 2]
-                )
-            # 1 src 1 trg
-            elif self.__text_list[index + 1].startswith("(trg)") \
-                    and self.__text_list[index].startswith("(src)"):
-                self.__match_combo.append(self.__text_list[index:index + 2])
+        files = []
+        for index, file in zip(self.__indices, self.__files):
+            lines = self.__summarise_mapping(index)
+            if lines is not None:
+                self.__match_combo.append(lines)
+                files.append(file)
+        # files of the alignments kept, in the order of the matches
+        self.__files = files
 
     def __extract_lang(self, src=True):
         """Extract source_files and target language and put them into a nested list
@@ -144,14 +213,24 @@ class BilingualStats:
             return len(self.__counts_unparsed)
 
     @staticmethod
-    def __extract_metadata(lines, pattern_regex, inner_data, metadata_key):
-        meta_data = []
-        for elem in inner_data:
-            tmp = []
-            for match_ID in pattern_regex.findall(elem):
-                tmp.append(lines[match_ID][metadata_key])
-            meta_data.extend(tmp)
-        return meta_data
+    def __extract_metadata(lines, IDs, metadata_key):
+        return [lines[ID][metadata_key] for ID in IDs]
+
+    def __index_alignments(self):
+        """ Map file and ID of every src line to the alignments containing
+            it with their lines and IDs, built once for all matches
+
+        @return: dictionary with (file, src ID) as key
+        """
+        alignment_index = {}
+        for file, alignments in self.__parsed_dict.items():
+            for alignment, lines in alignments.items():
+                inner_src = re.findall(self.__src_pattern, alignment)
+                inner_trg = re.findall(self.__trg_pattern, alignment)
+                for src_ID in dict.fromkeys(inner_src):
+                    alignment_index.setdefault((file, src_ID), []).append(
+                        (lines, inner_src, inner_trg))
+        return alignment_index
 
     def __process_counts(self):
         # dictionary for summarised src
@@ -164,8 +243,9 @@ class BilingualStats:
             self.__matches_clean = Processing.remove_annotation(
                 self.__matches_l1, nested=False)
             # pre-compile search pattern for match
-            trg_pattern_regex = re.compile(f'({self.__trg_pattern})')
             src_pattern_regex = re.compile(f'({self.__src_pattern})')
+            # look up alignments by file and ID of match
+            alignment_index = self.__index_alignments()
             # Iterate through each match
             for i, match in enumerate(self.__matches_l1):
                 token_src_single = []
@@ -179,55 +259,35 @@ class BilingualStats:
                 lemma_src_all = []
                 # get file key
                 match_key = self.__files[i]
-                # get values of file key (second level)
-                match_data = self.__parsed_dict.get(match_key, {})
-                # Iterate through second level of
-                # nested dictionary (alignments)
-                for alignment, lines in match_data.items():
-                    # get ID of match to match it with the one in the alignment
-                    match_ID = src_pattern_regex.search(match)
-                    match_ID = match_ID.group()
-                    if match_ID in alignment:
-                        # append everything with target to inner trg list
-                        inner_trg = re.findall(self.__trg_pattern, alignment)
-                        # go through target_lines for IDs
-                        tmp_token_trg = self.__extract_metadata(
-                            lines, trg_pattern_regex, inner_trg, "string")
-                        tmp_POS_trg = self.__extract_metadata(
-                            lines, trg_pattern_regex, inner_trg, "POS")
-                        tmp_lemma_trg = self.__extract_metadata(
-                            lines, trg_pattern_regex, inner_trg, "lemma")
-                        # append trg metadata to final lists for counter
-                        token_trg_all.extend(tmp_token_trg)
-                        POS_trg_all.extend(tmp_POS_trg)
-                        lemma_trg_all.extend(tmp_lemma_trg)
-                        # check if src lines shall be summarised:
-                        if self.__src_aggregate:
-                            # check if two lines with src are in align
-                            inner_src = re.findall(self.__src_pattern,
-                                                   alignment)
-                            # go through src lines for IDs
-                            tmp_token_src = self.__extract_metadata(
-                                lines, src_pattern_regex, inner_src, "string")
-                            tmp_POS_src = self.__extract_metadata(
-                                lines, src_pattern_regex, inner_src, "POS")
-                            tmp_lemma_src = self.__extract_metadata(
-                                lines, src_pattern_regex, inner_src, "lemma")
-                            # append src metadata to final lists for counter
-                            token_src_all.append(tmp_token_src)
-                            POS_src_all.append(tmp_POS_src)
-                            lemma_src_all.append(tmp_lemma_src)
-                            # append summarised src lines
-                            self.__matches_src_all.append(tmp_token_src)
-                        else:
-                            # single out ID in match
-                            src_ID = src_pattern_regex.search(match)
-                            token_src_single.extend(
-                                lines[src_ID.group()]["string"])
-                            POS_src_single.extend(
-                                lines[src_ID.group()]["POS"])
-                            lemma_src_single.extend(
-                                lines[src_ID.group()]["lemma"])
+                # get ID of match to look up the alignments containing it
+                match_ID = src_pattern_regex.search(match).group()
+                for lines, inner_src, inner_trg in alignment_index.get(
+                        (match_key, match_ID), []):
+                    # go through target_lines for IDs
+                    tmp_token_trg = self.__extract_metadata(lines, inner_trg, "string")
+                    tmp_POS_trg = self.__extract_metadata(lines, inner_trg, "POS")
+                    tmp_lemma_trg = self.__extract_metadata(lines, inner_trg, "lemma")
+                    # append trg metadata to final lists for counter
+                    token_trg_all.extend(tmp_token_trg)
+                    POS_trg_all.extend(tmp_POS_trg)
+                    lemma_trg_all.extend(tmp_lemma_trg)
+                    # check if src lines shall be summarised:
+                    if self.__src_aggregate:
+                        # go through src lines for IDs
+                        tmp_token_src = self.__extract_metadata(lines, inner_src, "string")
+                        tmp_POS_src = self.__extract_metadata(lines, inner_src, "POS")
+                        tmp_lemma_src = self.__extract_metadata(lines, inner_src, "lemma")
+                        # append src metadata to final lists for counter
+                        token_src_all.append(tmp_token_src)
+                        POS_src_all.append(tmp_POS_src)
+                        lemma_src_all.append(tmp_lemma_src)
+                        # append summarised src lines
+                        self.__matches_src_all.append(tmp_token_src)
+                    else:
+                        # single out ID in match
+                        token_src_single.extend(lines[match_ID]["string"])
+                        POS_src_single.extend(lines[match_ID]["POS"])
+                        lemma_src_single.extend(lines[match_ID]["lemma"])
                 # Get file pairs that belong to the particular alignment
                 self.__sets_files.append([match_key])
                 if not self.__src_aggregate:
@@ -285,8 +345,11 @@ class BilingualStats:
                 regex=self.__regex, l1=l1, l2=l2,
                 root_path=root_path)
         # handle case for unparsed data
-        if not self.__parsed:
+        if not self.__parsed and self.__memory_limit is not None:
+            self.__counts_unparsed.write_statistics_to_file(path, self.__regex, l1=l1, l2=l2)
+        elif not self.__parsed:
             Processing.write_statistics_to_file(path, self.__regex, self.__counts_unparsed,
+                                                list(zip(self.__matches_L1, self.__matches_L2)),
                                                 self.__files, l1=l1, l2=l2)
         else:
             # create dataframes from dictionary
@@ -302,63 +365,32 @@ class BilingualStats:
                           'Token_src', 'POS_trg', 'Lemma_trg', 'Token_trg']
             # drop artificial index column
             df = df.drop("Number", axis=1)
-            # make everything hashable
-            df = df.astype(str)
+            keys = [f'Match {l1}', f'Match {l2}']
+            # replace matches and lists of annotations by IDs for counting
+            codes = pd.DataFrame({column: Processing.intern_values(df[column].tolist())
+                                  for column in df.columns})
             # get counts
-            count = df[[f'Match {l1}',
-                        f'Match {l2}']].value_counts().reset_index(
-                name='Count_Alignment')
-            count_POS_src = df[[f'Match {l1}',
-                                'POS_src']].value_counts().reset_index(
-                name='Count_POS_src')
-            count_POS_trg = df[[f'Match {l2}',
-                                'POS_trg']].value_counts().reset_index(
-                name='Count_POS_trg')
-
-            # add counts and sets of file pairs for all matches
-            df["File_Pairs"] = self.__sets_files
-            files = df.groupby([f'Match {l1}',
-                                f'Match {l2}'])['File_Pairs'].agg(
-                list).reset_index()
-            # flatten lists if necessary
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: Processing.is_nested(x))
-            # make set to get unique file pairs
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: set(x))
-            # get count of file pairs
-            files['File_Count'] = files['File_Pairs'].apply(lambda x: len(x))
-            # merge original dataframe and counts for src and trg combinations
-            merged_df = pd.merge(df, count, on=[f'Match {l1}',
-                                                f'Match {l2}'],
-                                 how='left')
-            # merge original dataframe and counts for POS_src
-            merged_df = pd.merge(merged_df, count_POS_src,
-                                 on=[f'Match {l1}', 'POS_src'], how='left')
-            # merge original dataframe and counts for POS_trg
-            merged_df = pd.merge(merged_df, count_POS_trg,
-                                 on=[f'Match {l2}', 'POS_trg'], how='left')
-            # drop left over index column
-            merged_df.drop(["File_Pairs"], axis=1, inplace=True)
-            # sort merged dataframe by highest count_POS_src
-            merged_df = merged_df.sort_values(
+            df['Count_Alignment'] = codes.groupby(keys)[keys[0]].transform('size')
+            count_POS_src = codes.groupby([keys[0], 'POS_src'])[keys[0]].transform('size')
+            count_POS_trg = codes.groupby([keys[1], 'POS_trg'])[keys[1]].transform('size')
+            # add sets of file pairs for all matches
+            groups = codes.groupby(keys, sort=False).ngroup()
+            file_sets = Processing.get_file_sets(groups.tolist(), self.__sets_files)
+            # sort by highest count_POS_src
+            order = pd.DataFrame({'Count_Alignment': df['Count_Alignment'],
+                                  'Count_POS_src': count_POS_src,
+                                  'Count_POS_trg': count_POS_trg}).sort_values(
                 by=['Count_Alignment', 'Count_POS_src', 'Count_POS_trg'],
-                ascending=[False, False, False])
+                ascending=[False, False, False]).index
             # reduce duplicates
-            merged_df.drop_duplicates(keep='first', inplace=True)
-            # merge final dataframe with file data
-            all_data = pd.merge(merged_df, files, on=[f'Match {l1}',
-                                                      f'Match {l2}'],
-                                how='left')
+            order = order[~codes.loc[order].duplicated().to_numpy()]
+            all_data = df.loc[order].reset_index(drop=True)
+            groups = groups.loc[order].tolist()
+            all_data['File_Pairs'] = [file_sets[group] for group in groups]
+            all_data['File_Count'] = [len(file_sets[group]) for group in groups]
             # add column with Regex
             all_data['Regex'] = self.__regex
-            # drop columns for POS count
-            all_data = all_data.drop(["Count_POS_src", "Count_POS_trg"], axis=1)
             if self.__src_aggregate:
-                # Safely evaluate the string representations of lists back into actual lists
-                all_data["POS_src"] = all_data["POS_src"].apply(ast.literal_eval)
-
-                all_data["Lemma_src"] = all_data["Lemma_src"].apply(ast.literal_eval)
-
-                all_data["Token_src"] = all_data["Token_src"].apply(ast.literal_eval)
                 # Explode the lists
                 exploded = all_data.explode(["POS_src", "Lemma_src", "Token_src"])
                 # remove duplicates for count alignments
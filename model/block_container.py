@@ -0,0 +1,224 @@
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.compressed_file import CompressedFile
+
+
+class BlockContainer:
+    """Alignment file stored as independently compressed blocks (.txt.bgz)
+
+       Every block holds whole alignments (it ends after a "====" separator
+       line) and is a gzip member of its own, so the container is also a
+       valid gzip file which can be read from start to end. The block
+       directory in the sidecar stores the compressed and decompressed
+       offset and the first line of every block and the block of every
+       document. Lines are read by decompressing only the blocks they are
+       in, the last used blocks are kept in memory.
+
+       The container can be used like bytes (slicing, find, len), e.g. as
+       buffer of MappedSearch.
+    """
+    SUFFIX = ".bgz"
+    # bytes of text per block before it is closed at the next separator
+    BLOCK_SIZE = 256 * 1024
+    # decompressed blocks kept in memory
+    CACHED_BLOCKS = 16
+    VERSION = 1
+
+    def __init__(self, path, rebuild=False):
+        self.__path = path
+        self.__index_path = AlignmentIndex.sidecar_path(path, "blocks.npz")
+        self.__index = AlignmentIndex(path)
+        self.__compressed = None
+        self.__starts = None
+        self.__first_lines = None
+        self.__documents = None
+        self.__cache = OrderedDict()
+        # the container can be shared by searches running in several threads
+        self.__lock = threading.Lock()
+        if rebuild or not self.__load():
+            self.__build()
+            self.__save()
+
+    @staticmethod
+    def is_container(path):
+        return str(path).endswith(BlockContainer.SUFFIX)
+
+    @staticmethod
+    def write_container(path, out_path=None, block_size=BLOCK_SIZE):
+        """ Write (compressed) alignment file as block container
+
+        @param path: path of the alignment file
+        @param out_path: path of the container, default is path with .bgz
+        @param block_size: bytes of text per block
+        @return: path of the container
+        """
+        if out_path is None:
+            stem = str(path)
+            for suffix in CompressedFile.SUFFIXES:
+                stem = stem[:-len(suffix)] if stem.endswith(suffix) else stem
+            out_path = f"{stem}{BlockContainer.SUFFIX}"
+        tmp_path = f"{out_path}.tmp"
+        with CompressedFile.open(path, "rb") as file_in, open(tmp_path, "wb") as file_out:
+            block = []
+            size = 0
+            for line in file_in:
+                block.append(line)
+                size += len(line)
+                # blocks are only cut after a separator to keep alignments whole
+                if size >= block_size and line.startswith(b"="):
+                    file_out.write(gzip.compress(b"".join(block), mtime=0))
+                    block = []
+                    size = 0
+            if block:
+                file_out.write(gzip.compress(b"".join(block), mtime=0))
+        os.replace(tmp_path, out_path)
+        return out_path
+
+    def __load(self):
+        if not os.path.exists(self.__index_path):
+            return False
+        with np.load(self.__index_path, allow_pickle=False) as data:
+            if not AlignmentIndex.is_current(self.__path, data["fingerprint"],
+                                             data["version"], self.VERSION):
+                return False
+            self.__compressed = data["compressed"]
+            self.__starts = data["starts"]
+            self.__first_lines = data["first_lines"]
+            self.__documents = data["documents"]
+        return True
+
+    def __build(self):
+        # find the gzip members by decompressing the container once
+        compressed = [0]
+        starts = [0]
+        with open(self.__path, "rb") as file_in:
+            decompressor = zlib.decompressobj(wbits=31)
+            position = 0
+            size = 0
+            data = file_in.read(1024 ** 2)
+            while data:
+                size += len(decompressor.decompress(data))
+                if decompressor.eof:
+                    # rest of the data belongs to the next member
+                    position += len(data) - len(decompressor.unused_data)
+                    data = decompressor.unused_data
+                    compressed.append(position)
+                    starts.append(size)
+                    decompressor = zlib.decompressobj(wbits=31)
+                    if not data:
+                        data = file_in.read(1024 ** 2)
+                else:
+                    position += len(data)
+                    data = file_in.read(1024 ** 2)
+        self.__compressed = np.array(compressed, dtype=np.int64)
+        self.__starts = np.array(starts, dtype=np.int64)
+        offsets = self.__index.get_offsets()
+        self.__first_lines = np.searchsorted(offsets, self.__starts).astype(np.int64)
+        self.__documents = self.get_blocks(self.__index.get_headers())
+
+    def __save(self):
+        os.makedirs(os.path.dirname(self.__index_path), exist_ok=True)
+        tmp_path = f"{self.__index_path}.tmp.npz"
+        np.savez(tmp_path, compressed=self.__compressed, starts=self.__starts,
+                 first_lines=self.__first_lines, documents=self.__documents,
+                 fingerprint=AlignmentIndex.fingerprint(self.__path),
+                 version=np.int64(self.VERSION))
+        os.replace(tmp_path, self.__index_path)
+
+    def get_index(self):
+        return self.__index
+
+    def get_block_count(self):
+        return len(self.__starts) - 1
+
+    def get_blocks(self, line_numbers):
+        """ Get blocks of lines, e.g. of the matches of a search
+
+        @param line_numbers: line numbers
+        @return: array with block of every line
+        """
+        return (np.searchsorted(self.__first_lines, np.asarray(line_numbers, dtype=np.int64),
+                                side="right") - 1).astype(np.int64)
+
+    def get_document_blocks(self):
+        # block of the header lines of every document
+        return self.__documents
+
+    def get_block(self, number):
+        """ Get decompressed text of a block
+
+        @param number: number of the block
+        @return: text of the block as bytes
+        """
+        with self.__lock:
+            block = self.__cache.get(number)
+            if block is not None:
+                self.__cache.move_to_end(number)
+                return block
+        with open(self.__path, "rb") as file_in:
+            file_in.seek(int(self.__compressed[number]))
+            data = file_in.read(int(self.__compressed[number + 1] - self.__compressed[number]))
+        block = gzip.decompress(data)
+        with self.__lock:
+            self.__cache[number] = block
+            if len(self.__cache) > self.CACHED_BLOCKS:
+                self.__cache.popitem(last=False)
+        return block
+
+    def get_memory_size(self):
+        # block directory, index and at most CACHED_BLOCKS decompressed blocks
+        arrays = [self.__compressed, self.__starts, self.__first_lines, self.__documents]
+        return sum(array.nbytes for array in arrays) + self.__index.get_memory_size() + \
+            self.CACHED_BLOCKS * self.BLOCK_SIZE
+
+    def __len__(self):
+        return int(self.__starts[-1])
+
+    def __getitem__(self, key):
+        # bytes between two offsets of the decompressed text
+        start, stop, _ = key.indices(len(self))
+        if start >= stop:
+            return b""
+        first = int(np.searchsorted(self.__starts, start, side="right")) - 1
+        last = int(np.searchsorted(self.__starts, stop, side="left"))
+        data = b"".join(self.get_block(number) for number in range(first, last))
+        offset = int(self.__starts[first])
+        return data[start - offset:stop - offset]
+
+    def find(self, sub, start=0, end=None):
+        """ Find bytes in the decompressed text block by block
+            (see bytes.find)
+
+        @param sub: bytes to find
+        @param start: first offset
+        @param end: offset after the end
+        @return: lowest offset of sub or -1
+        """
+        end = len(self) if end is None else min(end, len(self))
+        first = int(np.searchsorted(self.__starts, start, side="right")) - 1
+        for number in range(max(first, 0), self.get_block_count()):
+            block_start = int(self.__starts[number])
+            if block_start >= end:
+                break
+            # include the beginning of the next block for matches across blocks
+            stop = min(int(self.__starts[number + 1]) + len(sub) - 1, end)
+            position = self[max(start, block_start):stop].find(sub)
+            if position != -1:
+                return max(start, block_start) + position
+        return -1
+
+    def read_lines(self, line_numbers):
+        """ Read single lines from the blocks they are in
+            (see AlignmentIndex.read_lines)
+
+        @param line_numbers: line numbers to be read
+        @return: list of lines (without line break) in the given order
+        """
+        offsets = self.__index.get_offsets()
+        return [AlignmentIndex.decode_line(self[int(offsets[number]):int(offsets[number + 1])])
+                for number in line_numbers]
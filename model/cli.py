@@ -0,0 +1,209 @@
+import argparse
+import os
+import re
+import sys
+import time
+import pandas as pd
+from model.regex_engine import RegexEngine, RegexTimeout
+from model.search_runner import SearchRunner
+from model.search_session import SearchSession
+
+# data directory of the app, default for alignment files and search results
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        os.pardir, "data"))
+# language pair and format in the names of generated alignment files
+FILE_NAME = re.compile(r'_(\w{2})_(\w{2})_(\d+)(_parsed)?(_normal)?\.txt(?:\.gz|\.zst|\.bgz)?')
+TRUE = ("1", "true", "yes", "y")
+
+
+def read_manifest(path):
+    """ Read query manifest, a csv file (or json lines for .jsonl) with
+        one search per row
+
+        Columns: file (name in the directory of alignment files or
+        absolute path) and regex (required), mode (monolingual or
+        bilingual), lang (language searched in monolingual mode, name or
+        code, default source language), l1 and l2 (default from file
+        name), stats, context, pre_context, post_context, anno and
+        caseinsensitive.
+
+    @param path: path of the manifest
+    @return: list of queries (dictionaries)
+    """
+    if str(path).endswith((".jsonl", ".json")):
+        manifest = pd.read_json(path, lines=True, dtype=False)
+    else:
+        # regexes must not be read as numbers or missing values
+        manifest = pd.read_csv(path, dtype=str, keep_default_na=False)
+    missing = {"file", "regex"} - set(manifest.columns)
+    if missing:
+        raise ValueError(f"manifest {path} has no column {', '.join(sorted(missing))}")
+    queries = []
+    for row in manifest.to_dict("records"):
+        # empty cells take the default
+        queries.append({key: value for key, value in row.items()
+                        if not (value is None or value == "" or
+                                (isinstance(value, float) and pd.isna(value)))})
+    return queries
+
+
+def get_languages(path):
+    # language names by code, like on the search page
+    languages = pd.read_csv(path)
+    return {str(code).strip(): str(language).strip()
+            for code, language in zip(languages["code"], languages["language"])}
+
+
+def to_bool(value):
+    return value if isinstance(value, bool) else str(value).strip().lower() in TRUE
+
+
+def get_settings(query, args, languages):
+    """ Get settings of a query for SearchRunner
+
+    @param query: row of the manifest
+    @param args: parsed command line arguments
+    @param languages: language names by code
+    @return: dictionary of settings
+    """
+    file = str(query["file"])
+    search_path = file if os.path.isabs(file) else os.path.join(args.gen_path, file)
+    match = FILE_NAME.search(os.path.basename(file))
+    l1 = query.get("l1", match.group(1) if match else None)
+    l2 = query.get("l2", match.group(2) if match else None)
+    if l1 is None or l2 is None:
+        raise ValueError(f"languages of {file} are not in the file name, "
+                         f"add columns l1 and l2")
+    l1 = languages.get(str(l1), str(l1))
+    l2 = languages.get(str(l2), str(l2))
+    lang = str(query.get("lang", l1))
+    # invalid regexes would fail the single pass of all queries of the file
+    RegexEngine.compile(str(query["regex"]), engine=args.engine)
+    mode = str(query.get("mode", "bilingual")).strip().lower()
+    if mode not in ("monolingual", "bilingual"):
+        raise ValueError(f"unknown mode {mode}")
+    options = {"caseinsensitive": to_bool(query.get("caseinsensitive", False)),
+               "stats": to_bool(query.get("stats", True)),
+               "context": to_bool(query.get("context", True)),
+               # same as the search page, only normal files are not parsed
+               "parsed": not (match and match.group(5)),
+               "pre_context": int(query.get("pre_context", 1)),
+               "post_context": int(query.get("post_context", 1)),
+               "anno": to_bool(query.get("anno", False)),
+               "mapped": args.mapped, "workers": args.workers,
+               "trigrams": args.trigrams, "columnar": args.columnar,
+               "memory_limit": args.memory_limit * 1024 ** 2 if args.memory_limit else None,
+               "engine": args.engine, "timeout": args.timeout or None}
+    return SearchRunner.get_settings(search_path, str(query["regex"]), args.root_path,
+                                     l1=l1, l2=l2, lang_mode=mode,
+                                     mono_lang=languages.get(lang, lang), **options)
+
+
+def search(args):
+    """ Run all queries of the manifest, every alignment file is read once
+        for all of its queries
+
+    @param args: parsed command line arguments
+    @return: number of failed queries
+    """
+    queries = read_manifest(args.manifest)
+    languages = get_languages(args.languages)
+    os.makedirs(args.root_path, exist_ok=True)
+    # queries grouped by alignment file in order of first occurrence
+    files = {}
+    for number, query in enumerate(queries, start=1):
+        try:
+            settings = get_settings(query, args, languages)
+        except (KeyError, ValueError, ImportError, re.error) as error:
+            settings = error
+        path = settings["search_path"] if isinstance(settings, dict) else None
+        files.setdefault(path, []).append((number, query, settings))
+    failed = 0
+    total_start = time.perf_counter()
+    for path, file_queries in files.items():
+        session = None
+        if path is not None:
+            start = time.perf_counter()
+            try:
+                # all regexes of the file are searched in the first pass
+                session = SearchSession(path, regexes=[settings["regex"] for _, _, settings
+                                                       in file_queries],
+                                        mapped=args.mapped, workers=args.workers,
+                                        trigrams=args.trigrams, engine=args.engine,
+                                        timeout=args.timeout or None)
+            except OSError as error:
+                file_queries = [(number, query, error) for number, query, _ in file_queries]
+            else:
+                print(f"loaded {path} in {time.perf_counter() - start:.2f}s")
+        for number, query, settings in file_queries:
+            label = f"[{number}/{len(queries)}] {query.get('file')} {query.get('regex')}"
+            if not isinstance(settings, dict):
+                failed += 1
+                print(f"{label}: failed ({settings})")
+                continue
+            start = time.perf_counter()
+            try:
+                result = SearchRunner.run(settings, session=session)
+            except (re.error, OSError, ValueError, RegexTimeout) as error:
+                failed += 1
+                print(f"{label}: failed ({error})")
+                continue
+            seconds = time.perf_counter() - start
+            if result["no_matches"]:
+                print(f"{label}: no matches ({seconds:.2f}s)")
+                continue
+            paths = [result[key] for key in ("path_qual", "path_quant", "path_stats")
+                     if result[key]]
+            print(f"{label}: {seconds:.2f}s")
+            for created in paths:
+                print(f"    {os.path.abspath(created)}")
+    print(f"{len(queries) - failed} of {len(queries)} queries in "
+          f"{time.perf_counter() - total_start:.2f}s")
+    return failed
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="python -m model.cli",
+                                     description="Search generated alignment files "
+                                                 "without the app")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search_parser = commands.add_parser("search", help="run the queries of a manifest")
+    search_parser.add_argument("manifest", help="csv (or .jsonl) file with columns file, "
+                                                "regex, mode, lang, stats, context, "
+                                                "pre_context, post_context, anno, "
+                                                "caseinsensitive")
+    search_parser.add_argument("--gen-path", default=os.path.join(DATA_DIR, "generated"),
+                               help="directory of the alignment files")
+    search_parser.add_argument("--root-path", default=os.path.join(DATA_DIR, "search_results"),
+                               help="directory for the created files")
+    search_parser.add_argument("--languages",
+                               default=os.path.join(DATA_DIR, "language_pairs", "languages.csv"),
+                               help="csv file with language names and codes")
+    search_parser.add_argument("--mapped", action="store_true",
+                               help="memory-map the alignment files")
+    search_parser.add_argument("--workers", type=int, default=1,
+                               help="processes searching a file in parallel")
+    search_parser.add_argument("--trigrams", action="store_true",
+                               help="narrow searches with the trigram index")
+    search_parser.add_argument("--columnar", action="store_true",
+                               help="count statistics of parsed files on the columnar store")
+    search_parser.add_argument("--engine", choices=RegexEngine.ENGINES, default="auto",
+                               help="regex engine, auto searches regexes which can take "
+                                    "very long with regex if installed")
+    search_parser.add_argument("--timeout", type=float, default=0,
+                               help="time limit in seconds for a pass over a file, "
+                                    "0 for no limit")
+    search_parser.add_argument("--memory-limit", type=int, default=0,
+                               help="memory limit in MB for statistics of unparsed files")
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if args.command == "search":
+        return 1 if search(args) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import re
+from array import array
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.annotation_index import AnnotationIndex
+from model.compressed_file import CompressedFile
+
+
+class ColumnarStore:
+    """Columnar copy of the annotations (token_#POS_#lemma) of a
+       generated alignment file
+
+       Tokens, POS tags and lemmas of all (src) and (trg) lines are
+       stored as dictionary-encoded integer arrays (.npy) in the sidecar
+       directory, together with the position of the first token of every
+       line. The arrays are memory-mapped, so annotations of single lines
+       are sliced out instead of being parsed from text again.
+    """
+    VERSION = 1
+    COLUMNS = ("token", "POS", "lemma")
+    # line has white space between ID and first token
+    SPACED = 1
+    # line cannot be restored from the columns and has to be parsed
+    IRREGULAR = 2
+    __id_pattern = re.compile(r'\((?:src|trg)\)="[0-9]+">')
+
+    def __init__(self, path, rebuild=False):
+        self.__path = path
+        self.__meta_path = AlignmentIndex.sidecar_path(path, "columns.npz")
+        self.__index = AlignmentIndex(path)
+        self.__arrays = {}
+        # decoded entries of the vocabularies
+        self.__strings = {column: {} for column in self.COLUMNS}
+        if rebuild or not self.__load():
+            self.__build()
+            self.__load()
+
+    def __array_path(self, name):
+        return AlignmentIndex.sidecar_path(self.__path, f"columns_{name}.npy")
+
+    def __array_names(self):
+        names = ["line_starts", "flags"]
+        for column in self.COLUMNS:
+            names.extend([column, f"{column}_vocabulary", f"{column}_vocabulary_starts"])
+        return names
+
+    def __load(self):
+        if not os.path.exists(self.__meta_path):
+            return False
+        with np.load(self.__meta_path, allow_pickle=False) as data:
+            if not AlignmentIndex.is_current(self.__path, data["fingerprint"],
+                                             data["version"], self.VERSION):
+                return False
+        for name in self.__array_names():
+            if not os.path.exists(self.__array_path(name)):
+                return False
+        for name in self.__array_names():
+            try:
+                self.__arrays[name] = np.load(self.__array_path(name), mmap_mode="r")
+            except ValueError:
+                # empty arrays cannot be memory-mapped
+                self.__arrays[name] = np.load(self.__array_path(name))
+        return True
+
+    def __build(self):
+        kinds = self.__index.get_kinds()
+        ids = self.__index.get_ids()
+        vocabularies = {column: {} for column in self.COLUMNS}
+        codes = {column: array("i") for column in self.COLUMNS}
+        line_starts = array("q", [0])
+        flags = bytearray()
+        with CompressedFile.open(self.__path, "rb") as file_in:
+            for number, raw in enumerate(file_in):
+                line = AlignmentIndex.decode_line(raw)
+                prefix = self.get_prefix(number, kinds, ids)
+                # only lines with exactly one ID in the usual form are stored
+                if prefix is None or not line.startswith(prefix) or \
+                        len(self.__id_pattern.findall(line)) != 1:
+                    flags.append(self.IRREGULAR)
+                    line_starts.append(line_starts[-1])
+                    continue
+                text = line[len(prefix):]
+                annotations = AnnotationIndex.split_annotations(text)
+                for column, values in zip(self.COLUMNS, annotations):
+                    vocabulary = vocabularies[column]
+                    codes[column].extend(vocabulary.setdefault(value, len(vocabulary))
+                                         for value in values)
+                flags.append(self.SPACED if annotations[0] and text[:1].isspace()
+                             else 0)
+                line_starts.append(line_starts[-1] + len(annotations[0]))
+        arrays = {"line_starts": np.frombuffer(line_starts, dtype=np.int64),
+                  "flags": np.frombuffer(bytes(flags), dtype=np.uint8)}
+        for column in self.COLUMNS:
+            arrays[column] = np.frombuffer(codes[column], dtype=np.int32)
+            # vocabulary is stored as UTF-8 bytes with start of every entry
+            encoded = [value.encode("utf-8") for value in vocabularies[column]]
+            arrays[f"{column}_vocabulary"] = np.frombuffer(b"".join(encoded),
+                                                           dtype=np.uint8)
+            arrays[f"{column}_vocabulary_starts"] = np.cumsum(
+                [0] + [len(value) for value in encoded], dtype=np.int64)
+        os.makedirs(os.path.dirname(self.__meta_path), exist_ok=True)
+        for name, values in arrays.items():
+            np.save(self.__array_path(name), values)
+        # write validation data last so incomplete stores are rebuilt
+        tmp_path = f"{self.__meta_path}.tmp.npz"
+        np.savez(tmp_path, fingerprint=AlignmentIndex.fingerprint(self.__path),
+                 version=np.int64(self.VERSION))
+        os.replace(tmp_path, self.__meta_path)
+
+    @staticmethod
+    def get_prefix(number, kinds, ids):
+        """ Get ID of a (src) or (trg) line as written in alignment files
+
+        @param number: line number
+        @param kinds: kinds of lines from the alignment index
+        @param ids: IDs of lines from the alignment index
+        @return: ID like (src)="1"> or None for other lines
+        """
+        if ids[number] < 0:
+            return None
+        if kinds[number] == AlignmentIndex.SRC:
+            return f'(src)="{ids[number]}">'
+        if kinds[number] == AlignmentIndex.TRG:
+            return f'(trg)="{ids[number]}">'
+        return None
+
+    def get_index(self):
+        return self.__index
+
+    def is_regular(self, number):
+        return not self.__arrays["flags"][number] & self.IRREGULAR
+
+    def __decode(self, column, codes):
+        strings = self.__strings[column]
+        vocabulary = self.__arrays[f"{column}_vocabulary"]
+        starts = self.__arrays[f"{column}_vocabulary_starts"]
+        values = []
+        for code in codes.tolist():
+            if code not in strings:
+                strings[code] = bytes(
+                    vocabulary[starts[code]:starts[code + 1]]).decode("utf-8")
+            values.append(strings[code])
+        return values
+
+    def get_annotations(self, number):
+        """ Get tokens, POS tags and lemmas of a line
+            (see AnnotationIndex.split_annotations)
+
+        @param number: line number of a regular line
+        @return: lists with tokens, POS tags and lemmas
+        """
+        start, end = self.__arrays["line_starts"][number:number + 2]
+        return tuple(self.__decode(column, self.__arrays[column][start:end])
+                     for column in self.COLUMNS)
+
+    def get_line_key(self, number):
+        """ Get tokens of a line including its ID joined by white space,
+            as PreprocessingParsed uses them to identify alignments
+
+        @param number: line number of a regular line
+        @return: joined tokens
+        """
+        start, end = self.__arrays["line_starts"][number:number + 2]
+        prefix = self.get_prefix(number, self.__index.get_kinds(),
+                                 self.__index.get_ids())
+        tokens = " ".join(self.__decode("token", self.__arrays["token"][start:end]))
+        if self.__arrays["flags"][number] & self.SPACED:
+            return f"{prefix} {tokens}"
+        return f"{prefix}{tokens}"
@@ -0,0 +1,83 @@
+import gzip
+import io
+try:
+    import zstandard
+except ImportError:
+    # .zst files can only be read if zstandard is installed
+    zstandard = None
+
+
+class ForwardReader(io.BufferedReader):
+    """Buffered reader of a zstd stream, which can be iterated by line and
+       seek forward like gzip files
+
+    """
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("compressed files can only seek from the start")
+        skip = offset - self.tell()
+        if skip < 0:
+            raise io.UnsupportedOperation("compressed files can only seek forward")
+        while skip > 0:
+            chunk = self.read(min(skip, 1024 ** 2))
+            if not chunk:
+                break
+            skip -= len(chunk)
+        return self.tell()
+
+
+class CompressedFile:
+    """Open alignment files which are stored compressed (.txt.gz,
+       .txt.zst or block containers .txt.bgz) like uncompressed files
+
+       The files are decompressed while they are read, so they never have
+       to be unpacked on the (external) drive. Offsets of the sidecar
+       index refer to the decompressed text. Compressed files can be read
+       from start to end and seek forward, but not memory-mapped.
+    """
+    SUFFIXES = (".gz", ".zst", ".bgz")
+
+    @staticmethod
+    def is_compressed(path):
+        return str(path).endswith(CompressedFile.SUFFIXES)
+
+    @staticmethod
+    def open(path, mode="rb"):
+        """ Open (compressed) file for reading
+
+        @param path: path of the alignment file
+        @param mode: "rb" for bytes or "r" for text
+        @return: file object
+        """
+        binary = "b" in mode
+        path = str(path)
+        if path.endswith((".gz", ".bgz")):
+            # block containers consist of gzip members
+            file_in = gzip.open(path, "rb")
+        elif path.endswith(".zst"):
+            if zstandard is None:
+                raise ImportError(f"the package zstandard is needed to read {path}")
+            # the reader of zstandard cannot be iterated by line
+            file_in = ForwardReader(zstandard.open(path, "rb"))
+        else:
+            return open(path, "rb") if binary else open(path, "r", encoding="utf-8")
+        if binary:
+            return file_in
+        # same line breaks as reading uncompressed files in text mode
+        return io.TextIOWrapper(file_in, encoding="utf-8")
+
+    @staticmethod
+    def read(path):
+        """ Read the whole decompressed file
+
+        @param path: path of the alignment file
+        @return: content as bytes
+        """
+        with CompressedFile.open(path, "rb") as file_in:
+            return file_in.read()
@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+from model.alignment_index import AlignmentIndex
+
+
+class CorpusPool:
+    """Loaded alignment files kept in memory for later searches
+
+       A corpus is the object a search reads the file with (Preprocessing
+       or MappedSearch). The pool keeps corpora up to a budget of bytes
+       (estimated with get_memory_size of the corpus) and drops the least
+       recently used ones first. A corpus is loaded again if the file has
+       changed since it was loaded. The pool can be shared by searches
+       running in several threads.
+    """
+    # default budget of the pool
+    MAX_BYTES = 2 * 1024 ** 3
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.__max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        # key: (corpus, fingerprint, size)
+        self.__corpora = OrderedDict()
+
+    def __len__(self):
+        return len(self.__corpora)
+
+    def get_size(self):
+        with self.__lock:
+            return sum(size for _, _, size in self.__corpora.values())
+
+    def set_max_bytes(self, max_bytes):
+        with self.__lock:
+            self.__max_bytes = max_bytes
+            self.__evict()
+
+    def __evict(self):
+        # drop least recently used corpora until the pool fits the budget
+        size = sum(size for _, _, size in self.__corpora.values())
+        while self.__corpora and size > self.__max_bytes:
+            _, (_, _, dropped) = self.__corpora.popitem(last=False)
+            size -= dropped
+
+    def get(self, path, factory, **kwargs):
+        """ Get loaded corpus of an alignment file, load it if it is not in
+            the pool or the file has changed
+
+        @param path: path of the alignment file
+        @param factory: class of the corpus, called with path and kwargs
+        @param kwargs: arguments of the corpus, e.g. workers
+        @return: corpus
+        """
+        key = (os.path.abspath(path), factory.__name__, tuple(sorted(kwargs.items())))
+        fingerprint = AlignmentIndex.fingerprint(path).tolist()
+        with self.__lock:
+            entry = self.__corpora.get(key)
+            if entry is not None and entry[1] == fingerprint:
+                self.__corpora.move_to_end(key)
+                return entry[0]
+            # changed files are loaded again
+            self.__corpora.pop(key, None)
+        # loaded without lock, searches of other files are not blocked
+        corpus = factory(path, **kwargs)
+        size = corpus.get_memory_size()
+        with self.__lock:
+            # corpora larger than the budget are not kept
+            if size <= self.__max_bytes:
+                self.__corpora[key] = (corpus, fingerprint, size)
+                self.__evict()
+        return corpus
+
+    def clear(self):
+        with self.__lock:
+            self.__corpora.clear()
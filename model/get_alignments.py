@@ -1,9 +1,40 @@
+import gzip
 import os
+import shutil
 import sys
+import tempfile
 import opustools
+try:
+    import zstandard
+except ImportError:
+    # output can only be compressed with zstd if zstandard is installed
+    zstandard = None
+# make model package importable when the script is run directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model.block_container import BlockContainer
 
 
-def prepare_alignments(source_path, gen_path, src, trg, limit, parsed=False, time_stamps=False):
+def compress_file(path, out_path, compression):
+    if compression == "bgz":
+        # independently compressed blocks for random access
+        BlockContainer.write_container(path, out_path)
+        return
+    # compress in chunks, the file is never held in memory
+    with open(path, "rb") as file_in:
+        if compression == "gz":
+            with gzip.open(out_path, "wb", compresslevel=6) as file_out:
+                shutil.copyfileobj(file_in, file_out, 1024 ** 2)
+        else:
+            with open(out_path, "wb") as file_out:
+                zstandard.ZstdCompressor(level=3, threads=-1).copy_stream(file_in, file_out)
+
+
+def prepare_alignments(source_path, gen_path, src, trg, limit, parsed=False, time_stamps=False,
+                       compression=None):
+    if compression not in (None, "gz", "zst", "bgz"):
+        raise ValueError(f"unknown compression {compression}")
+    if compression == "zst" and zstandard is None:
+        raise ImportError("the package zstandard is needed to write .zst files")
     # Set parameter for time stamps to be included
     stamp = True if time_stamps else False
     # Set parameters according to option "parsed"
@@ -11,6 +42,13 @@ def prepare_alignments(source_path, gen_path, src, trg, limit, parsed=False, tim
     def_anno = ['upos', 'lemma'] if parsed else [""]
     delimiter = " " if parsed is False else "_#"
     preprocess = "parsed" if parsed else "xml"
+    out_path = os.path.join(gen_path, f'alignments_{src}_{trg}_{limit}_normal.txt') if parsed is False \
+        else os.path.join(gen_path, f'alignments_{src}_{trg}_{limit}_parsed.txt')
+    write_path = out_path
+    if compression is not None:
+        # text is written to the local temporary directory and compressed onto the (external) drive
+        handle, write_path = tempfile.mkstemp(suffix=".txt")
+        os.close(handle)
     opus_reader = opustools.OpusRead(
         directory='OpenSubtitles',
         source=src,
@@ -20,8 +58,7 @@ def prepare_alignments(source_path, gen_path, src, trg, limit, parsed=False, tim
         src_range="1-2",
         tgt_range="1-2",
         preprocess=preprocess,
-        write=[os.path.join(gen_path, f'alignments_{src}_{trg}_{limit}_normal.txt') if parsed is False
-               else os.path.join(gen_path, f'alignments_{src}_{trg}_{limit}_parsed.txt')],
+        write=[write_path],
         write_mode='normal',  # moses , tmx
         leave_non_alignments_out=True,
         print_annotations=anno,
@@ -32,13 +69,21 @@ def prepare_alignments(source_path, gen_path, src, trg, limit, parsed=False, tim
         suppress_prompts=False,
         preserve_inline_tags=stamp
     )
-    opus_reader.printPairs()
+    try:
+        opus_reader.printPairs()
+        if compression is not None:
+            # write compressed file next to where the text file would be
+            compress_file(write_path, f"{out_path}.{compression}", compression)
+    finally:
+        if compression is not None:
+            os.remove(write_path)
 
 
 def main():
     # Parse command-line arguments
-    if len(sys.argv) != 7:
-        print("Usage: python your_script.py source_dir generated_dir lang1 lang2 max_length")
+    if len(sys.argv) not in (7, 8):
+        print("Usage: python your_script.py source_dir generated_dir lang1 lang2 max_length "
+              "format [gz|zst|bgz]")
         sys.exit(1)
     source_path = sys.argv[1]
     gen_path = sys.argv[2]
@@ -47,9 +92,10 @@ def main():
     max_length = int(sys.argv[5])
     parsed = sys.argv[6]
     parsed = False if parsed == "normal" else True
+    compression = sys.argv[7] if len(sys.argv) == 8 else None
     # Call the function with the parsed arguments
     prepare_alignments(source_path=source_path, gen_path=gen_path, src=lang1, trg=lang2, limit=max_length,
-                       parsed=parsed)
+                       parsed=parsed, compression=compression)
 
 
 if __name__ == '__main__':
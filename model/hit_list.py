@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.mapped_search import MappedSearch
+from model.search_session import SearchSession
+
+
+class HitList:
+    """Matches of a search stored as line numbers in the sidecar directory
+       of the alignment file, to write context with other settings without
+       searching the alignment file again
+
+       The hit list keeps the line numbers of the matches, the file pair
+       (document) of every match, the regex, the pattern for (src) or
+       (trg) lines, case sensitivity, the regex engine (engines differ,
+       e.g. re2 matches \\w only for ASCII) and the fingerprint of the alignment
+       file. It is passed as search to the context and statistics
+       classes, which read only the matches and their context from the
+       memory-mapped alignment file. Hit lists are a cache, only the
+       MAX_FILES most recently written are kept for an alignment file.
+    """
+    VERSION = 2
+    # hit lists kept in the sidecar directory of an alignment file
+    MAX_FILES = 100
+
+    def __init__(self, path):
+        self.__path = path
+        with np.load(path, allow_pickle=False) as data:
+            self.__search_path = str(data["search_path"])
+            if not os.path.exists(self.__search_path) or not AlignmentIndex.is_current(
+                    self.__search_path, data["fingerprint"], data["version"], self.VERSION):
+                raise ValueError(f"hit list {path} does not belong to the current "
+                                 f"version of {self.__search_path}")
+            self.__regex = str(data["regex"])
+            self.__src_pattern = str(data["src_pattern"])
+            self.__caseinsensitive = bool(data["caseinsensitive"])
+            self.__engine = str(data["engine"])
+            self.__lines = data["lines"]
+            self.__documents = data["documents"]
+            self.__files = data["files"].tolist()
+        self.__search = None
+        self.__text_list = None
+
+    @staticmethod
+    def get_path(search_path, regex, src_pattern, caseinsensitive=False, engine="re"):
+        """ Get path of the hit list of a search
+
+        @param search_path: path of alignment file
+        @param regex: regular expression given by user
+        @param src_pattern: pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @param engine: engine searching the regex (RegexEngine.choose)
+        @return: path in the sidecar directory, named by a hash of the search
+        """
+        key = json.dumps([regex, src_pattern, caseinsensitive, engine]).encode("utf-8")
+        return AlignmentIndex.sidecar_path(search_path,
+                                           f"hits_{hashlib.sha1(key).hexdigest()[:16]}.npz")
+
+    @staticmethod
+    def __prune(path):
+        # remove least recently written hit lists beyond MAX_FILES
+        directory = os.path.dirname(path)
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)
+                 if name.startswith("hits_") and name.endswith(".npz")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for old_path in paths[HitList.MAX_FILES:]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def write_hit_list(path, search_path, regex, src_pattern, caseinsensitive=False,
+                       search=None, engine="re"):
+        """ Search alignment file (or take results of given search) and
+            write hit list
+
+        @param path: path of hit list (.npz)
+        @param search_path: path of alignment file
+        @param regex: regular expression given by user
+        @param src_pattern: pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @param search: search object with results (e.g. SearchSession)
+        @param engine: engine of the search (RegexEngine.choose)
+        @return: path of hit list
+        """
+        if search is None:
+            search = SearchSession(search_path, mapped=True, engine=engine)
+        _, indices, files = search.get_matches_index_files(
+            search.get_text_list(), regex, re.compile(src_pattern),
+            caseinsensitive=caseinsensitive)
+        # lines of all lines list are numbered like the lines of the file
+        files, documents = np.unique(np.array(files, dtype=str), return_inverse=True)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, lines=np.array(indices, dtype=np.int64),
+                 documents=documents.astype(np.int32), files=files,
+                 search_path=np.array(os.path.abspath(search_path)),
+                 regex=np.array(regex), src_pattern=np.array(src_pattern),
+                 caseinsensitive=np.bool_(caseinsensitive), engine=np.array(engine),
+                 fingerprint=AlignmentIndex.fingerprint(search_path),
+                 version=np.int64(HitList.VERSION))
+        os.replace(tmp_path, path)
+        if os.path.dirname(path).endswith(AlignmentIndex.SIDECAR_SUFFIX):
+            HitList.__prune(path)
+        return path
+
+    @staticmethod
+    def find(path, search_path, regex, src_pattern, caseinsensitive=False, engine="re"):
+        """ Load hit list if it exists and belongs to the search
+
+        @param path: path of hit list (.npz)
+        @param search_path: path of alignment file
+        @param regex: regular expression given by user
+        @param src_pattern: pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @param engine: engine of the search (RegexEngine.choose)
+        @return: hit list or None
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            hits = HitList(path)
+        except ValueError:
+            return None
+        if hits.get_search_path() != os.path.abspath(search_path) or \
+                not hits.is_search(regex, src_pattern, caseinsensitive, engine):
+            return None
+        return hits
+
+    def get_search_path(self):
+        return self.__search_path
+
+    def get_lines(self):
+        return self.__lines
+
+    def get_documents(self):
+        return self.__documents
+
+    def is_search(self, regex, src_pattern, caseinsensitive=False, engine=None):
+        # engine None for a search with any engine, e.g. by the search classes
+        return regex == self.__regex and src_pattern == self.__src_pattern and \
+            caseinsensitive == self.__caseinsensitive and \
+            (engine is None or engine == self.__engine)
+
+    def __get_search(self):
+        if self.__search is None:
+            self.__search = MappedSearch(self.__search_path)
+            self.__text_list = self.__search.get_text_list()
+        return self.__search
+
+    def get_raw_text_list(self):
+        # lines with annotations are read through the index when needed
+        return None
+
+    def get_text_list(self, pattern=None, file_pattern=None):
+        """ Get lazy list of lines of the alignment file
+            (see MappedSearch.get_text_list)
+
+        @param pattern: compiled pattern for (src) or (trg) lines to keep
+        @param file_pattern: compiled pattern for file headers to keep
+        @return: all lines or only lines of one language and file headers
+        """
+        search = self.__get_search()
+        if pattern is None:
+            return self.__text_list
+        return search.get_text_list(pattern, file_pattern)
+
+    def get_matches_index_files(self, text_list, regex, src_pattern,
+                                caseinsensitive=False):
+        """ Get stored matches, their indices in text list and files
+            (see Processing.get_matches_index_files)
+
+        @param text_list: list of lines returned by get_text_list
+        @param regex: regular expression given by user
+        @param src_pattern: compiled pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @return: matches, indices in text list and files
+        """
+        if not self.is_search(regex, src_pattern.pattern, caseinsensitive):
+            raise ValueError(f"hit list {self.__path} was written for regex "
+                             f"{self.__regex}")
+        if text_list is self.__text_list:
+            indices = self.__lines
+        else:
+            # all matching lines are part of the monolingual text list
+            indices = np.searchsorted(text_list.get_line_numbers(), self.__lines)
+        matches = text_list[indices]
+        files = [self.__files[document] for document in self.__documents.tolist()]
+        return matches, indices.tolist(), files
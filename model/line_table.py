@@ -0,0 +1,185 @@
+import operator
+import re
+import sys
+import numpy as np
+import pandas as pd
+
+
+class LineTable:
+    """Table of distinct lines (or line bodies) of an alignment file
+
+       Subtitles repeat the same short lines very often. Every distinct
+       string gets an integer ID and is stored once, a corpus or a list
+       of matches is kept as an array of IDs. Lists built from the table
+       share the string objects, counts are computed on the IDs.
+    """
+    def __init__(self):
+        self.__ids = {}
+        self.__strings = []
+
+    def __len__(self):
+        return len(self.__strings)
+
+    def add(self, text):
+        """ Get ID of string, add it to the table if it is new
+
+        @param text: line or line body
+        @return: ID of string
+        """
+        text_id = self.__ids.get(text)
+        if text_id is None:
+            text_id = self.__ids[text] = len(self.__strings)
+            self.__strings.append(text)
+        return text_id
+
+    def add_all(self, texts):
+        """ Get IDs of all strings, new strings are added to the table
+
+        @param texts: iterable of strings
+        @return: array with ID of every string
+        """
+        return np.fromiter((self.add(text) for text in texts), dtype=np.int64)
+
+    @staticmethod
+    def from_strings(texts):
+        """ Build table of a list of strings at once, faster than add_all
+            for whole files
+
+        @param texts: list of strings
+        @return: table and array with ID of every string
+        """
+        table = LineTable()
+        ids, strings = pd.factorize(np.array(texts, dtype=object))
+        table.__strings = strings.tolist()
+        table.__ids = {text: text_id for text_id, text in enumerate(table.__strings)}
+        return table, ids.astype(np.int64)
+
+    def get(self, text_id):
+        return self.__strings[text_id]
+
+    def get_memory_size(self):
+        # bytes of the distinct strings and of the lookup structures
+        return sys.getsizeof(self.__ids) + sys.getsizeof(self.__strings) + \
+            sum(map(sys.getsizeof, self.__strings))
+
+    def get_all(self, ids):
+        """ Get strings of IDs, equal strings are the same object
+
+        @param ids: array or list of IDs
+        @return: list of strings
+        """
+        strings = self.__strings
+        return [strings[text_id] for text_id in np.asarray(ids, dtype=np.int64).tolist()]
+
+    def map(self, function):
+        """ Apply function once to every distinct string, e.g. to remove
+            annotation
+
+        @param function: function from string to string
+        @return: table of results and array mapping IDs to IDs of results
+        """
+        table = LineTable()
+        mapping = table.add_all(function(text) for text in self.__strings)
+        return table, mapping
+
+    @staticmethod
+    def count(ids):
+        """ Count IDs or rows of IDs (e.g. pairs of source and target)
+
+        @param ids: array of IDs, one column per table for rows
+        @return: distinct IDs or rows in order of first occurrence and
+                 their counts
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return ids, np.zeros(0, dtype=np.int64)
+        keys = ids
+        if ids.ndim == 2:
+            # one integer key per row
+            keys = np.zeros(len(ids), dtype=np.int64)
+            for column in ids.T:
+                keys = keys * (int(column.max()) + 1) + column
+        _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return ids[first[order]], counts[order]
+
+
+class InternedLines:
+    """Read-only list of the lines of an alignment file, stored as IDs of
+       line prefixes ((src)="n"> or (trg)="n">) and of line bodies
+
+       The line numbers in the prefixes make nearly every line distinct,
+       the bodies ("Oui.", "Merci.") repeat very often. Prefixes and bodies
+       are interned separately, a line is put together when it is
+       accessed.
+    """
+    # prefix of (src) and (trg) lines
+    PREFIX = re.compile(r'\((?:src|trg)\)="[0-9]+">')
+    # lines put together at once while iterating
+    CHUNK = 65536
+
+    def __init__(self, prefixes, prefix_ids, bodies, body_ids):
+        self.__prefixes = prefixes
+        self.__prefix_ids = prefix_ids
+        self.__bodies = bodies
+        self.__body_ids = body_ids
+
+    @staticmethod
+    def from_lines(lines):
+        """ Intern prefixes and bodies of lines
+
+        @param lines: iterable of lines
+        @return: InternedLines
+        """
+        lines = list(lines)
+        match_prefix = InternedLines.PREFIX.match
+        ends = [match.end() if match is not None else 0
+                for match in map(match_prefix, lines)]
+        prefixes, prefix_ids = LineTable.from_strings(
+            [line[:end] for line, end in zip(lines, ends)])
+        bodies, body_ids = LineTable.from_strings(
+            [line[end:] for line, end in zip(lines, ends)])
+        return InternedLines(prefixes, prefix_ids.astype(np.int32),
+                             bodies, body_ids.astype(np.int32))
+
+    def map_bodies(self, function):
+        """ Apply function once to every distinct body, e.g. to remove
+            annotation, prefixes are kept
+
+        @param function: function from string to string
+        @return: InternedLines with the results
+        """
+        bodies, mapping = self.__bodies.map(function)
+        return InternedLines(self.__prefixes, self.__prefix_ids, bodies,
+                             mapping[self.__body_ids].astype(np.int32))
+
+    def get_memory_size(self):
+        """ Get bytes of the ID arrays and of every distinct string
+
+        @return: bytes
+        """
+        return self.__prefix_ids.nbytes + self.__body_ids.nbytes + \
+            self.__prefixes.get_memory_size() + self.__bodies.get_memory_size()
+
+    def __len__(self):
+        return len(self.__body_ids)
+
+    def __get_lines(self, numbers):
+        return list(map(operator.add, self.__prefixes.get_all(self.__prefix_ids[numbers]),
+                        self.__bodies.get_all(self.__body_ids[numbers])))
+
+    def __getitem__(self, item):
+        if isinstance(item, (slice, np.ndarray, list)):
+            return self.__get_lines(item)
+        item = int(item)
+        return self.__prefixes.get(self.__prefix_ids[item]) + \
+            self.__bodies.get(self.__body_ids[item])
+
+    def __iter__(self):
+        for start in range(0, len(self), self.CHUNK):
+            yield from self.__get_lines(slice(start, start + self.CHUNK))
+
+    def __eq__(self, other):
+        if not isinstance(other, (InternedLines, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
@@ -0,0 +1,360 @@
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.block_container import BlockContainer
+from model.compressed_file import CompressedFile
+from model.pattern_analysis import PatternAnalysis
+from model.regex_engine import RegexEngine, RegexMatcher
+from model.trigram_index import TrigramIndex
+
+
+class MappedText:
+    """Read-only list of lines of a memory-mapped alignment file,
+       lines are only decoded (and cleaned) when they are accessed
+
+    """
+
+    def __init__(self, search, line_numbers):
+        self.__search = search
+        self.__line_numbers = line_numbers
+
+    def get_line_numbers(self):
+        return self.__line_numbers
+
+    def get_kinds(self):
+        return self.__search.get_index().get_kinds()[self.__line_numbers]
+
+    def __len__(self):
+        return len(self.__line_numbers)
+
+    def __getitem__(self, item):
+        if isinstance(item, (slice, np.ndarray)):
+            return self.__search.get_lines(self.__line_numbers[item])
+        return self.__search.get_line(self.__line_numbers[item])
+
+    def __iter__(self):
+        for number in self.__line_numbers:
+            yield self.__search.get_line(number)
+
+
+class MappedSearch:
+    """Search a memory-mapped alignment file with the sidecar index
+       without loading the whole file into memory
+
+    """
+    # search of the file opened in a worker process
+    __worker_search = None
+    # shards searched one after another to report progress of a search job
+    PROGRESS_SHARDS = 64
+
+    def __init__(self, path, workers=1, trigrams=False, text_path=None):
+        self.__path = path
+        # file which is mapped, the decompressed copy of compressed files
+        self.__text_path = path if text_path is None else text_path
+        self.__workers = workers
+        # worker processes are started with the first parallel search
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        self.__index = AlignmentIndex(path)
+        # trigram index narrows regex searches to candidate lines
+        self.__trigram_index = TrigramIndex(path) if trigrams else None
+        self.__offsets = self.__index.get_offsets()
+        if BlockContainer.is_container(path):
+            # only blocks with lines read are decompressed
+            self.__buffer = BlockContainer(path)
+            return
+        if text_path is None and CompressedFile.is_compressed(path):
+            # compressed files cannot be mapped, they are decompressed once into
+            # the local temporary directory, worker processes map the same copy
+            self.__text_path = self.__decompress(path)
+            self.__buffer = self.__map(self.__text_path)
+            # remove copy with the object
+            weakref.finalize(self, self.__remove_copy, self.__buffer, self.__text_path)
+            return
+        self.__buffer = self.__map(self.__text_path)
+
+    @staticmethod
+    def __decompress(path):
+        handle, text_path = tempfile.mkstemp(suffix=".txt")
+        try:
+            with os.fdopen(handle, "wb") as file_out, CompressedFile.open(path, "rb") as file_in:
+                shutil.copyfileobj(file_in, file_out, 1024 ** 2)
+        except BaseException:
+            os.remove(text_path)
+            raise
+        return text_path
+
+    @staticmethod
+    def __map(path):
+        with open(path, "rb") as file_in:
+            try:
+                return mmap.mmap(file_in.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                return b""
+
+    @staticmethod
+    def __remove_copy(buffer, path):
+        # mapped files cannot be removed on Windows
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+    def get_index(self):
+        return self.__index
+
+    def get_memory_size(self):
+        """ Get bytes kept in memory, mapped files are left to the page cache
+
+        @return: bytes of the index and of decompressed blocks
+        """
+        size = self.__index.get_memory_size()
+        if self.__trigram_index is not None:
+            size += self.__trigram_index.get_memory_size()
+        if isinstance(self.__buffer, BlockContainer):
+            size += self.__buffer.get_memory_size()
+        return size
+
+    def __raw_line(self, number):
+        return self.__buffer[self.__offsets[number]:self.__offsets[number + 1]]
+
+    def get_line(self, number):
+        """ Get line without annotations as in Preprocessing
+
+        @param number: line number (negative numbers count from the end
+                       like list indices)
+        @return: cleaned line
+        """
+        count = self.__index.get_line_count()
+        number = int(number)
+        if number < 0:
+            number += count
+        if not 0 <= number < count:
+            raise IndexError(f"line {number} is not in {self.__path}")
+        return AlignmentIndex.clean_line(self.__raw_line(number)).decode("utf-8")
+
+    def get_lines(self, line_numbers):
+        return [self.get_line(number) for number in line_numbers]
+
+    def get_raw_text_list(self):
+        # lines with annotations are read through the index when needed
+        return None
+
+    def get_text_list(self, pattern=None, file_pattern=None):
+        """ Get lazy list of cleaned lines
+
+        @param pattern: compiled pattern for (src) or (trg) lines to keep
+        @param file_pattern: compiled pattern for file headers to keep
+        @return: all lines or only lines of one language and file headers
+        """
+        if pattern is None:
+            return MappedText(self, np.arange(self.__index.get_line_count()))
+        numbers = np.flatnonzero(self.__line_mask(pattern))
+        headers = self.__index.get_headers()
+        if file_pattern is not None:
+            headers = [header for header in headers
+                       if file_pattern.match(self.get_line(header))]
+        return MappedText(self, np.union1d(numbers, headers).astype(np.int64))
+
+    def __line_mask(self, pattern):
+        # mark lines with ID in the language of the pattern
+        return (self.__index.get_kinds() == AlignmentIndex.get_pattern_kind(pattern)) & \
+            (self.__index.get_ids() >= 0)
+
+    def get_block_map(self, text_list):
+        """ Get block number of every line and file pairs of blocks
+            (see Processing.get_block_map)
+
+        @param text_list: lazy list of lines
+        @return: array with block numbers and list of file pairs
+        """
+        numbers = text_list.get_line_numbers()
+        is_header = self.__index.get_kinds()[numbers] == AlignmentIndex.HEADER
+        blocks = (np.cumsum(is_header) - is_header).astype(np.int32)
+        labels = [""] + [f"{text_list[index - 1]}, {text_list[index]}"
+                         for index in np.flatnonzero(is_header)]
+        return blocks, labels
+
+    def __find_literal(self, literal, first, last):
+        # jump through raw file with find, one hit per line is enough
+        found = []
+        end = self.__offsets[last]
+        position = self.__buffer.find(literal, self.__offsets[first], end)
+        while position != -1:
+            number = int(np.searchsorted(self.__offsets, position,
+                                         side="right")) - 1
+            found.append(number)
+            position = self.__buffer.find(literal, self.__offsets[number + 1],
+                                          end)
+        return np.array(found, dtype=np.int64)
+
+    def search_range(self, regex, caseinsensitive, kind, first, last, engine="re",
+                     deadline=None, trigram_lines=None):
+        """ Search lines of one language in a range of lines
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @param kind: AlignmentIndex.SRC or AlignmentIndex.TRG
+        @param first: first line of the range
+        @param last: line after the range
+        @param engine: regex engine (see RegexEngine)
+        @param deadline: end of the time limit of the search
+        @param trigram_lines: candidate lines of the range from the trigram
+                              index, None to search all lines
+        @return: line numbers and cleaned lines of matches
+        """
+        kinds = self.__index.get_kinds()[first:last]
+        ids = self.__index.get_ids()[first:last]
+        # only lines of the language searched can match
+        candidates = np.flatnonzero((kinds == kind) & (ids >= 0)) + first
+        literal = PatternAnalysis.get_required_literal(regex, caseinsensitive)
+        if trigram_lines is not None:
+            # skip lines in groups missing a required trigram
+            candidates = np.intersect1d(candidates, trigram_lines)
+        elif literal is not None:
+            # skip lines not containing the literal part of the regex
+            candidates = np.intersect1d(
+                candidates, self.__find_literal(literal, first, last))
+        str_pattern = RegexEngine.compile(regex, caseinsensitive, engine, deadline)
+        bytes_pattern = None
+        # bytes are only searched with re
+        if str_pattern.get_engine() == "re":
+            bytes_pattern = PatternAnalysis.get_bytes_pattern(regex, caseinsensitive)
+        if bytes_pattern is not None:
+            bytes_pattern = RegexMatcher(bytes_pattern, "re", deadline)
+        numbers = []
+        matches = []
+        for number in candidates:
+            line = AlignmentIndex.clean_line(self.__raw_line(number))
+            # decode only if the regex cannot be run on bytes
+            if bytes_pattern is not None:
+                if not bytes_pattern.search(line):
+                    continue
+                line = line.decode("utf-8")
+            else:
+                line = line.decode("utf-8")
+                if not str_pattern.search(line):
+                    continue
+            numbers.append(int(number))
+            matches.append(line)
+        return numbers, matches
+
+    def __get_shards(self, count):
+        # cut file into ranges of similar size at separators so that
+        # no alignment is split between two ranges
+        line_count = self.__index.get_line_count()
+        separators = self.__index.get_separators()
+        if count < 2 or not len(separators):
+            return [(0, line_count)]
+        cuts = np.searchsorted(self.__offsets,
+                               np.linspace(0, self.__offsets[-1], count + 1)[1:-1])
+        bounds = separators[np.minimum(np.searchsorted(separators, cuts),
+                                       len(separators) - 1)]
+        bounds = np.unique(np.concatenate(([0], bounds, [line_count])))
+        return [(int(first), int(last))
+                for first, last in zip(bounds[:-1], bounds[1:])]
+
+    @staticmethod
+    def __advance(progress, shard, result):
+        if progress is not None:
+            progress.advance(shard[4] - shard[3], len(result[0]))
+
+    @staticmethod
+    def init_worker(path, text_path=None):
+        # every worker process maps the file and loads the index only once
+        MappedSearch.__worker_search = MappedSearch(path, text_path=text_path)
+
+    def __get_executor(self):
+        # one pool of worker processes for all searches of the file
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ProcessPoolExecutor(max_workers=self.__workers,
+                                                      initializer=MappedSearch.init_worker,
+                                                      initargs=(self.__path, self.__text_path))
+                weakref.finalize(self, self.__executor.shutdown, wait=False,
+                                 cancel_futures=True)
+            return self.__executor
+
+    def __drop_executor(self, executor):
+        # a pool with a killed worker process cannot be used again
+        with self.__executor_lock:
+            if self.__executor is executor:
+                self.__executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def search_shard(args):
+        return MappedSearch.__worker_search.search_range(*args)
+
+    def get_matches_index_files(self, text_list, regex, src_pattern,
+                                caseinsensitive=False, progress=None, engine="re",
+                                timeout=None):
+        """ Extract matches, corresponding files, and their indices in text
+            list (see Processing.get_matches_index_files)
+
+        @param text_list: lazy list of lines
+        @param regex: regular expression given by user
+        @param src_pattern: compiled pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @param progress: progress of a search job (JobProgress), updated
+                         after every shard
+        @param engine: regex engine (see RegexEngine)
+        @param timeout: time limit of the search in seconds
+        @return: matches, indices in text list and files
+        """
+        kind = AlignmentIndex.get_pattern_kind(src_pattern)
+        # one deadline for all shards, also in worker processes
+        deadline = RegexEngine.get_deadline(timeout)
+        if progress is not None:
+            progress.set_stage("searching", total=self.__index.get_line_count())
+        trigram_lines = None
+        if self.__trigram_index is not None:
+            # candidates of the whole file, every shard gets its part
+            trigram_lines = self.__trigram_index.get_candidates(regex, caseinsensitive)
+        count = self.__workers * 4 if self.__workers > 1 else \
+            self.PROGRESS_SHARDS if progress is not None else 1
+        shards = []
+        for first, last in self.__get_shards(count):
+            shard_lines = None
+            if trigram_lines is not None:
+                shard_lines = trigram_lines[np.searchsorted(trigram_lines, first):
+                                            np.searchsorted(trigram_lines, last)]
+            shards.append((regex, caseinsensitive, kind, first, last, engine, deadline,
+                           shard_lines))
+        results = []
+        if self.__workers > 1:
+            # search shards in parallel, results are taken in file order
+            executor = self.__get_executor()
+            futures = [executor.submit(MappedSearch.search_shard, shard) for shard in shards]
+            try:
+                for shard, future in zip(shards, futures):
+                    results.append(future.result())
+                    self.__advance(progress, shard, results[-1])
+            except BrokenProcessPool:
+                self.__drop_executor(executor)
+                raise
+            finally:
+                # shards of a cancelled search which have not started are dropped
+                for future in futures:
+                    future.cancel()
+        else:
+            # shards are only needed to report progress
+            for shard in shards:
+                results.append(self.search_range(*shard))
+                self.__advance(progress, shard, results[-1])
+        numbers = [number for result in results for number in result[0]]
+        matches = [match for result in results for match in result[1]]
+        # get indices of matches in text list
+        matches_index = np.searchsorted(text_list.get_line_numbers(),
+                                        numbers).tolist()
+        blocks, labels = self.get_block_map(text_list)
+        files = [labels[blocks[index]] for index in matches_index]
+        return matches, matches_index, files
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from model.processing import Processing
 
@@ -7,12 +8,18 @@ class MonolingualContext:
 
     """
     def __init__(self, path, regex, pre_context=None, post_context=None,
-                 anno=True, src=True, caseinsensitive=False
+                 anno=True, src=True, caseinsensitive=False, mapped=False, workers=1, trigrams=False,
+                 search=None
                  ):
         self.__path = path
         self.__regex = regex
         self.__src = src
         self.__caseinsensitive = caseinsensitive
+        self.__mapped = mapped
+        self.__workers = workers
+        self.__trigrams = trigrams
+        # shared search object (e.g. BatchSearch) instead of a new search
+        self.__search = search
         self.__src_pattern = r'\(src\)="[0-9]+">'
         self.__trg_pattern = r'\(trg\)="[0-9]+">'
         # option to either filter for src or trg only
@@ -31,14 +38,19 @@ class MonolingualContext:
                 mono=True,
                 unparsed_stats_context=False,
                 mono_pattern=self.__current_pattern_ID,
-                caseinsensitive=self.__caseinsensitive
+                caseinsensitive=self.__caseinsensitive,
+                mapped=self.__mapped,
+                workers=self.__workers,
+                trigrams=self.__trigrams,
+                search=self.__search
             )
-        self.__text_list_only = [elem for elem in self.__text_list
-                                 if not elem.startswith("=")]
+        # monolingual text list only holds lines of one language and files
+        self.__text_list_only = self.__text_list
         self.__pre_context = pre_context
         self.__post_context = post_context
         self.__pre_context_list = []
         self.__post_context_list = []
+        self.__context = None
         self.__anno = anno
         # run function for processing context
         self.__process()
@@ -65,31 +77,30 @@ class MonolingualContext:
                 self.__post_context_list
             )
 
+    def __get_context(self):
+        # compute pre- and post-context of all matches at once
+        if self.__context is None:
+            headers = Processing.get_header_lines(self.__text_list_only)
+            lines = np.setdiff1d(np.arange(len(self.__text_list_only)), headers)
+            positions = np.searchsorted(lines, np.asarray(self.__indices, dtype=np.int64))
+            self.__context = Processing.get_context(
+                self.__text_list_only, lines, positions, positions, headers,
+                self.__pre_context or 0, self.__post_context or 0)
+        return self.__context
+
     def set_pre_context(self):
         """ Retrieve pre-context for a given number of lines
 
         @return:
         """
-        self.__pre_context_list = [
-            self.__text_list_only[index - self.__pre_context:index]
-            for index in self.__indices]
-        self.__pre_context_list = [
-            [item for item in sublist if not item.startswith("#")]
-            for sublist in self.__pre_context_list
-        ]
+        self.__pre_context_list = self.__get_context()[0]
 
     def set_post_context(self):
         """ Retrieve post-context for a given number of lines
 
         @return:
         """
-        self.__post_context_list = [
-            self.__text_list_only[index + 1: index + 1 + self.__post_context]
-            for index in self.__indices]
-        self.__post_context_list = [
-            [item for item in sublist if not item.startswith("#")]
-            for sublist in self.__post_context_list
-        ]
+        self.__post_context_list = self.__get_context()[1]
 
     def write_context_qual_mono(self, lang, path=None, root_path=None):
         """ Write monolingual matches and their context to textfile for
@@ -1,7 +1,10 @@
 import re
 import pandas as pd
 from collections import defaultdict
+from model.annotation_index import AnnotationIndex
+from model.line_table import LineTable
 from model.processing import Processing
+from model.streaming_stats import StreamingCounts
 
 
 class MonolingualStats:
@@ -9,14 +12,30 @@ class MonolingualStats:
        write them to a csv-file
     """
 
-    def __init__(self, path, regex, src=True, parsed=False, caseinsensitive=False):
+    def __init__(self, path, regex=None, src=True, parsed=False, caseinsensitive=False,
+                 mapped=False, workers=1, trigrams=False, query=None, columnar=False,
+                 search=None, memory_limit=None):
+        if (regex is None) == (query is None):
+            raise ValueError("give either a regex or a lemma/POS query")
         self.__path = path
-        self.__regex = regex
+        # lemma/POS query (e.g. {"lemma": "diablo"}) as alternative to regex
+        self.__query = query
+        self.__regex = regex if query is None \
+            else AnnotationIndex.describe_query(query)
         self.__src_pattern = r'\(src\)="[0-9]+">'
         self.__trg_pattern = r'\(trg\)="[0-9]+">'
         self.__src = src
         self.__parsed = parsed
         self.__caseinsensitive = caseinsensitive
+        self.__mapped = mapped
+        self.__workers = workers
+        self.__trigrams = trigrams
+        # shared search object (e.g. BatchSearch) instead of a new search
+        self.__search = search
+        self.__columnar = columnar
+        # memory limit in bytes for the counts of unparsed data (see StreamingCounts),
+        # parsed data is not affected
+        self.__memory_limit = memory_limit
         if self.__src:
             # set src pattern to search ID in alignments' values
             self.__current_pattern_ID = self.__src_pattern
@@ -33,7 +52,13 @@ class MonolingualStats:
                     unparsed_stats_context=True,
                     mono=True,
                     mono_pattern=self.__current_pattern_ID,
-                    caseinsensitive=self.__caseinsensitive
+                    caseinsensitive=self.__caseinsensitive,
+                    mapped=self.__mapped,
+                    workers=self.__workers,
+                    trigrams=self.__trigrams,
+                    query=self.__query,
+                    columnar=self.__columnar,
+                    search=self.__search
                 )
             self.__process_counts_unparsed()
         else:
@@ -50,17 +75,34 @@ class MonolingualStats:
                     stats=True,
                     mono=True,
                     mono_pattern=self.__current_pattern_ID,
-                    caseinsensitive=self.__caseinsensitive
+                    caseinsensitive=self.__caseinsensitive,
+                    mapped=self.__mapped,
+                    workers=self.__workers,
+                    trigrams=self.__trigrams,
+                    query=self.__query,
+                    columnar=self.__columnar,
+                    search=self.__search
                 )
             # run processing for monolingual matches
             self.__process_counts()
 
     def __process_counts_unparsed(self):
-        # remove annotation
-        self.__matches = Processing.remove_annotation(self.__matches,
-                                                      nested=False)
+        if self.__memory_limit is not None:
+            # count matches with their files, partial counts are spilled to disk
+            self.__counts_unparsed = StreamingCounts(self.__memory_limit)
+            for match, file in zip(self.__matches, self.__files):
+                self.__counts_unparsed.add(
+                    Processing.remove_annotation([match], nested=False)[0], file)
+            return
+        # store repeated matches once and remove annotation of distinct matches
+        table = LineTable()
+        ids = table.add_all(self.__matches)
+        table, mapping = table.map(
+            lambda match: Processing.remove_annotation([match], nested=False)[0])
+        ids = mapping[ids]
+        self.__matches = table.get_all(ids)
         # get counts for (unique) matches
-        self.__counts_unparsed = Processing.get_counts(self.__matches)
+        self.__counts_unparsed = Processing.get_counts(ids, [table])
 
     def __process_counts(self):
         self.__counts = defaultdict(dict)
@@ -129,9 +171,11 @@ class MonolingualStats:
                                                        l1=lang,
                                                        root_path=root_path)
         # handle case for unparsed data
-        if not self.__parsed:
+        if not self.__parsed and self.__memory_limit is not None:
+            self.__counts_unparsed.write_statistics_to_file(path, self.__regex, l1=lang)
+        elif not self.__parsed:
             Processing.write_statistics_to_file(path, self.__regex, self.__counts_unparsed,
-                                                self.__files, l1=lang)
+                                                self.__matches, self.__files, l1=lang)
         else:
             df = pd.DataFrame.from_dict(self.__counts,
                                         orient='index').reset_index()
@@ -139,51 +183,30 @@ class MonolingualStats:
                           'POS', 'Lemma', 'Token']
             # drop artificial index column
             df = df.drop("Number", axis=1)
-            # make everything hashable
-            df = df.astype(str)
+            match = f'Match {lang.strip()}'
+            # replace matches and lists of annotations by IDs for counting
+            codes = pd.DataFrame({column: Processing.intern_values(df[column].tolist())
+                                  for column in df.columns})
             # get counts
-            count = df[[f'Match {lang}']].value_counts().reset_index(
-                name='Count_Match')
-            count_POS = df[[f'Match {lang}',
-                            'POS']].value_counts().reset_index(
-                name='Count_POS')
+            df['Count_Match'] = codes.groupby(match)[match].transform('size')
+            count_POS = codes.groupby([match, 'POS'])[match].transform('size')
             # handle files
-            df['File_Pairs'] = self.__sets_files
-            files = df.groupby([f'Match {lang}'])['File_Pairs'].agg(
-                list).reset_index()
-            # flatten lists if necessary
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: Processing.is_nested(x))
-            # make set to get unique file pairs
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: set(x))
-            # get count of file pairs
-            files['File_Count'] = files['File_Pairs'].apply(lambda x: len(x))
-            # merge original dataframe and counts for src and trg combinations
-            merged_df = pd.merge(df, count, on=[f'Match {lang}'],
-                                 how='left')
-            # merge original dataframe and counts for POS_src
-            merged_df = pd.merge(merged_df, count_POS,
-                                 on=[f'Match {lang}', 'POS'],
-                                 how='left')
-            # drop left over index column
-            merged_df.drop(["File_Pairs"], axis=1, inplace=True)
-            # sort merged dataframe by highest count_POS_src
-            merged_df = merged_df.sort_values(
+            groups = codes.groupby(match, sort=False).ngroup()
+            file_sets = Processing.get_file_sets(groups.tolist(), self.__sets_files)
+            # sort by highest count_POS
+            order = pd.DataFrame({'Count_Match': df['Count_Match'],
+                                  'Count_POS': count_POS}).sort_values(
                 by=['Count_Match', 'Count_POS'],
-                ascending=[False, False])
+                ascending=[False, False]).index
             # reduce duplicates
-            merged_df.drop_duplicates(keep='first', inplace=True)
-            # merge final dataframe with file data
-            all_data = pd.merge(merged_df, files,
-                                on=[f'Match {lang}'],
-                                how='left')
-            # drop count for POS
-            all_data = all_data.drop(["Count_POS"], axis=1)
+            order = order[~codes.loc[order].duplicated().to_numpy()]
+            all_data = df.loc[order].reset_index(drop=True)
+            groups = groups.loc[order].tolist()
+            all_data['File_Pairs'] = [file_sets[group] for group in groups]
+            all_data['File_Count'] = [len(file_sets[group]) for group in groups]
             # add column with Regex
             all_data['Regex'] = self.__regex
             # flatten lists
-            all_data["POS"] = all_data["POS"].apply(lambda x: eval(x))
-            all_data["Lemma"] = all_data["Lemma"].apply(lambda x: eval(x))
-            all_data["Token"] = all_data["Token"].apply(lambda x: eval(x))
             exploded = all_data.explode(["POS", "Lemma", "Token"])
             # write data to csv
             exploded.to_csv(path)
@@ -0,0 +1,306 @@
+import re
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+class PatternAnalysis:
+    """Analyse regular expressions entered by the user to decide how
+       they can be run over raw (bytes) alignment files
+
+    """
+    # anchors that behave the same for strings and bytes
+    __BYTES_SAFE_AT = {sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_LINE,
+                       sre_constants.AT_BEGINNING_STRING, sre_constants.AT_END,
+                       sre_constants.AT_END_LINE, sre_constants.AT_END_STRING}
+    __REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                 getattr(sre_constants, "POSSESSIVE_REPEAT", sre_constants.MAX_REPEAT)}
+
+    @staticmethod
+    def parse(regex, caseinsensitive=False):
+        """ Parse regular expression into its syntax tree
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @return: parsed pattern or None if the regex is invalid
+        """
+        try:
+            return sre_parse.parse(regex,
+                                   re.IGNORECASE if caseinsensitive else 0)
+        except (re.error, TypeError):
+            return None
+
+    @staticmethod
+    def ignores_case(parsed):
+        return bool(parsed.state.flags & (re.IGNORECASE | re.LOCALE))
+
+    @staticmethod
+    def __bytes_safe(items):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                # non-ASCII characters span several bytes
+                if av >= 128:
+                    return False
+            elif op is sre_constants.IN:
+                for item_op, item_av in av:
+                    if item_op is sre_constants.LITERAL and item_av < 128:
+                        continue
+                    if item_op is sre_constants.RANGE and item_av[1] < 128:
+                        continue
+                    # negations and categories (\w, \s, ...) differ for bytes
+                    return False
+            elif op is sre_constants.BRANCH:
+                if not all(PatternAnalysis.__bytes_safe(branch)
+                           for branch in av[1]):
+                    return False
+            elif op is sre_constants.SUBPATTERN:
+                group, add_flags, del_flags, pattern = av
+                if add_flags & (re.IGNORECASE | re.LOCALE) or \
+                        not PatternAnalysis.__bytes_safe(pattern):
+                    return False
+            elif op in PatternAnalysis.__REPEATS:
+                if not PatternAnalysis.__bytes_safe(av[2]):
+                    return False
+            elif op is sre_constants.AT:
+                # word boundaries depend on unicode word characters
+                if av not in PatternAnalysis.__BYTES_SAFE_AT:
+                    return False
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                if not PatternAnalysis.__bytes_safe(av[1]):
+                    return False
+            elif op is sre_constants.GROUPREF_EXISTS:
+                if not all(PatternAnalysis.__bytes_safe(branch)
+                           for branch in av[1:] if branch is not None):
+                    return False
+            elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+                if not PatternAnalysis.__bytes_safe(av):
+                    return False
+            elif op is not sre_constants.GROUPREF:
+                # any character (.) or negated literal match single bytes
+                return False
+        return True
+
+    @staticmethod
+    def get_bytes_pattern(regex, caseinsensitive=False):
+        """ Compile regex as bytes pattern if it finds exactly the same lines
+            in UTF-8 encoded text as the string pattern does
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @return: compiled bytes pattern or None
+        """
+        parsed = PatternAnalysis.parse(regex, caseinsensitive)
+        if parsed is None or PatternAnalysis.ignores_case(parsed) or \
+                not PatternAnalysis.__bytes_safe(parsed):
+            return None
+        try:
+            return re.compile(regex.encode("utf-8"))
+        except re.error:
+            return None
+
+    @staticmethod
+    def __literal_runs(items, runs, current):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                current.append(chr(av))
+            elif op is sre_constants.AT:
+                # anchors do not consume characters
+                continue
+            elif op is sre_constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+                # groups are part of the sequence
+                current = PatternAnalysis.__literal_runs(av[3], runs, current)
+            else:
+                runs.append("".join(current))
+                current = []
+        return current
+
+    @staticmethod
+    def get_literal_runs(regex, caseinsensitive=False):
+        """ Get literal strings every match of the regex has to contain
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @return: list of required strings (empty if none can be extracted)
+        """
+        parsed = PatternAnalysis.parse(regex, caseinsensitive)
+        if parsed is None or PatternAnalysis.ignores_case(parsed):
+            return []
+        runs = []
+        runs.append("".join(PatternAnalysis.__literal_runs(parsed, runs, [])))
+        return [run for run in runs if run]
+
+    @staticmethod
+    def get_required_literal(regex, caseinsensitive=False, min_length=3):
+        """ Get the longest string without spaces that every matching line
+            contains, also before annotations (_#POS_#lemma) are removed
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @param min_length: minimal number of bytes worth searching for
+        @return: required string as bytes or None
+        """
+        # removing annotations keeps spaces, so parts between spaces survive
+        pieces = [piece.encode("utf-8")
+                  for run in PatternAnalysis.get_literal_runs(regex, caseinsensitive)
+                  for piece in run.split(" ")]
+        pieces = [piece for piece in pieces if len(piece) >= min_length]
+        if not pieces:
+            return None
+        return max(pieces, key=len)
+
+    @staticmethod
+    def __trigrams(run, caseinsensitive):
+        # trigrams are looked up in lower case (ASCII only) text
+        data = run.encode("utf-8").lower()
+        trigrams = set()
+        for start in range(len(data) - 2):
+            trigram = data[start:start + 3]
+            # characters with non-ASCII case variants (i, k, s) and non-ASCII
+            # bytes cannot be looked up when case is ignored
+            if caseinsensitive and (max(trigram) >= 128 or
+                                    any(char in b"iks" for char in trigram)):
+                continue
+            trigrams.add(trigram)
+        return sorted(trigrams)
+
+    @staticmethod
+    def __trigram_query(items, caseinsensitive):
+        terms = []
+        run = []
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+                continue
+            if op is sre_constants.AT:
+                # anchors do not consume characters
+                continue
+            if op is sre_constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+                # groups are part of the sequence, but cannot be merged
+                # with the surrounding literals
+                terms.extend(PatternAnalysis.__trigrams("".join(run),
+                                                        caseinsensitive))
+                run = []
+                query = PatternAnalysis.__trigram_query(av[3], caseinsensitive)
+                if query is not None:
+                    terms.append(query)
+                continue
+            terms.extend(PatternAnalysis.__trigrams("".join(run), caseinsensitive))
+            run = []
+            if op is sre_constants.BRANCH:
+                # every alternative needs its own trigrams
+                alternatives = [PatternAnalysis.__trigram_query(branch, caseinsensitive)
+                                for branch in av[1]]
+                if all(query is not None for query in alternatives):
+                    terms.append(("or", alternatives))
+            elif op in PatternAnalysis.__REPEATS and av[0] >= 1:
+                # repeated part occurs at least once
+                query = PatternAnalysis.__trigram_query(av[2], caseinsensitive)
+                if query is not None:
+                    terms.append(query)
+        terms.extend(PatternAnalysis.__trigrams("".join(run), caseinsensitive))
+        if not terms:
+            return None
+        return ("and", terms)
+
+    @staticmethod
+    def get_trigram_query(regex, caseinsensitive=False):
+        """ Translate regex into a boolean query of trigrams (3 bytes of
+            lower case text) every matching line has to contain
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @return: nested query ("and"/"or", [terms]) with trigrams (bytes)
+                 as leaves or None if the regex has no usable literals
+        """
+        parsed = PatternAnalysis.parse(regex, caseinsensitive)
+        if parsed is None:
+            return None
+        return PatternAnalysis.__trigram_query(
+            parsed, PatternAnalysis.ignores_case(parsed))
+
+    @staticmethod
+    def __references_groups(items):
+        for op, av in items:
+            if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+                return True
+            if op is sre_constants.BRANCH:
+                parts = av[1]
+            elif op is sre_constants.SUBPATTERN:
+                parts = [av[3]]
+            elif op in PatternAnalysis.__REPEATS:
+                parts = [av[2]]
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                parts = [av[1]]
+            elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+                parts = [av]
+            else:
+                continue
+            if any(PatternAnalysis.__references_groups(part) for part in parts):
+                return True
+        return False
+
+    @staticmethod
+    def references_groups(regex):
+        """ Check whether a regex refers back to its own groups, which
+            breaks when it is combined with other regexes
+
+        @param regex: regular expression given by user
+        @return: True if the regex contains backreferences or is invalid
+        """
+        parsed = PatternAnalysis.parse(regex)
+        return parsed is None or PatternAnalysis.__references_groups(parsed)
+
+    @staticmethod
+    def __first_item(items):
+        # first item of a branch, None if it can start with any character
+        for op, av in items:
+            if op is sre_constants.AT:
+                continue
+            if op is sre_constants.LITERAL:
+                return op, av
+            return None
+        return None
+
+    @staticmethod
+    def __danger(items, repeated):
+        for op, av in items:
+            if op in PatternAnalysis.__REPEATS:
+                low, high, pattern = av
+                if repeated and high == sre_constants.MAXREPEAT:
+                    return "nested quantifiers"
+                danger = PatternAnalysis.__danger(pattern, repeated or high > 1)
+            elif op is sre_constants.BRANCH:
+                if repeated:
+                    firsts = [PatternAnalysis.__first_item(branch) for branch in av[1]]
+                    # backtracking tries every way to split a line between the branches
+                    if None in firsts or len(set(firsts)) < len(firsts):
+                        return "overlapping alternatives in a repeated group"
+                danger = next(filter(None, (PatternAnalysis.__danger(branch, repeated)
+                                            for branch in av[1])), None)
+            elif op is sre_constants.SUBPATTERN:
+                danger = PatternAnalysis.__danger(av[3], repeated)
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                danger = PatternAnalysis.__danger(av[1], repeated)
+            elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+                # atomic groups do not backtrack
+                danger = None
+            else:
+                continue
+            if danger is not None:
+                return danger
+        return None
+
+    @staticmethod
+    def get_danger(regex):
+        """ Check whether a regex can backtrack exponentially on some lines,
+            e.g. (a+)+b or (a|ab)*c
+
+        @param regex: regular expression given by user
+        @return: description of the problem or None if the regex is safe
+        """
+        parsed = PatternAnalysis.parse(regex)
+        if parsed is None:
+            return None
+        return PatternAnalysis.__danger(parsed, False)
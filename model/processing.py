@@ -1,6 +1,16 @@
+import hashlib
 import os.path
 import re
+import numpy as np
 import pandas as pd
+from model.alignment_index import AlignmentIndex
+from model.annotation_index import AnnotationIndex
+from model.block_container import BlockContainer
+from model.columnar_store import ColumnarStore
+from model.compressed_file import CompressedFile
+from model.line_table import InternedLines, LineTable
+from model.mapped_search import MappedSearch, MappedText
+from model.regex_engine import RegexEngine
 
 
 class Preprocessing:
@@ -21,37 +31,76 @@ class Preprocessing:
         """Use json format if data has already been read from text file
 
         """
-        with open(self.__path, "r", encoding="utf-8") as file_in:
-            for line in file_in:
-                self.__text_list.append(line.strip("\n"))
-            # Define the regex pattern to match the annotations
-            pattern = r'_#[^ ]*'
-            # Use re.sub to replace matched patterns with a space
-            self.__text_list_cleaned = [re.sub(pattern, '', line)
-                                        for line in self.__text_list]
+        # compressed files are decompressed while reading
+        with CompressedFile.open(self.__path, "r") as file_in:
+            # repeated line bodies are stored once, without (src)/(trg) prefix
+            self.__text_list = InternedLines.from_lines(line.strip("\n") for line in file_in)
+        # Define the regex pattern to match the annotations
+        pattern = r'_#[^ ]*'
+        # Use re.sub to replace matched patterns with a space,
+        # once for every distinct body (prefixes have no annotations)
+        self.__text_list_cleaned = self.__text_list.map_bodies(
+            lambda line: re.sub(pattern, '', line))
 
     def get_text_list(self):
         return self.__text_list_cleaned
 
+    def get_raw_text_list(self):
+        return self.__text_list
+
+    def get_memory_size(self):
+        """ Get bytes of both lists of lines in memory
+
+        @return: bytes of the ID arrays and of every distinct string
+        """
+        # prefixes are shared by both lists and counted twice
+        return self.__text_list.get_memory_size() + self.__text_list_cleaned.get_memory_size()
+
 
 class PreprocessingParsed:
     """Preprocessing of bilingual alignments as output from Opus
        OpenSubtitles Corpus
     """
 
-    def __init__(self, path=None, files=None, indices=None, mono=False):
+    def __init__(self, path=None, files=None, indices=None, mono=False, columnar=False,
+                 lines=None):
         self.__path = path
         self.__limit = re.search(r'\d+', self.__path).group()
         self.__files = files
         self.__indices = indices
         self.__mono = mono
+        # take annotations from columnar store instead of parsing lines
+        self.__store = ColumnarStore(path) if columnar else None
+        # lines of the file with annotations if they are already in memory
+        self.__raw_lines = lines
         self.__metadata = {}
         # Call functions for processing
         self.__processing()
 
     def __read_alignments(self):
-        with open(self.__path, "r", encoding="utf-8") as file_in:
-            self.__lines = [line for line in file_in]
+        # look up line offsets in sidecar index instead of reading whole file
+        index = AlignmentIndex(self.__path)
+        if self.__mono:
+            needed = list(self.__indices)
+        else:
+            # get all lines of the segments around the matches
+            self.__segment_ranges = list(zip(
+                *index.get_segment_ranges(self.__indices)))
+            needed = sorted(set(line for first, last in self.__segment_ranges
+                                for line in range(first, last + 1)))
+        if self.__store is not None:
+            # only lines missing in the columnar store are read as text
+            needed = [line for line in needed if not self.__store.is_regular(line)]
+        if self.__raw_lines is not None:
+            self.__lines = {line: self.__raw_lines[line] for line in needed}
+        else:
+            # only blocks with needed lines are decompressed from block containers
+            reader = BlockContainer(self.__path) if BlockContainer.is_container(self.__path) \
+                else index
+            # repeated lines are stored once
+            table = LineTable()
+            self.__lines = dict(zip(needed, table.get_all(
+                table.add_all(reader.read_lines(needed)))))
 
     def __process_mono_matches(self):
         self.__mono_matches = []
@@ -68,32 +117,13 @@ class PreprocessingParsed:
         self.__alignments_parsed = []
         self.__alignments = []
         # get segment for every match (nested list) based on indices of matches
-        for index in self.__indices:
-            pre = []  # initialize list for lines before match
-            post = []  # initialize list for lines after match
-            count_left = 0  # counter for going left
-            count_right = 0  # counter for going right
-            while True:
-                try:
-                    # check if separator left of match has been reached
-                    current_left = self.__lines[index - count_left - 1]
-                    if current_left.startswith("="):
-                        break
-                    else:
-                        pre.insert(0, current_left.strip("\n "))
-                        count_left += 1
-                except IndexError:
-                    break
-            while True:
-                try:
-                    # check if separator right of match has been reached
-                    current_right = self.__lines[index + count_right + 1]
-                    if current_right.startswith("="):
-                        break
-                    post.append(current_right.strip("\n "))
-                    count_right += 1
-                except IndexError:
-                    break
+        for index, (first, last) in zip(self.__indices, self.__segment_ranges):
+            # lines between separator left of match and match
+            pre = [self.__lines[line].strip("\n ")
+                   for line in range(first, index)]
+            # lines between match and separator right of match
+            post = [self.__lines[line].strip("\n ")
+                    for line in range(index + 1, last + 1)]
             # merge segments to one list
             # and append to (nested) list of segments
             self.__alignments_parsed.append(pre +
@@ -122,7 +152,6 @@ class PreprocessingParsed:
 
     @staticmethod
     def __split_string_meta(text, all_meta=True):
-        token = []
         # convert list entry to string
         text = "".join(text).strip()
         # correct minor errors in pattern before accessing data
@@ -132,18 +161,9 @@ class PreprocessingParsed:
         # correct white spaces between numbers
         # text = re.sub(r'(\d) (\d)', r'\1.\2', text)
         # text = re.sub(r'_#\s+', '_#', text)
-        # split at white space
-        first_split = text.split()
-        # split at delimiter to get metadata
-        second_split = [elem.split("_#") for elem in first_split]
         # get original string, POS and lemma of every token
-        try:
-            token = [elem[0] for elem in second_split]
-            POS = [elem[1] for elem in second_split]
-            lemma = [elem[2] for elem in second_split]
-        except IndexError:
-            POS = ["X" for elem in second_split]
-            lemma = [elem[0] for elem in second_split]
+        # (shared with the inverted annotation index)
+        token, POS, lemma = AnnotationIndex.split_annotations(text)
         if all_meta:
             return token, POS, lemma
         else:
@@ -255,10 +275,58 @@ class PreprocessingParsed:
             except IndexError:
                 pass
 
+    def __line_key(self, number):
+        # tokens of the whole line as in __process_alignments
+        if self.__store.is_regular(number):
+            return self.__store.get_line_key(number)
+        return " ".join(map(str, self.__split_string_meta([self.__lines[number]],
+                                                          all_meta=False)))
+
+    def __process_line(self, number, current_level):
+        # add annotations of the line as in __process_match
+        if self.__store.is_regular(number):
+            ID = ColumnarStore.get_prefix(number, self.__store.get_index().get_kinds(),
+                                          self.__store.get_index().get_ids())
+            if ID not in current_level:
+                token, POS, lemma = self.__store.get_annotations(number)
+                current_level[ID] = {"string": token, "POS": POS, "lemma": lemma}
+            return
+        line = self.__lines[number]
+        self.__process_match(re.compile(r'\(src\)="[0-9]+">'),
+                             re.compile(r'\(trg\)="[0-9]+">'),
+                             line.strip("\n") if self.__mono else [line.strip("\n ")],
+                             current_level)
+
+    def __parse_columns(self):
+        self.__metadata = {}
+        if self.__mono:
+            for file, index in zip(self.__files, self.__indices):
+                current_level = self.__metadata.setdefault(file, {})
+                current_alignment_key = self.__line_key(index).strip()
+                current_level.setdefault(current_alignment_key, {})
+                if current_alignment_key:
+                    self.__process_line(index, current_level[current_alignment_key])
+            return
+        for file, index, (first, last) in zip(self.__files, self.__indices,
+                                              self.__segment_ranges):
+            current_level = self.__metadata.setdefault(file, {})
+            # key of alignment is built as in __process_alignments
+            pre = [self.__line_key(line).strip() for line in range(first, index)]
+            post = [self.__line_key(line).strip() for line in range(index + 1, last + 1)]
+            current_alignment_key = (" ".join(pre) + " " +
+                                     self.__line_key(index).strip() + " " +
+                                     " ".join(post)).strip()
+            current_level.setdefault(current_alignment_key, {})
+            if current_alignment_key:
+                for line in range(first, last + 1):
+                    self.__process_line(line, current_level[current_alignment_key])
+
     def __processing(self):
         # do the processing
         self.__read_alignments()
-        if not self.__mono:
+        if self.__store is not None:
+            self.__parse_columns()
+        elif not self.__mono:
             self.__process_alignments()
             self.__parse_data()
         else:
@@ -274,66 +342,196 @@ class Processing:
        OpenSubtitles Corpus
 
     """
+    # lines searched between two progress updates of a search job
+    PROGRESS_LINES = 100000
+
+    @staticmethod
+    def get_block_map(text_list):
+        """ Assign every line to the block of the nearest file header
+            ('#' line) to its left in one forward pass
+
+        @param text_list: list of lines
+        @return: array with block number for every line and list with the
+                 file pair of every block (block 0 has no file pair)
+        """
+        is_header = np.fromiter((item.startswith("#") for item in text_list),
+                                dtype=bool, count=len(text_list))
+        # count headers strictly before each line
+        blocks = (np.cumsum(is_header) - is_header).astype(np.int32)
+        # file pair consists of line before header and header itself
+        labels = [""] + [f"{text_list[index - 1]}, {text_list[index]}"
+                         for index in np.flatnonzero(is_header)]
+        return blocks, labels
 
     @staticmethod
-    def get_matches_index_files(text_list, regex, src_pattern, caseinsensitive=False):
+    def get_language_map(text_list):
+        """ Map every line to its position among the (src) or (trg) lines
+
+        @param text_list: list of lines
+        @return: array with position of every line in the lines of its
+                 language (-1 for other lines), arrays with line numbers
+                 of (src) and (trg) lines
+        """
+        if isinstance(text_list, MappedText):
+            kinds = text_list.get_kinds()
+            is_src = kinds == AlignmentIndex.SRC
+            is_trg = kinds == AlignmentIndex.TRG
+        else:
+            is_src = np.fromiter((item.startswith("(src)") for item in text_list),
+                                 dtype=bool, count=len(text_list))
+            is_trg = np.fromiter((item.startswith("(trg)") for item in text_list),
+                                 dtype=bool, count=len(text_list))
+        src_lines = np.flatnonzero(is_src)
+        trg_lines = np.flatnonzero(is_trg)
+        positions = np.full(len(text_list), -1, dtype=np.int64)
+        positions[src_lines] = np.arange(len(src_lines))
+        positions[trg_lines] = np.arange(len(trg_lines))
+        return positions, src_lines, trg_lines
+
+    @staticmethod
+    def get_header_lines(text_list):
+        """ Get line numbers of file headers ('#' lines)
+
+        @param text_list: list of lines
+        @return: array with line numbers of headers
+        """
+        if isinstance(text_list, MappedText):
+            return np.flatnonzero(text_list.get_kinds() == AlignmentIndex.HEADER)
+        return np.flatnonzero(np.fromiter((item.startswith("#") for item in text_list),
+                                          dtype=bool, count=len(text_list)))
+
+    @staticmethod
+    def get_context(text_list, lines, first, last, headers, pre_context, post_context):
+        """ Get pre- and post-context of all matches at once, context does
+            not reach beyond the file headers around a match
+
+        @param text_list: list of lines
+        @param lines: sorted line numbers of lines which can be context
+        @param first: position in lines of first line of every match
+        @param last: position in lines of last line of every match
+        @param headers: sorted line numbers of file headers
+        @param pre_context: number of lines before match
+        @param post_context: number of lines after match
+        @return: lists of pre-context and post-context lines for every match
+        """
+        lines = np.asarray(lines, dtype=np.int64)
+        first = np.asarray(first, dtype=np.int64)
+        last = np.asarray(last, dtype=np.int64)
+        # headers before and after each match, with virtual headers at the margins
+        bounds = np.concatenate(([-1], headers, [len(text_list)])).astype(np.int64)
+        previous = bounds[np.searchsorted(bounds, lines[first]) - 1]
+        following = bounds[np.searchsorted(bounds, lines[last])]
+        pre_start = np.maximum(first - pre_context,
+                               np.searchsorted(lines, previous, side="right"))
+        post_end = np.minimum(last + 1 + post_context,
+                              np.searchsorted(lines, following))
+        return (Processing.__get_ranges(text_list, lines, pre_start, first),
+                Processing.__get_ranges(text_list, lines, last + 1, post_end))
+
+    @staticmethod
+    def __get_ranges(text_list, lines, starts, ends):
+        # read lines of all ranges in one go and split them afterwards
+        lengths = np.maximum(ends - starts, 0)
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+        numbers = lines[positions]
+        if isinstance(text_list, MappedText):
+            values = text_list[numbers]
+        else:
+            values = [text_list[number] for number in numbers.tolist()]
+        return [values[offset:offset + length]
+                for offset, length in zip(offsets.tolist(), lengths.tolist())]
+
+    @staticmethod
+    def get_matches_index_files(text_list, regex, src_pattern, caseinsensitive=False,
+                                progress=None, engine="re", timeout=None):
         """Extract matches, corresponding files, and their indices in text list
+        @param progress: progress of a search job (JobProgress), updated
+                         every PROGRESS_LINES lines
+        @param engine: regex engine (see RegexEngine)
+        @param timeout: time limit of the search in seconds
         @return:
         """
         matches = []
         files = []
         matches_index = []
+        # look up file pairs in block map instead of searching to the left
+        blocks, labels = Processing.get_block_map(text_list)
+        regex = RegexEngine.compile(regex, caseinsensitive, engine,
+                                    RegexEngine.get_deadline(timeout))
+        if progress is not None:
+            progress.set_stage("searching", total=len(text_list))
+        scanned = 0
+        reported = 0
         for index, item in enumerate(text_list):
+            if progress is not None and index - scanned == Processing.PROGRESS_LINES:
+                progress.advance(index - scanned, len(matches) - reported)
+                scanned, reported = index, len(matches)
             # only append if match has been found
-            if re.search(regex, item, flags=re.IGNORECASE if caseinsensitive else 0) and src_pattern.match(item):
+            if regex.search(item) and src_pattern.match(item):
                 matches.append(item.strip("\n"))
                 matches_index.append(index)
-                # Search to the left for entries starting with '#'
-                left_entries = []
-                for left_index in range(index - 1, -1, -1):
-                    if text_list[left_index].startswith("#"):
-                        left_entries.append(text_list[left_index])
-                        left_entries.append(text_list[left_index - 1])
-                        break
-                    else:
-                        continue
-                # remove line breaks from files
-                # left_entries = [elem.strip("\n") for elem in left_entries]
-                files.append(", ".join(reversed(left_entries)))
+                files.append(labels[blocks[index]])
+        if progress is not None:
+            progress.advance(len(text_list) - scanned, len(matches) - reported)
         return matches, matches_index, files
 
     @staticmethod
     def perform_new_search(path, regex, stats=True, mono=False, unparsed_stats_context=False,
-                           mono_pattern=None, caseinsensitive=False):
-        # get text list
-        text_list = Preprocessing(path).get_text_list()
+                           mono_pattern=None, caseinsensitive=False, mapped=False, workers=1,
+                           trigrams=False, query=None, columnar=False, search=None):
         # compile patterns for src and files
         pattern = re.compile(mono_pattern)
         file_pattern = re.compile(r'^# [a-z]{2}/\d+/\d+/\d+\.xml\.gz$')
+        # parallel and indexed search work on memory-mapped file
+        if search is None and (mapped or workers > 1 or trigrams):
+            # memory-mapped file, only matches and their context are decoded
+            search = MappedSearch(path, workers=workers, trigrams=trigrams)
+        if search is not None:
+            # search object keeps text list (e.g. a batch search sharing
+            # one pass over the file between several regexes)
+            text_list = search.get_text_list()
+            search_func = search.get_matches_index_files
+            raw_text_list = search.get_raw_text_list()
+        else:
+            # get text list
+            preprocessing = Preprocessing(path)
+            text_list = preprocessing.get_text_list()
+            search_func = Processing.get_matches_index_files
+            # annotated lines are taken from memory for parsed statistics
+            raw_text_list = preprocessing.get_raw_text_list()
+        if query is not None:
+            # look up lines by lemma or POS in inverted index instead of
+            # searching with a regex
+            search_func = AnnotationIndex(path).get_matches_index_files
+            regex = query
         # monolingual mode
         if mono:
-            text_list_mono = [s for s in text_list if
-                              pattern.match(s) or file_pattern.match(s)]
-            matches, indices, files = Processing.get_matches_index_files(
+            if not stats and not unparsed_stats_context:
+                # mono mode without stats (context)
+                if search is not None:
+                    text_list_mono = search.get_text_list(pattern, file_pattern)
+                else:
+                    text_list_mono = [s for s in text_list if
+                                      pattern.match(s) or file_pattern.match(s)]
+                matches, indices, files = search_func(
+                    text_list_mono, regex, pattern, caseinsensitive=caseinsensitive)
+                return text_list_mono, matches, indices, files
+            matches, indices, files = search_func(
                 text_list, regex, pattern, caseinsensitive=caseinsensitive)
             # monolingual statistics unparsed
             if unparsed_stats_context:
                 return matches, files
             # monolingual statistics parsed
-            if stats:
-                # monolingual mode with stats, process and return dictionary
-                parsed_dict = PreprocessingParsed(path, files, indices,
-                                                  mono=True
-                                                  ).get_dictionary()
-                return parsed_dict, matches, files
-            else:
-                # mono mode without stats (context)
-                matches, indices, files = Processing.get_matches_index_files(
-                    text_list_mono, regex, pattern, caseinsensitive=caseinsensitive)
-                return text_list_mono, matches, indices, files
+            # monolingual mode with stats, process and return dictionary
+            parsed_dict = PreprocessingParsed(path, files, indices,
+                                              mono=True, columnar=columnar,
+                                              lines=raw_text_list
+                                              ).get_dictionary()
+            return parsed_dict, matches, files
         else:
             # Bilingual mode
-            matches_l1, indices, files = Processing.get_matches_index_files(
+            matches_l1, indices, files = search_func(
                 text_list, regex, pattern, caseinsensitive=caseinsensitive)
             # unparsed bilingual statistics and context
             if unparsed_stats_context:
@@ -343,7 +541,9 @@ class Processing:
                 # For bilingual mode with stats process and return dictionary
                 parsed_dict = PreprocessingParsed(path,
                                                   files,
-                                                  indices).get_dictionary()
+                                                  indices,
+                                                  columnar=columnar,
+                                                  lines=raw_text_list).get_dictionary()
                 return parsed_dict, matches_l1, files
 
     @staticmethod
@@ -405,7 +605,22 @@ class Processing:
         return result
 
     @staticmethod
-    def get_counts(data_list):
+    def get_counts(data_list, tables=None):
+        """ Count occurrences of matches in order of first occurrence
+
+        @param data_list: matches or, if tables are given, array with ID of
+                          every match (one column per table for pairs)
+        @param tables: tables (LineTable) with the strings of the IDs
+        @return: dictionary with counts for matches
+        """
+        if tables is not None:
+            # count integer IDs and look up strings of distinct matches only
+            ids, counts = LineTable.count(data_list)
+            if ids.ndim == 1:
+                keys = tables[0].get_all(ids)
+            else:
+                keys = zip(*[table.get_all(column) for table, column in zip(tables, ids.T)])
+            return dict(zip(keys, counts.tolist()))
         counts_dict = {}
         for elem in data_list:
             if elem in counts_dict:
@@ -415,20 +630,35 @@ class Processing:
         return counts_dict
 
     @staticmethod
-    def automate_path_statistics(regex, l1=None, l2=None, root_path=None):
+    def get_regex_name(regex):
+        """ Get part of the file names for a regex
+
+        @param regex: regular expression given by user
+        @return: regex without special characters, with a short hash if
+                 characters were removed so that e.g. "diablos?" and
+                 "diablos" do not write the same files
+        """
         regex_path = regex
         if not regex_path.isalpha():
             regex_path = re.sub(r'[^\w\s]', '', regex_path)
+        regex_path = regex_path.replace(' ', '_')
+        if regex_path != regex:
+            regex_path = f"{regex_path}_{hashlib.sha1(regex.encode('utf-8')).hexdigest()[:8]}"
+        return regex_path
+
+    @staticmethod
+    def automate_path_statistics(regex, l1=None, l2=None, root_path=None):
+        regex_path = Processing.get_regex_name(regex)
 
         # handle writing for bilingual files
         if l1 is not None and l2 is not None:
             path = f"bilingual_statistics_{str(l1)}_{str(l2)}_" \
-                   f"{regex_path.replace(' ', '_')}.csv"
+                   f"{regex_path}.csv"
             path = os.path.join(root_path, path)
         # handle writing for monolingual files
         else:
             path = f"monolingual_statistics_{str(l1)}_" \
-                   f"{regex_path.replace(' ', '_')}.csv"
+                   f"{regex_path}.csv"
             path = os.path.join(root_path, path)
         return path
 
@@ -440,26 +670,63 @@ class Processing:
             extension = ".txt"
         else:
             extension = ".csv"
-        regex_path = regex
+        regex_path = Processing.get_regex_name(regex)
         lang_param = "monolingual_context" if mono \
             else "bilingual_context"
-        if not regex_path.isalpha():
-            regex_path = re.sub(r'[^\w\s]', '', regex_path)
         if mono:
             path = f"{lang_param}_{l1}_" \
-                   f"{regex_path.replace(' ', '_')}_" \
+                   f"{regex_path}_" \
                    f"pre_context{str(pre_con)}_" \
                    f"post_context{str(post_con)}{extension}"
             path = os.path.join(root_path, path)
         else:
             path = f"{lang_param}_" \
                    f"{str(l1)}_{str(l2)}_" \
-                   f"{regex_path.replace(' ', '_')}_" \
+                   f"{regex_path}_" \
                    f"pre_context{str(pre_con)}_" \
                    f"post_context{str(post_con)}{extension}"
             path = os.path.join(root_path, path)
         return path
 
+    @staticmethod
+    def __freeze(value):
+        # hashable version of (nested) lists
+        if isinstance(value, list):
+            return tuple(Processing.__freeze(elem) for elem in value)
+        return value
+
+    @staticmethod
+    def intern_values(values):
+        """ Give equal values (e.g. lists of POS tags) the same integer ID,
+            so they can be counted without converting them to strings
+
+        @param values: strings or (nested) lists of strings
+        @return: array with ID of every value
+        """
+        ids = {}
+        codes = np.empty(len(values), dtype=np.int64)
+        for index, value in enumerate(values):
+            codes[index] = ids.setdefault(Processing.__freeze(value), len(ids))
+        return codes
+
+    @staticmethod
+    def get_file_sets(groups, files):
+        """ Collect the file pairs of every group of matches in one pass
+
+        @param groups: group number of every match, numbered from 0
+                       (e.g. from GroupBy.ngroup)
+        @param files: file pair or list of file pairs of every match
+        @return: list with set of file pairs for every group
+        """
+        group_files = [set() for _ in range(max(groups, default=-1) + 1)]
+        for group, file in zip(groups, files):
+            # flatten lists of file pairs
+            if isinstance(file, list):
+                group_files[group].update(file)
+            else:
+                group_files[group].add(file)
+        return group_files
+
     @staticmethod
     def is_nested(lst):
         """
@@ -490,12 +757,13 @@ class Processing:
         return data
 
     @staticmethod
-    def write_statistics_to_file(path, regex, counts_dict, files, l1=None, l2=None):
+    def write_statistics_to_file(path, regex, counts_dict, matches, files, l1=None, l2=None):
         """ Write dictionary with translation pairs to given path
 
         @param path: filename or path
         @param regex: regular expression given by user
-        @param files: file in which each match occurs
+        @param matches: every occurrence of a match (key of counts_dict)
+        @param files: file in which each occurrence of a match occurs
         @param l1: source_files language
         @param l2: target language
         @param counts_dict: dictionary with counts of occurrences for matches
@@ -512,36 +780,19 @@ class Processing:
             # get samples for target language
             target = [elem[1] for elem in counts_dict.keys()]
             # store results in dataframe (bilingual)
-            df = pd.DataFrame(list(zip(source, target, num, files, regex_list)),
-                              columns=[f'Match {l1}', f'Match {l2}', "Count_Alignment", "File_Pairs", "Regex"])
-            # handle aggregation of files
-            files = df.groupby([f'Match {l1}',
-                                f'Match {l2}'])['File_Pairs'].agg(list).reset_index()
-            # flatten lists if necessary
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: Processing.is_nested(x))
-            # make set to get unique file pairs
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: set(x))
-            # get count of file pairs
-            files['File_Count'] = files['File_Pairs'].apply(lambda x: len(x))
-            # drop left over index column
-            df.drop(["File_Pairs"], axis=1, inplace=True)
-            df = pd.merge(df, files, on=[f'Match {l1}', f'Match {l2}'], how='left')
+            df = pd.DataFrame(list(zip(source, target, num, regex_list)),
+                              columns=[f'Match {l1}', f'Match {l2}', "Count_Alignment", "Regex"])
         else:
             # get matches for one language
-            matches = [elem for elem in counts_dict.keys()]
+            keys = [elem for elem in counts_dict.keys()]
             # store results in dataframe (monolingual)
-            df = pd.DataFrame(list(zip(matches, num, files, regex_list)),
-                              columns=[f'Match {l1}', "Count_Match", "File_Pairs", "Regex"])
-            # handle aggregation of files
-            files = df.groupby(f'Match {l1}')['File_Pairs'].agg(list).reset_index()
-            # flatten lists if necessary
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: Processing.is_nested(x))
-            # make set to get unique file pairs
-            files['File_Pairs'] = files['File_Pairs'].apply(lambda x: set(x))
-            # get count of file pairs
-            files['File_Count'] = files['File_Pairs'].apply(lambda x: len(x))
-            # drop left over index column
-            df.drop(["File_Pairs"], axis=1, inplace=True)
-            df = pd.merge(df, files, on=[f'Match {l1}'], how='left')
+            df = pd.DataFrame(list(zip(keys, num, regex_list)),
+                              columns=[f'Match {l1}', "Count_Match", "Regex"])
+        # collect the files of all occurrences of every match in one pass,
+        # rows of the dataframe are in the order of counts_dict
+        rows = {key: row for row, key in enumerate(counts_dict)}
+        file_sets = Processing.get_file_sets([rows[match] for match in matches], files)
+        df['File_Pairs'] = file_sets
+        df['File_Count'] = [len(file_set) for file_set in file_sets]
         # write dataframe to csv
         df.to_csv(path, encoding="utf-8")
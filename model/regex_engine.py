@@ -0,0 +1,147 @@
+import re
+import time
+try:
+    import regex
+except ImportError:
+    # lines taking too long can only be stopped with the package regex
+    regex = None
+try:
+    import re2
+except ImportError:
+    # linear-time engine of the package google-re2 is optional
+    re2 = None
+from model.pattern_analysis import PatternAnalysis
+
+
+class RegexTimeout(Exception):
+    """Raised when a search takes longer than its time limit
+
+    """
+
+
+class RegexMatcher:
+    """Compiled regex of one engine, used like a compiled pattern of re
+
+       If the search has a deadline, it is checked every CHECK_LINES lines.
+       The engine regex also stops inside a single line which takes too
+       long, re cannot be interrupted within a line.
+    """
+    # lines searched between two checks of the deadline
+    CHECK_LINES = 1000
+
+    def __init__(self, pattern, engine, deadline=None):
+        self.__pattern = pattern
+        self.__engine = engine
+        self.__deadline = deadline
+        self.__lines = 0
+        if deadline is None:
+            # searches without limit call the engine directly
+            self.search = pattern.search
+
+    def get_engine(self):
+        return self.__engine
+
+    def check(self):
+        if self.__deadline is not None and time.time() > self.__deadline:
+            raise RegexTimeout("the search took longer than its time limit")
+
+    def search(self, text):
+        self.__lines += 1
+        if self.__lines == self.CHECK_LINES:
+            self.__lines = 0
+            self.check()
+        if self.__engine == "regex":
+            try:
+                return self.__pattern.search(text, timeout=max(self.__deadline - time.time(),
+                                                               0.001))
+            except TimeoutError:
+                raise RegexTimeout("the search took longer than its time limit") from None
+        return self.__pattern.search(text)
+
+
+class RegexEngine:
+    """Regex engines for searching alignment files
+
+       re: Python's engine, default
+       regex: compatible with re, searches can be stopped within a line
+       re2: linear time, no backreferences or lookarounds, \\w and \\b
+            only for ASCII characters
+       auto: re for safe regexes, regexes which can backtrack
+             exponentially (see PatternAnalysis.get_danger) use regex if
+             it is installed, re2 is only used if chosen as it matches
+             \\w and \\b differently
+    """
+    ENGINES = ("auto", "re", "regex", "re2")
+
+    @staticmethod
+    def get_available():
+        # engines that can be chosen with the installed packages
+        engines = ["auto", "re"]
+        if regex is not None:
+            engines.append("regex")
+        if re2 is not None:
+            engines.append("re2")
+        return engines
+
+    @staticmethod
+    def get_deadline(timeout):
+        """ Get end of the time limit of a search
+
+        @param timeout: time limit in seconds, None or 0 for no limit
+        @return: deadline (time.time) or None
+        """
+        return time.time() + timeout if timeout else None
+
+    @staticmethod
+    def __compile_re2(pattern, caseinsensitive):
+        options = re2.Options()
+        options.case_sensitive = not caseinsensitive
+        options.log_errors = False
+        try:
+            return re2.compile(pattern, options)
+        except re2.error as error:
+            # same error as for the other engines
+            raise re.error(f"{pattern} cannot be searched with re2: {error}") from None
+
+    @staticmethod
+    def choose(pattern, engine="auto"):
+        """ Get engine for a regex
+
+        @param pattern: regular expression given by user
+        @param engine: engine chosen by user
+        @return: "re", "regex" or "re2"
+        """
+        if engine != "auto":
+            return engine
+        if PatternAnalysis.get_danger(pattern) is None:
+            return "re"
+        return "regex" if regex is not None else "re"
+
+    @staticmethod
+    def compile(pattern, caseinsensitive=False, engine="re", deadline=None):
+        """ Compile regex with the chosen engine
+
+        @param pattern: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @param engine: "auto", "re", "regex" or "re2"
+        @param deadline: end of the time limit of the search (get_deadline)
+        @return: RegexMatcher
+        """
+        name = RegexEngine.choose(pattern, engine)
+        if name == "re":
+            compiled = re.compile(pattern, flags=re.IGNORECASE if caseinsensitive else 0)
+        elif name == "regex":
+            if regex is None:
+                raise ImportError("the package regex is needed for the engine regex")
+            flags = regex.V0 | (regex.IGNORECASE if caseinsensitive else 0)
+            try:
+                compiled = regex.compile(pattern, flags=flags)
+            except regex.error as error:
+                raise re.error(str(error)) from None
+        elif name == "re2":
+            if re2 is None:
+                raise ImportError("the package google-re2 is needed for the engine re2")
+            compiled = RegexEngine.__compile_re2(pattern, caseinsensitive)
+        else:
+            raise ValueError(f"unknown regex engine {engine}")
+        return RegexMatcher(compiled, name, deadline)
@@ -0,0 +1,164 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a search job after it has been cancelled
+
+    """
+
+
+class JobProgress:
+    """Progress of a search job
+
+       The progress is updated by the thread running the search (stage,
+       lines scanned, matches found) and read by the page polling it.
+       Every update checks whether the job has been cancelled, so the
+       search stops at the next update.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__cancelled = threading.Event()
+        self.__stage = "queued"
+        self.__lines = 0
+        self.__total = 0
+        self.__matches = 0
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def is_cancelled(self):
+        return self.__cancelled.is_set()
+
+    def check(self):
+        # stop the search if the job has been cancelled
+        if self.__cancelled.is_set():
+            raise JobCancelled()
+
+    def set_stage(self, stage, total=None):
+        """ Start next stage of the job
+
+        @param stage: description of the stage, e.g. "searching"
+        @param total: number of lines to be scanned in this stage
+        """
+        self.check()
+        with self.__lock:
+            self.__stage = stage
+            if total is not None:
+                self.__total = total
+                self.__lines = 0
+                self.__matches = 0
+
+    def advance(self, lines, matches=0):
+        """ Add scanned lines and found matches
+
+        @param lines: number of lines scanned since the last update
+        @param matches: number of matches found in these lines
+        """
+        self.check()
+        with self.__lock:
+            self.__lines += lines
+            self.__matches += matches
+
+    def get_state(self):
+        with self.__lock:
+            return {"stage": self.__stage, "lines": self.__lines,
+                    "total": self.__total, "matches": self.__matches}
+
+
+class SearchJobs:
+    """Run searches in background threads with a job ID for each search
+
+       Jobs are functions which take the keyword argument progress
+       (JobProgress). Their state, progress and result can be polled by
+       job ID, jobs can be cancelled and submitted again. With max_age,
+       finished jobs are removed after max_age seconds, e.g. by a server
+       whose clients may never remove their jobs.
+    """
+    def __init__(self, max_workers=2, max_age=None):
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers,
+                                             thread_name_prefix="search")
+        self.__lock = threading.Lock()
+        # job ID: (future, progress, function, args, kwargs)
+        self.__jobs = {}
+        self.__max_age = max_age
+        # job ID: time the job finished
+        self.__finished = {}
+
+    def __finish(self, job_id):
+        with self.__lock:
+            self.__finished[job_id] = time.time()
+
+    def __expire(self):
+        # remove jobs which finished more than max_age seconds ago
+        if self.__max_age is None:
+            return
+        limit = time.time() - self.__max_age
+        with self.__lock:
+            for job_id in [job_id for job_id, finished in self.__finished.items()
+                           if finished < limit]:
+                self.__jobs.pop(job_id, None)
+                del self.__finished[job_id]
+
+    def submit(self, function, *args, **kwargs):
+        """ Run function in the background
+
+        @param function: function doing the search, called with progress
+        @return: job ID
+        """
+        self.__expire()
+        job_id = uuid.uuid4().hex[:8]
+        progress = JobProgress()
+        future = self.__executor.submit(function, *args, progress=progress, **kwargs)
+        with self.__lock:
+            self.__jobs[job_id] = (future, progress, function, args, kwargs)
+        if self.__max_age is not None:
+            future.add_done_callback(lambda _: self.__finish(job_id))
+        return job_id
+
+    def resubmit(self, job_id):
+        """ Run a job again with the same arguments
+
+        @param job_id: ID of the earlier job
+        @return: ID of the new job
+        """
+        _, _, function, args, kwargs = self.__jobs[job_id]
+        return self.submit(function, *args, **kwargs)
+
+    def cancel(self, job_id):
+        future, progress, _, _, _ = self.__jobs[job_id]
+        progress.cancel()
+        future.cancel()
+
+    def remove(self, job_id):
+        with self.__lock:
+            self.__jobs.pop(job_id, None)
+            self.__finished.pop(job_id, None)
+
+    def has_job(self, job_id):
+        self.__expire()
+        return job_id in self.__jobs
+
+    def get_status(self, job_id):
+        """ Get state, progress and result of a job
+
+        @param job_id: ID of the job
+        @return: dictionary with state (queued, running, done, cancelled
+                 or failed), stage, lines, total, matches, result and error
+        """
+        future, progress, _, _, _ = self.__jobs[job_id]
+        status = progress.get_state()
+        status.update(state="running", result=None, error=None)
+        if future.cancelled():
+            status["state"] = "cancelled"
+        elif not future.done():
+            status["state"] = "queued" if status["stage"] == "queued" else "running"
+        elif isinstance(future.exception(), JobCancelled):
+            status["state"] = "cancelled"
+        elif future.exception() is not None:
+            status.update(state="failed", error=str(future.exception()))
+        else:
+            status.update(state="done", result=future.result())
+        return status
@@ -0,0 +1,250 @@
+from model.batch_search import BatchSearch
+from model.bilingual_context import BilingualContext
+from model.bilingual_statistics import BilingualStats
+from model.hit_list import HitList
+from model.monolingual_context import MonolingualContext
+from model.monolingual_statistics import MonolingualStats
+from model.regex_engine import RegexEngine
+from model.search_session import SearchSession
+
+
+class SearchRunner:
+    """Run one search with the settings of the search page and write its
+       context and statistics files
+
+       Used by the search page (as background job), the command line
+       (model.cli) and the search server (model.search_server). Settings
+       are a dictionary with the keys returned by get_settings, searches
+       with a list of regexes are run as batch search.
+    """
+
+    @staticmethod
+    def get_settings(search_path, regex, root_path, l1, l2, lang_mode="bilingual",
+                     mono_lang=None, **options):
+        """ Get settings of a search, missing options have the defaults of
+            the search page
+
+        @param search_path: path of alignment file
+        @param regex: regular expression given by user
+        @param root_path: directory for the created files
+        @param l1: source language
+        @param l2: target language
+        @param lang_mode: "monolingual" or "bilingual"
+        @param mono_lang: language searched in monolingual mode, default l1
+        @param options: stats, context, parsed, pre_context, post_context,
+                        anno, caseinsensitive, mapped, workers, trigrams,
+                        columnar, memory_limit, engine, timeout,
+                        show_messages
+        @return: dictionary of settings
+        """
+        mono_lang = l1 if mono_lang is None else mono_lang
+        settings = {
+            "search_path": search_path,
+            "regex": regex,
+            "regexes": None,
+            "caseinsensitive": False,
+            "lang_mode": lang_mode,
+            "mono_lang": mono_lang,
+            "mono_param": mono_lang == l1,
+            "l1": l1,
+            "l2": l2,
+            "stats": True,
+            "context": True,
+            "parsed": False,
+            "pre_context": 1,
+            "post_context": 1,
+            "anno": False,
+            "mapped": False,
+            "workers": 1,
+            "trigrams": False,
+            "columnar": False,
+            "memory_limit": None,
+            # regex engine (see RegexEngine) and time limit in seconds
+            "engine": "auto",
+            "timeout": None,
+            "root_path": root_path,
+            "show_messages": True
+        }
+        unknown = set(options) - set(settings)
+        if unknown:
+            raise ValueError(f"unknown search settings: {', '.join(sorted(unknown))}")
+        settings.update(options)
+        return settings
+
+    @staticmethod
+    def from_dict(settings):
+        """ Rebuild settings received from a client, e.g. by the search server
+
+        @param settings: dictionary of settings (see get_settings)
+        @return: dictionary of settings with all keys
+        """
+        if not isinstance(settings, dict):
+            raise ValueError("search settings must be a dictionary")
+        options = dict(settings)
+        try:
+            args = [options.pop(key) for key in ("search_path", "regex", "root_path", "l1", "l2")]
+        except KeyError as error:
+            raise ValueError(f"search setting {error} is missing") from None
+        # derived from mono_lang
+        options.pop("mono_param", None)
+        regexes = options.pop("regexes", None)
+        result = SearchRunner.get_settings(*args, **options)
+        if regexes is not None and (not isinstance(regexes, list) or
+                                    not all(isinstance(regex, str) for regex in regexes)):
+            raise ValueError("regexes must be a list of regular expressions")
+        if regexes is None and not isinstance(result["regex"], str):
+            raise ValueError("regex must be a regular expression")
+        if result["lang_mode"] not in ("monolingual", "bilingual"):
+            raise ValueError(f"unknown language mode {result['lang_mode']}")
+        if result["engine"] not in RegexEngine.ENGINES:
+            raise ValueError(f"unknown regex engine {result['engine']}")
+        result["regexes"] = regexes
+        return result
+
+    @staticmethod
+    def get_src_pattern(settings):
+        # (trg) lines are searched for the target language in monolingual mode
+        if settings["lang_mode"] == "monolingual" and not settings["mono_param"]:
+            return r'\(trg\)="[0-9]+">'
+        return r'\(src\)="[0-9]+">'
+
+    @staticmethod
+    def __set_stage(progress, stage):
+        if progress is not None:
+            progress.set_stage(stage)
+
+    @staticmethod
+    def run(settings, session=None, progress=None, pool=None):
+        """ Search and write context and statistics files
+
+        @param settings: dictionary of settings (see get_settings)
+        @param session: search session of the alignment file to reuse,
+                        e.g. for several searches in the same file
+        @param progress: progress of a search job (JobProgress)
+        @param pool: pool of loaded alignment files (CorpusPool)
+        @return: dictionary with paths of the created files (path_stats,
+                 path_qual, path_quant) and whether there were no matches
+        """
+        result = {"path_stats": "", "path_qual": "", "path_quant": "", "no_matches": False,
+                  "stats": settings["stats"], "context": settings["context"],
+                  "show_messages": settings["show_messages"]}
+        search_path = settings["search_path"]
+        regex = settings["regex"]
+        caseinsensitive = settings["caseinsensitive"]
+        root_path = settings["root_path"]
+        options = {"caseinsensitive": caseinsensitive, "mapped": settings["mapped"],
+                   "workers": settings["workers"], "trigrams": settings["trigrams"]}
+        stats_options = {"parsed": settings["parsed"], "columnar": settings["columnar"],
+                         "memory_limit": settings["memory_limit"]}
+        mono_param = settings["mono_param"]
+        src_pattern = SearchRunner.get_src_pattern(settings)
+        # engines can find different matches (re2 matches \w only for ASCII)
+        engine = RegexEngine.choose(regex, settings["engine"])
+        path_hits = HitList.get_path(search_path, regex, src_pattern, caseinsensitive,
+                                     engine)
+        # matches of an earlier search with the same regex are reused,
+        # e.g. to write context with other settings
+        search = HitList.find(path_hits, search_path, regex, src_pattern,
+                              caseinsensitive=caseinsensitive, engine=engine)
+        if search is None:
+            # context and statistics share one search through the file
+            search = session if session is not None else SearchSession(
+                search_path, mapped=settings["mapped"], workers=settings["workers"],
+                trigrams=settings["trigrams"], progress=progress, pool=pool,
+                engine=settings["engine"], timeout=settings["timeout"])
+            try:
+                HitList.write_hit_list(path_hits, search_path, regex, src_pattern,
+                                       caseinsensitive=caseinsensitive, search=search,
+                                       engine=engine)
+            except OSError:
+                # hit lists are only a cache, e.g. not written on read-only drives
+                pass
+        if settings["lang_mode"] == "monolingual":
+            if settings["context"]:
+                SearchRunner.__set_stage(progress, "writing context")
+                mono_context = MonolingualContext(
+                    path=search_path, regex=regex, pre_context=settings["pre_context"],
+                    post_context=settings["post_context"],
+                    anno=True if settings["anno"] else False, src=mono_param,
+                    search=search, **options)
+                if len(mono_context.get_matches_context()) == 0:
+                    result["no_matches"] = True
+                    return result
+                result["path_qual"] = mono_context.write_context_qual_mono(
+                    lang=settings["mono_lang"], root_path=root_path)
+                result["path_quant"] = mono_context.write_context_quant_mono(
+                    lang=settings["mono_lang"], root_path=root_path)
+            if settings["stats"]:
+                SearchRunner.__set_stage(progress, "writing statistics")
+                mono_matches = MonolingualStats(path=search_path, regex=regex, src=mono_param,
+                                                search=search, **options, **stats_options)
+                if not mono_matches.get_counts():
+                    result["no_matches"] = True
+                    return result
+                result["path_stats"] = mono_matches.write_monolingual_stats(
+                    lang=settings["mono_lang"], root_path=root_path)
+        elif settings["lang_mode"] == "bilingual":
+            if settings["context"]:
+                SearchRunner.__set_stage(progress, "writing context")
+                bil_context = BilingualContext(
+                    path=search_path, regex=regex, pre_context=settings["pre_context"],
+                    post_context=settings["post_context"], anno=settings["anno"],
+                    search=search, **options)
+                if len(bil_context.get_matches_context()) == 0:
+                    result["no_matches"] = True
+                    return result
+                result["path_qual"] = bil_context.write_context_qual_bil(
+                    l1=settings["l1"], l2=settings["l2"], root_path=root_path)
+                result["path_quant"] = bil_context.write_context_quant_bil(
+                    l1=settings["l1"], l2=settings["l2"], root_path=root_path)
+            if settings["stats"]:
+                SearchRunner.__set_stage(progress, "writing statistics")
+                bil_matches = BilingualStats(path=search_path, regex=regex, src_aggregate=True,
+                                             search=search, **options, **stats_options)
+                if not bil_matches.get_counts():
+                    result["no_matches"] = True
+                    return result
+                result["path_stats"] = bil_matches.write_bilingual_stats(
+                    l1=settings["l1"], l2=settings["l2"], root_path=root_path)
+        SearchRunner.__set_stage(progress, "done")
+        return result
+
+    @staticmethod
+    def run_batch(settings, progress=None, pool=None):
+        """ Search all regexes of the settings in one pass and write their
+            context and statistics files
+
+        @param settings: dictionary of settings with regexes
+        @param progress: progress of a search job (JobProgress)
+        @param pool: pool of loaded alignment files (CorpusPool)
+        @return: dictionary with paths of the created files for every regex
+        """
+        batch = BatchSearch(settings["search_path"], settings["regexes"],
+                            caseinsensitive=settings["caseinsensitive"],
+                            mapped=settings["mapped"], workers=settings["workers"],
+                            trigrams=settings["trigrams"], progress=progress, pool=pool,
+                            engine=settings["engine"], timeout=settings["timeout"])
+        SearchRunner.__set_stage(progress, "writing files")
+        if settings["lang_mode"] == "monolingual":
+            paths = batch.write_monolingual(
+                lang=settings["mono_lang"],
+                root_path=settings["root_path"],
+                src=settings["mono_param"],
+                stats=settings["stats"], context=settings["context"],
+                parsed=settings["parsed"], pre_context=settings["pre_context"],
+                post_context=settings["post_context"],
+                anno=True if settings["anno"] else False)
+        else:
+            paths = batch.write_bilingual(
+                l1=settings["l1"], l2=settings["l2"],
+                root_path=settings["root_path"],
+                stats=settings["stats"], context=settings["context"],
+                parsed=settings["parsed"], pre_context=settings["pre_context"],
+                post_context=settings["post_context"], anno=settings["anno"])
+        SearchRunner.__set_stage(progress, "done")
+        return {"batch": paths, "show_messages": settings["show_messages"]}
+
+    @staticmethod
+    def get_function(settings):
+        # batch search for a list of regexes, otherwise a single search
+        return SearchRunner.run if settings["regexes"] is None else SearchRunner.run_batch
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from model.corpus_pool import CorpusPool
+from model.search_jobs import SearchJobs
+from model.search_runner import SearchRunner
+from model.search_workers import SearchWorkers
+
+# default port of the search server on the local machine
+PORT = 8765
+# data directory of the app
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        os.pardir, "data"))
+# default directory of the alignment files the server may search
+GENERATED_DIR = os.path.join(DATA_DIR, "generated")
+# default directory the server may write search results to
+RESULTS_DIR = os.path.join(DATA_DIR, "search_results")
+# seconds finished searches are kept for their clients
+MAX_AGE = 24 * 60 * 60
+
+
+class SearchServer:
+    """Long-running local search service with one pool of loaded
+       alignment files for many clients (e.g. several search pages)
+
+       Searches are submitted as settings of SearchRunner and run as
+       background jobs of the server, the created files are written by the
+       server. The HTTP/JSON API:
+
+       GET    /status                  loaded files and their memory
+       POST   /searches                submit settings, returns job_id
+       GET    /searches/<id>           state, progress and result
+       POST   /searches/<id>/cancel    cancel search
+       POST   /searches/<id>/resubmit  search again, returns job_id
+       DELETE /searches/<id>           remove search
+
+       With isolated, searches run in worker processes (SearchWorkers)
+       with limits for memory and CPU time, every process keeps its own
+       loaded files. Only alignment files in data_paths are searched and
+       results are only written to the directories in root_paths (and
+       their subdirectories), sidecar files (indexes, hit lists) are
+       written next to the alignment files. There is no authentication,
+       every client that can reach the server can search.
+    """
+
+    def __init__(self, host="127.0.0.1", port=PORT, max_bytes=CorpusPool.MAX_BYTES,
+                 workers=2, isolated=False, memory_limit=None, cpu_limit=None,
+                 root_paths=(RESULTS_DIR,), max_age=MAX_AGE, data_paths=(GENERATED_DIR,)):
+        self.__pool = CorpusPool(max_bytes)
+        self.__jobs = SearchJobs(max_workers=workers, max_age=max_age)
+        self.__root_paths = [os.path.realpath(path) for path in root_paths]
+        self.__data_paths = [os.path.realpath(path) for path in data_paths]
+        self.__workers = SearchWorkers(processes=workers, max_bytes=max_bytes) \
+            if isolated else None
+        self.__limits = {"memory_limit": memory_limit, "cpu_limit": cpu_limit}
+        self.__server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+        self.__server.search_server = self
+
+    def get_url(self):
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self.__server.serve_forever()
+
+    def start(self):
+        # serve in a background thread, e.g. for tests
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__workers is not None:
+            self.__workers.shutdown()
+
+    @staticmethod
+    def __is_inside(path, directories):
+        # whether path is one of the directories or below one of them
+        path = os.path.realpath(path)
+        return any(os.path.commonpath([path, directory]) == directory
+                   for directory in directories)
+
+    def __check_settings(self, settings):
+        # raise ValueError for settings the server does not run
+        settings = SearchRunner.from_dict(settings)
+        if not os.path.isfile(settings["search_path"]):
+            raise ValueError(f"alignment file {settings['search_path']} does not exist")
+        if not self.__is_inside(settings["search_path"], self.__data_paths):
+            raise ValueError(f"the server does not search {settings['search_path']}, "
+                             f"start it with --data-path to allow its directory")
+        # sidecar files are written next to the file checked, not next to a link to it
+        settings["search_path"] = os.path.realpath(settings["search_path"])
+        if not self.__is_inside(settings["root_path"], self.__root_paths):
+            raise ValueError(f"the server does not write to {settings['root_path']}, "
+                             f"start it with --root-path to allow it")
+        return settings
+
+    def handle(self, method, path, body=None):
+        """ Answer a request of the API
+
+        @param method: HTTP method
+        @param path: path of the request
+        @param body: decoded JSON body of POST requests
+        @return: HTTP status and JSON payload
+        """
+        if method == "GET" and path == "/status":
+            return 200, {"corpora": len(self.__pool), "bytes": self.__pool.get_size()}
+        if method == "POST" and path == "/searches":
+            try:
+                settings = self.__check_settings((body or {}).get("settings"))
+            except ValueError as error:
+                return 400, {"error": str(error)}
+            if self.__workers is not None:
+                job_id = self.__jobs.submit(self.__workers.run,
+                                            SearchRunner.get_function(settings), settings,
+                                            **self.__limits)
+            else:
+                job_id = self.__jobs.submit(SearchRunner.get_function(settings), settings,
+                                            pool=self.__pool)
+            return 200, {"job_id": job_id}
+        match = re.fullmatch(r"/searches/(\w+)(?:/(cancel|resubmit))?", path)
+        if match is None:
+            return 404, {"error": f"unknown path {path}"}
+        job_id, action = match.groups()
+        if not self.__jobs.has_job(job_id):
+            return 404, {"error": f"unknown search {job_id}"}
+        if method == "GET" and action is None:
+            return 200, self.__jobs.get_status(job_id)
+        if method == "POST" and action == "cancel":
+            self.__jobs.cancel(job_id)
+            return 200, {"job_id": job_id}
+        if method == "POST" and action == "resubmit":
+            return 200, {"job_id": self.__jobs.resubmit(job_id)}
+        if method == "DELETE" and action is None:
+            self.__jobs.remove(job_id)
+            return 200, {"job_id": job_id}
+        return 405, {"error": f"{method} is not allowed for {path}"}
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """Translate HTTP requests into calls of SearchServer.handle
+
+    """
+
+    def __answer(self, method):
+        body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            if length:
+                body = json.loads(self.rfile.read(length).decode("utf-8"))
+            status, payload = self.server.search_server.handle(method, self.path, body)
+        except ValueError as error:
+            status, payload = 400, {"error": str(error)}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.__answer("GET")
+
+    def do_POST(self):
+        self.__answer("POST")
+
+    def do_DELETE(self):
+        self.__answer("DELETE")
+
+    def log_message(self, format, *args):
+        # polling of the search pages would flood the terminal
+        pass
+
+
+class SearchClient:
+    """Submit searches to a search server, used like SearchJobs by the
+       search page in thin-client mode
+
+    """
+    # seconds to wait for an answer of the server
+    TIMEOUT = 10
+
+    def __init__(self, url):
+        self.__url = url.rstrip("/")
+
+    def __request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(f"{self.__url}{path}", data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as error:
+            payload = json.loads(error.read().decode("utf-8") or "{}")
+            if error.code == 404:
+                raise KeyError(payload.get("error", path)) from None
+            raise ValueError(payload.get("error", str(error))) from None
+
+    def get_server_status(self):
+        return self.__request("GET", "/status")
+
+    def submit(self, settings):
+        """ Run search on the server
+
+        @param settings: dictionary of settings (see SearchRunner.get_settings)
+        @return: job ID
+        """
+        return self.__request("POST", "/searches", {"settings": settings})["job_id"]
+
+    def resubmit(self, job_id):
+        return self.__request("POST", f"/searches/{job_id}/resubmit")["job_id"]
+
+    def cancel(self, job_id):
+        self.__request("POST", f"/searches/{job_id}/cancel")
+
+    def remove(self, job_id):
+        try:
+            self.__request("DELETE", f"/searches/{job_id}")
+        except KeyError:
+            pass
+
+    def has_job(self, job_id):
+        try:
+            self.get_status(job_id)
+        except KeyError:
+            return False
+        return True
+
+    def get_status(self, job_id):
+        # see SearchJobs.get_status
+        return self.__request("GET", f"/searches/{job_id}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m model.search_server",
+                                     description="Local search server keeping alignment "
+                                                 "files loaded for several search pages")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on; the server has no authentication, "
+                             "on other addresses than 127.0.0.1 everyone who can reach it "
+                             "can search and write files")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--memory", type=int, default=CorpusPool.MAX_BYTES // 1024 ** 2,
+                        help="memory in MB for loaded alignment files")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="searches running at the same time")
+    parser.add_argument("--root-path", action="append", default=None,
+                        help="directory the server may write search results to, can be "
+                             f"given several times (default {RESULTS_DIR})")
+    parser.add_argument("--data-path", action="append", default=None,
+                        help="directory with alignment files the server may search (sidecar "
+                             "files are written there), can be given several times "
+                             f"(default {GENERATED_DIR})")
+    parser.add_argument("--isolated", action="store_true",
+                        help="run searches in separate processes")
+    parser.add_argument("--search-memory", type=int, default=0,
+                        help="memory limit in MB of an isolated search, 0 for no limit")
+    parser.add_argument("--search-cpu", type=int, default=0,
+                        help="CPU time limit in seconds of an isolated search, 0 for no limit")
+    args = parser.parse_args(argv)
+    server = SearchServer(args.host, args.port, max_bytes=args.memory * 1024 ** 2,
+                          workers=args.workers, isolated=args.isolated,
+                          memory_limit=args.search_memory * 1024 ** 2 or None,
+                          cpu_limit=args.search_cpu or None,
+                          root_paths=args.root_path or [RESULTS_DIR],
+                          data_paths=args.data_path or [GENERATED_DIR])
+    print(f"search server listening on {server.get_url()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import re
+import numpy as np
+from model.mapped_search import MappedSearch
+from model.pattern_analysis import PatternAnalysis
+from model.processing import Preprocessing, Processing
+from model.regex_engine import RegexEngine, RegexMatcher
+
+
+class SearchSession:
+    """Search an alignment file once and share matches, indices and files
+       between context and statistics classes
+
+       The session is passed as search to the context and statistics
+       classes. The file is read once, every regex is searched once in
+       all lines and the results for the monolingual text list (context)
+       are derived from the results for all lines (statistics). If a list
+       of regexes is given, all of them are searched in a single pass.
+    """
+
+    def __init__(self, path, regexes=None, mapped=False, workers=1, trigrams=False,
+                 progress=None, pool=None, engine="re", timeout=None):
+        self.__path = path
+        # regex engine (see RegexEngine) and time limit of every search in seconds
+        self.__engine = engine
+        self.__timeout = timeout
+        # remove duplicates but keep order of regexes
+        self.__regexes = list(dict.fromkeys(regexes or []))
+        # progress of a search job (JobProgress)
+        self.__progress = progress
+        if progress is not None:
+            progress.set_stage("reading file")
+        if mapped or workers > 1 or trigrams:
+            # memory-mapped file, only matches and their context are decoded
+            self.__search = pool.get(path, MappedSearch, workers=workers, trigrams=trigrams) \
+                if pool is not None else MappedSearch(path, workers=workers, trigrams=trigrams)
+            self.__text_list = self.__search.get_text_list()
+            self.__raw_text_list = None
+        else:
+            self.__search = None
+            # files already loaded by earlier searches are taken from the pool
+            preprocessing = pool.get(path, Preprocessing) if pool is not None \
+                else Preprocessing(path)
+            self.__text_list = preprocessing.get_text_list()
+            self.__raw_text_list = preprocessing.get_raw_text_list()
+        # monolingual text lists by pattern
+        self.__text_lists = {}
+        # line numbers and block maps of monolingual text lists
+        self.__line_numbers = {}
+        self.__block_maps = {}
+        # results for all lines by pattern, case and regex
+        self.__results = {}
+
+    def get_path(self):
+        return self.__path
+
+    def get_regexes(self):
+        return self.__regexes
+
+    def get_raw_text_list(self):
+        return self.__raw_text_list
+
+    def get_text_list(self, pattern=None, file_pattern=None):
+        """ Get lines of the file searched
+            (see Processing.perform_new_search)
+
+        @param pattern: compiled pattern for (src) or (trg) lines to keep
+        @param file_pattern: compiled pattern for file headers to keep
+        @return: all lines or only lines of one language and file headers
+        """
+        if pattern is None:
+            return self.__text_list
+        key = (pattern.pattern, file_pattern.pattern)
+        if key not in self.__text_lists:
+            if self.__search is not None:
+                text_list = self.__search.get_text_list(pattern, file_pattern)
+                line_numbers = text_list.get_line_numbers()
+            else:
+                line_numbers = np.array([index for index, s in enumerate(self.__text_list)
+                                         if pattern.match(s) or file_pattern.match(s)],
+                                        dtype=np.int64)
+                text_list = [self.__text_list[index] for index in line_numbers]
+            self.__text_lists[key] = text_list
+            self.__line_numbers[id(text_list)] = line_numbers
+        return self.__text_lists[key]
+
+    def __get_block_map(self, text_list):
+        if id(text_list) not in self.__block_maps:
+            if self.__search is not None:
+                self.__block_maps[id(text_list)] = self.__search.get_block_map(text_list)
+            else:
+                self.__block_maps[id(text_list)] = Processing.get_block_map(text_list)
+        return self.__block_maps[id(text_list)]
+
+    @staticmethod
+    def __combine(regexes, flags):
+        # one alternation to skip lines matching none of the regexes,
+        # group numbers change, so backreferences cannot be combined
+        if any(PatternAnalysis.references_groups(regex) for regex in regexes):
+            return None
+        try:
+            return re.compile("|".join(f"(?:{regex})" for regex in regexes), flags)
+        except re.error:
+            # e.g. global flags which are not at the start any more
+            return None
+
+    def __scan(self, regexes, src_pattern, caseinsensitive):
+        # search several regexes in one pass over all lines
+        flags = re.IGNORECASE if caseinsensitive else 0
+        deadline = RegexEngine.get_deadline(self.__timeout)
+        patterns = [RegexEngine.compile(regex, caseinsensitive, self.__engine, deadline)
+                    for regex in regexes]
+        combined = None
+        # the alternation is searched with re, regexes routed to another
+        # engine must not be run with re
+        if all(pattern.get_engine() == "re" for pattern in patterns):
+            combined = self.__combine(regexes, flags)
+        if combined is not None:
+            combined = RegexMatcher(combined, "re", deadline)
+        blocks, labels = self.__get_block_map(self.__text_list)
+        results = {regex: ([], [], []) for regex in regexes}
+        if self.__progress is not None:
+            self.__progress.set_stage("searching", total=len(self.__text_list))
+        scanned = 0
+        for index, item in enumerate(self.__text_list):
+            if self.__progress is not None and index - scanned == Processing.PROGRESS_LINES:
+                self.__progress.advance(index - scanned)
+                scanned = index
+            if not src_pattern.match(item):
+                continue
+            if combined is not None and not combined.search(item):
+                continue
+            # only lines matching at least one regex are tested one by one
+            for regex, pattern in zip(regexes, patterns):
+                if pattern.search(item):
+                    matches, matches_index, files = results[regex]
+                    matches.append(item.strip("\n"))
+                    matches_index.append(index)
+                    files.append(labels[blocks[index]])
+        if self.__progress is not None:
+            self.__progress.advance(len(self.__text_list) - scanned,
+                                    sum(len(result[0]) for result in results.values()))
+        return results
+
+    def __get_results(self, regex, src_pattern, caseinsensitive):
+        results = self.__results.setdefault((src_pattern.pattern, caseinsensitive), {})
+        if regex not in results:
+            pending = [elem for elem in self.__regexes if elem not in results]
+            if regex in pending and len(pending) > 1:
+                results.update(self.__scan(pending, src_pattern, caseinsensitive))
+            elif self.__search is not None:
+                results[regex] = self.__search.get_matches_index_files(
+                    self.__text_list, regex, src_pattern, caseinsensitive=caseinsensitive,
+                    progress=self.__progress, engine=self.__engine, timeout=self.__timeout)
+            else:
+                results[regex] = Processing.get_matches_index_files(
+                    self.__text_list, regex, src_pattern, caseinsensitive=caseinsensitive,
+                    progress=self.__progress, engine=self.__engine, timeout=self.__timeout)
+        return results[regex]
+
+    def get_matches_index_files(self, text_list, regex, src_pattern,
+                                caseinsensitive=False):
+        """ Extract matches, corresponding files, and their indices in text
+            list (see Processing.get_matches_index_files)
+
+        @param text_list: list of lines returned by get_text_list
+        @param regex: regular expression given by user
+        @param src_pattern: compiled pattern for (src) or (trg) lines
+        @param caseinsensitive: whether search ignores case
+        @return: matches, indices in text list and files
+        """
+        matches, matches_index, files = self.__get_results(regex, src_pattern,
+                                                           caseinsensitive)
+        if text_list is self.__text_list:
+            return matches, matches_index, files
+        # translate results for all lines to monolingual text list,
+        # all matching lines are part of it
+        line_numbers = self.__line_numbers[id(text_list)]
+        mono_index = np.searchsorted(line_numbers, matches_index).tolist()
+        blocks, labels = self.__get_block_map(text_list)
+        return list(matches), mono_index, [labels[blocks[index]] for index in mono_index]
@@ -0,0 +1,217 @@
+import atexit
+import multiprocessing
+import queue
+import threading
+import psutil
+from model.corpus_pool import CorpusPool
+from model.search_jobs import JobCancelled
+# loaded with this module, so the workers start with all model imports
+from model.search_runner import SearchRunner
+
+
+class WorkerLimitExceeded(Exception):
+    """Raised when a search used more memory or CPU time than allowed
+
+    """
+
+
+class WorkerProgress:
+    """Progress of a search in a worker process, updates are sent to the
+       JobProgress of the app
+
+       Cancelled searches are stopped by ending the worker process, so
+       check never raises.
+    """
+
+    def __init__(self, connection):
+        self.__connection = connection
+
+    def check(self):
+        pass
+
+    def set_stage(self, stage, total=None):
+        self.__connection.send(("stage", (stage, total)))
+
+    def advance(self, lines, matches=0):
+        self.__connection.send(("advance", (lines, matches)))
+
+
+class SearchWorkers:
+    """Pool of worker processes which run searches isolated from the app
+
+       The workers are started with the pool and keep running, so a search
+       does not wait for a new process and its imports. Every worker keeps
+       its own pool of loaded alignment files. While a search runs, the
+       memory (RSS, including processes started by the search) and the CPU
+       time of its worker are checked. A worker over a limit, or running
+       a cancelled search, is ended and replaced by a new one, the app is
+       not affected. Results are the paths of the files written by the
+       worker.
+    """
+    # seconds between two checks of the limits of a running search
+    POLL_SECONDS = 0.2
+
+    def __init__(self, processes=2, max_bytes=CorpusPool.MAX_BYTES):
+        self.__max_bytes = max_bytes
+        # idle workers: (process, connection)
+        self.__idle = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__workers = set()
+        self.__closed = False
+        for _ in range(processes):
+            self.__idle.put(self.__start_worker())
+        atexit.register(self.shutdown)
+
+    def __start_worker(self):
+        # spawned, forking the threads of the app is not safe
+        context = multiprocessing.get_context("spawn")
+        connection, child_connection = context.Pipe()
+        # not daemonic, searches with several processes start their own workers
+        process = context.Process(target=SearchWorkers.serve,
+                                  args=(child_connection, self.__max_bytes),
+                                  name="search-worker")
+        process.start()
+        child_connection.close()
+        with self.__lock:
+            self.__workers.add(process)
+        return process, connection
+
+    def __stop_worker(self, process, connection):
+        # end worker and the processes it started
+        try:
+            for child in psutil.Process(process.pid).children(recursive=True):
+                child.kill()
+        except psutil.NoSuchProcess:
+            pass
+        process.kill()
+        process.join()
+        connection.close()
+        with self.__lock:
+            self.__workers.discard(process)
+
+    @staticmethod
+    def serve(connection, max_bytes):
+        """ Run searches sent by the app until the connection is closed
+
+        @param connection: connection to the app
+        @param max_bytes: memory for loaded alignment files
+        """
+        pool = CorpusPool(max_bytes)
+        while True:
+            try:
+                task = connection.recv()
+            except EOFError:
+                return
+            if task is None:
+                return
+            function, args, kwargs, memory_limit = task
+            # loaded files take at most half of the memory of a limited search
+            pool.set_max_bytes(min(max_bytes, memory_limit // 2) if memory_limit else max_bytes)
+            try:
+                result = function(*args, progress=WorkerProgress(connection), pool=pool,
+                                  **kwargs)
+            except Exception as error:
+                try:
+                    connection.send(("error", error))
+                except Exception:
+                    # errors which cannot be pickled
+                    connection.send(("error", RuntimeError(f"{type(error).__name__}: {error}")))
+                continue
+            connection.send(("result", result))
+
+    @staticmethod
+    def __get_usage(process):
+        # RSS in bytes and CPU seconds of the worker and the processes it started
+        processes = [process] + process.children(recursive=True)
+        rss = 0
+        cpu = 0.0
+        for elem in processes:
+            try:
+                rss += elem.memory_info().rss
+                times = elem.cpu_times()
+                cpu += times.user + times.system
+            except psutil.NoSuchProcess:
+                continue
+        return rss, cpu
+
+    @staticmethod
+    def __receive(connection, progress):
+        # pass progress of the worker on, return final message
+        while connection.poll():
+            kind, value = connection.recv()
+            if kind == "stage":
+                if progress is not None:
+                    progress.set_stage(*value)
+            elif kind == "advance":
+                if progress is not None:
+                    progress.advance(*value)
+            else:
+                return kind, value
+        return None
+
+    def run(self, function, *args, progress=None, memory_limit=None, cpu_limit=None,
+            **kwargs):
+        """ Run search in a worker process and wait for its result
+
+        @param function: search function taking progress and pool (CorpusPool),
+                         e.g. SearchRunner.run
+        @param progress: progress of the search job (JobProgress)
+        @param memory_limit: maximum memory (RSS) of the search in bytes
+        @param cpu_limit: maximum CPU time of the search in seconds
+        @return: result of function
+        """
+        if self.__closed:
+            raise RuntimeError("the search workers have been shut down")
+        # wait for an idle worker
+        process, connection = self.__idle.get()
+        if progress is not None and progress.is_cancelled():
+            # cancelled while waiting
+            self.__idle.put((process, connection))
+            raise JobCancelled()
+        replace = True
+        try:
+            usage = psutil.Process(process.pid)
+            _, cpu_start = self.__get_usage(usage)
+            connection.send((function, args, kwargs, memory_limit))
+            while True:
+                connection.poll(self.POLL_SECONDS)
+                message = self.__receive(connection, progress)
+                if message is not None:
+                    kind, value = message
+                    replace = False
+                    if kind == "error":
+                        raise value
+                    return value
+                if progress is not None and progress.is_cancelled():
+                    raise JobCancelled()
+                if not process.is_alive():
+                    raise RuntimeError(f"the search process ended unexpectedly "
+                                       f"(exit code {process.exitcode})")
+                rss, cpu = self.__get_usage(usage)
+                if memory_limit and rss > memory_limit:
+                    raise WorkerLimitExceeded(f"the search used more than "
+                                              f"{memory_limit // 1024 ** 2} MB of memory "
+                                              f"and was stopped")
+                if cpu_limit and cpu - cpu_start > cpu_limit:
+                    raise WorkerLimitExceeded(f"the search used more than {cpu_limit} s "
+                                              f"of CPU time and was stopped")
+        except (EOFError, OSError, psutil.NoSuchProcess) as error:
+            raise RuntimeError(f"the search process ended unexpectedly ({error})") from None
+        finally:
+            if replace:
+                # the worker may still be searching or its state is unknown
+                self.__stop_worker(process, connection)
+                if not self.__closed:
+                    self.__idle.put(self.__start_worker())
+            else:
+                self.__idle.put((process, connection))
+
+    def shutdown(self):
+        self.__closed = True
+        with self.__lock:
+            workers = list(self.__workers)
+        for process in workers:
+            process.kill()
+            process.join()
+        with self.__lock:
+            self.__workers.clear()
@@ -0,0 +1,161 @@
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+import weakref
+
+
+class StreamingCounts:
+    """Count matches and the files they occur in with bounded memory
+
+       Matches (strings or tuples of two strings for bilingual matches)
+       are counted in a dictionary. If its estimated size exceeds the
+       memory limit, the partial counts are added to a SQLite scratch
+       table on disk and the dictionary is emptied. The counts are merged
+       when the statistics are written. The csv-file is the same as
+       written by Processing.write_statistics_to_file, rows are ordered
+       by first occurrence of the match.
+
+       Only the counts are bounded: the matches and their files are still
+       collected by the search, and statistics of parsed files are built
+       in memory.
+    """
+    # estimated bytes for a dictionary entry and for a file of an entry
+    __entry_size = 250
+    __file_size = 100
+
+    def __init__(self, memory_limit=64 * 1024 ** 2, directory=None):
+        self.__memory_limit = memory_limit
+        self.__directory = directory
+        # match: [first occurrence, count, {file: first occurrence}]
+        self.__counts = {}
+        self.__size = 0
+        self.__occurrences = 0
+        self.__connection = None
+        self.__spills = 0
+        self.__bilingual = False
+
+    def __len__(self):
+        if self.__connection is None:
+            return len(self.__counts)
+        self.__spill()
+        return self.__connection.execute("SELECT COUNT(*) FROM counts").fetchone()[0]
+
+    def get_spills(self):
+        return self.__spills
+
+    @staticmethod
+    def __split_key(key):
+        # bilingual matches are stored in two columns
+        if isinstance(key, tuple):
+            return key
+        return key, ""
+
+    def add(self, key, file):
+        """ Count one occurrence of a match
+
+        @param key: match or tuple with source and target match
+        @param file: file in which the match occurs
+        """
+        entry = self.__counts.get(key)
+        if entry is None:
+            entry = self.__counts[key] = [self.__occurrences, 0, {}]
+            self.__size += self.__entry_size + sum(
+                sys.getsizeof(elem) for elem in self.__split_key(key))
+            self.__bilingual = isinstance(key, tuple)
+        entry[1] += 1
+        if file not in entry[2]:
+            entry[2][file] = self.__occurrences
+            self.__size += self.__file_size
+        self.__occurrences += 1
+        if self.__size > self.__memory_limit:
+            self.__spill()
+
+    def __connect(self):
+        handle, path = tempfile.mkstemp(suffix=".sqlite", dir=self.__directory)
+        os.close(handle)
+        self.__connection = sqlite3.connect(path)
+        # remove scratch file with the object
+        weakref.finalize(self, self.__remove, self.__connection, path)
+        self.__connection.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE counts (id INTEGER PRIMARY KEY, l1 TEXT, l2 TEXT,
+                                 first INTEGER, count INTEGER, UNIQUE (l1, l2));
+            CREATE TABLE files (id INTEGER, file TEXT, first INTEGER,
+                                PRIMARY KEY (id, file));
+        """)
+
+    @staticmethod
+    def __remove(connection, path):
+        connection.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+    def __spill(self):
+        # add partial counts to scratch table and free the dictionary
+        if not self.__counts:
+            return
+        if self.__connection is None:
+            self.__connect()
+        cursor = self.__connection.cursor()
+        for key, (first, count, files) in self.__counts.items():
+            l1, l2 = self.__split_key(key)
+            row = cursor.execute("SELECT id FROM counts WHERE l1 = ? AND l2 = ?",
+                                 (l1, l2)).fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO counts (l1, l2, first, count) VALUES (?, ?, ?, ?)",
+                               (l1, l2, first, count))
+                key_id = cursor.lastrowid
+            else:
+                key_id = row[0]
+                cursor.execute("UPDATE counts SET count = count + ? WHERE id = ?",
+                               (count, key_id))
+            # first occurrence of a file is kept from the earliest spill
+            cursor.executemany("INSERT OR IGNORE INTO files VALUES (?, ?, ?)",
+                               [(key_id, file, order) for file, order in files.items()])
+        self.__connection.commit()
+        self.__counts = {}
+        self.__size = 0
+        self.__spills += 1
+
+    def items(self):
+        """ Get merged counts ordered by first occurrence
+
+        @return: generator of match, count and list of files
+        """
+        if self.__connection is None:
+            for key, (first, count, files) in self.__counts.items():
+                yield key, count, list(files)
+            return
+        self.__spill()
+        rows = self.__connection.execute(
+            "SELECT id, l1, l2, count FROM counts ORDER BY first")
+        for key_id, l1, l2, count in rows:
+            files = [row[0] for row in self.__connection.execute(
+                "SELECT file FROM files WHERE id = ? ORDER BY first", (key_id,))]
+            yield ((l1, l2) if self.__bilingual else l1), count, files
+
+    def write_statistics_to_file(self, path, regex, l1=None, l2=None):
+        """ Write counts with files to given path
+            (see Processing.write_statistics_to_file)
+
+        @param path: filename or path
+        @param regex: regular expression given by user
+        @param l1: source_files language
+        @param l2: target language
+        """
+        bilingual = l1 is not None and l2 is not None
+        if bilingual:
+            header = ["", f"Match {l1}", f"Match {l2}", "Count_Alignment", "Regex",
+                      "File_Pairs", "File_Count"]
+        else:
+            header = ["", f"Match {l1}", "Count_Match", "Regex", "File_Pairs", "File_Count"]
+        # same format as DataFrame.to_csv
+        with open(path, "w", encoding="utf-8", newline="") as file_out:
+            writer = csv.writer(file_out, lineterminator=os.linesep)
+            writer.writerow(header)
+            for number, (key, count, files) in enumerate(self.items()):
+                matches = list(key) if bilingual else [key]
+                writer.writerow([number] + matches + [count, regex, set(files), len(files)])
@@ -0,0 +1,134 @@
+import os
+import numpy as np
+from model.alignment_index import AlignmentIndex
+from model.compressed_file import CompressedFile
+from model.pattern_analysis import PatternAnalysis
+
+
+class TrigramIndex:
+    """Trigram index of a generated alignment file
+
+       For every trigram (3 bytes of the cleaned, lower case text) the
+       index stores the groups of lines the trigram occurs in. A regex is
+       translated into a query of required trigrams, so only lines in
+       groups containing all of them have to be searched.
+    """
+    # lines sharing one entry in the posting lists
+    LINES_PER_GROUP = 32
+    # lines cleaned and processed at once while building the index
+    LINES_PER_CHUNK = 200000
+    VERSION = 1
+
+    def __init__(self, path, rebuild=False):
+        self.__path = path
+        self.__index_path = AlignmentIndex.sidecar_path(path, "trigrams.npz")
+        self.__index = AlignmentIndex(path)
+        self.__trigrams = None
+        self.__starts = None
+        self.__groups = None
+        if rebuild or not self.__load():
+            self.__build()
+            self.__save()
+
+    def __load(self):
+        if not os.path.exists(self.__index_path):
+            return False
+        with np.load(self.__index_path, allow_pickle=False) as data:
+            if not AlignmentIndex.is_current(self.__path, data["fingerprint"],
+                                             data["version"], self.VERSION):
+                return False
+            self.__trigrams = data["trigrams"]
+            self.__starts = data["starts"]
+            self.__groups = data["groups"]
+        return True
+
+    def __save(self):
+        os.makedirs(os.path.dirname(self.__index_path), exist_ok=True)
+        tmp_path = f"{self.__index_path}.tmp.npz"
+        np.savez(tmp_path, trigrams=self.__trigrams, starts=self.__starts,
+                 groups=self.__groups,
+                 fingerprint=AlignmentIndex.fingerprint(self.__path),
+                 version=np.int64(self.VERSION))
+        os.replace(tmp_path, self.__index_path)
+
+    def get_memory_size(self):
+        # bytes of the posting lists in memory
+        return self.__trigrams.nbytes + self.__starts.nbytes + self.__groups.nbytes
+
+    def __chunk_keys(self, numbers, texts):
+        # combine all trigrams of the chunk with their group into one key
+        data = np.frombuffer(b"\n".join(texts) + b"\n", dtype=np.uint8)
+        if len(data) < 3:
+            return np.empty(0, dtype=np.uint64)
+        data = data.astype(np.uint32)
+        codes = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+        lengths = np.fromiter((len(text) + 1 for text in texts),
+                              dtype=np.int64, count=len(texts))
+        groups = np.repeat(np.asarray(numbers, dtype=np.uint64)
+                           // self.LINES_PER_GROUP, lengths)[:-2]
+        # trigrams must not span two lines
+        valid = (data[:-2] != 10) & (data[1:-1] != 10) & (data[2:] != 10)
+        return np.unique((codes[valid].astype(np.uint64) << np.uint64(32)) |
+                         groups[valid])
+
+    def __build(self):
+        kinds = self.__index.get_kinds()
+        # only (src) and (trg) lines with IDs can match
+        searchable = ((kinds == AlignmentIndex.SRC) |
+                      (kinds == AlignmentIndex.TRG)) & (self.__index.get_ids() >= 0)
+        keys = []
+        numbers = []
+        texts = []
+        with CompressedFile.open(self.__path, "rb") as file_in:
+            for number, line in enumerate(file_in):
+                if not searchable[number]:
+                    continue
+                numbers.append(number)
+                texts.append(AlignmentIndex.clean_line(line).lower())
+                if len(texts) == self.LINES_PER_CHUNK:
+                    keys.append(self.__chunk_keys(numbers, texts))
+                    numbers = []
+                    texts = []
+        keys.append(self.__chunk_keys(numbers, texts))
+        keys = np.unique(np.concatenate(keys))
+        trigrams = (keys >> np.uint64(32)).astype(np.uint32)
+        # posting lists are stored one after another
+        self.__trigrams, starts = np.unique(trigrams, return_index=True)
+        self.__starts = np.append(starts, len(keys)).astype(np.int64)
+        self.__groups = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def __postings(self, trigram):
+        code = (trigram[0] << 16) | (trigram[1] << 8) | trigram[2]
+        position = np.searchsorted(self.__trigrams, code)
+        if position == len(self.__trigrams) or \
+                self.__trigrams[position] != code:
+            return np.empty(0, dtype=np.uint32)
+        return self.__groups[self.__starts[position]:self.__starts[position + 1]]
+
+    def __evaluate(self, query):
+        if isinstance(query, bytes):
+            return self.__postings(query)
+        operator, terms = query
+        result = self.__evaluate(terms[0])
+        for term in terms[1:]:
+            if operator == "and":
+                result = np.intersect1d(result, self.__evaluate(term),
+                                        assume_unique=True)
+            else:
+                result = np.union1d(result, self.__evaluate(term))
+        return result
+
+    def get_candidates(self, regex, caseinsensitive=False):
+        """ Get lines that can contain a match of the regex
+
+        @param regex: regular expression given by user
+        @param caseinsensitive: whether search ignores case
+        @return: sorted line numbers or None if all lines have to be searched
+        """
+        query = PatternAnalysis.get_trigram_query(regex, caseinsensitive)
+        if query is None:
+            return None
+        groups = self.__evaluate(query).astype(np.int64)
+        lines = (groups[:, None] * self.LINES_PER_GROUP +
+                 np.arange(self.LINES_PER_GROUP)).ravel()
+        return lines[lines < self.__index.get_line_count()]
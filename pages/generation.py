@@ -51,6 +51,9 @@ class GenAlign:
                                "Please wait ☕."
         # capture whether parsed or normal file was selected for search
         self.__parse_search = None
+        # compression of generated file as command line argument (user)
+        self.__compression = [] if st.session_state.get("compression", "none") == "none" \
+            else [st.session_state.compression]
 
     @staticmethod
     @st.cache_data
@@ -108,6 +111,12 @@ class GenAlign:
                          "individual misalignments will skew small scale search results "
                          "much more than large scale search results."
                 )
+            st.selectbox(label="Compression of the Generated File", options=("none", "gz", "zst", "bgz"),
+                         key="compression",
+                         help="Compressed files need much less space on (external) drives "
+                              "and are decompressed while searching. zst needs the package zstandard. "
+                              "bgz compresses blocks of alignments separately, so context and "
+                              "statistics only decompress the blocks with matches.")
             add_vertical_space(2)
             st.form_submit_button("Generate Data", on_click=self.__generate)
 
@@ -151,6 +160,11 @@ class GenAlign:
             self.__gen_path_file = Path(os.path.join(self.__gen_path, f"alignments_{self.__code_src}" +
                                                      f"_{self.__code_trg}_" +
                                                      f"{self.__limit}_normal.txt")).as_posix()
+        # compressed files get the suffix of the compression
+        self.__compression = [] if st.session_state.compression == "none" \
+            else [st.session_state.compression]
+        for suffix in self.__compression:
+            self.__gen_path_file = f"{self.__gen_path_file}.{suffix}"
         if self.__src_path_hard is not None:
             self.__src_path = self.__src_path_hard
         # Call __run_command_check_download with the determined paths
@@ -161,7 +175,8 @@ class GenAlign:
                                           self.__code_src,
                                           self.__code_trg,
                                           str(self.__limit),
-                                          self.__parse_option)
+                                          self.__parse_option,
+                                          *self.__compression)
 
     def __handle_no_download(self, parsed):
         # get filenames necessary to be downloaded
@@ -298,7 +313,8 @@ class GenAlign:
                                 self.__code_src,
                                 self.__code_trg,
                                 str(self.__limit),
-                                self.__parse_option],
+                                self.__parse_option,
+                                *self.__compression],
                                stdout=subprocess.PIPE, cwd=os.getcwd(),
                                input=input_stream.read().encode())
             # add info for generated file here:
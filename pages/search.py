@@ -7,10 +7,15 @@ from pathlib import Path
 import streamlit as st
 import pandas as pd
 from resources import edit_design, scroll_top, rename_files, info_external_hard_drive, info_cwd
-from model.monolingual_context import MonolingualContext
-from model.bilingual_context import BilingualContext
-from model.monolingual_statistics import MonolingualStats
-from model.bilingual_statistics import BilingualStats
+from model.alignment_index import AlignmentIndex
+from model.batch_search import BatchSearch
+from model.corpus_pool import CorpusPool
+from model.search_jobs import SearchJobs
+from model.pattern_analysis import PatternAnalysis
+from model.regex_engine import RegexEngine
+from model.search_runner import SearchRunner
+from model.search_server import PORT, SearchClient
+from model.search_workers import SearchWorkers
 from streamlit_extras.add_vertical_space import add_vertical_space
 
 st.set_page_config(page_title="Search Data", page_icon="🔎", layout="centered")
@@ -43,6 +48,14 @@ class SearchAlign:
         # regular expression entered (user)
         self.__regex = st.session_state.regex \
             if 'regex' in st.session_state else None
+        # uploaded file with one regular expression per line (user)
+        self.__regex_file = st.session_state.regex_file \
+            if 'regex_file' in st.session_state else None
+        # regex engine and time limit of a search in seconds, 0 for no limit (user)
+        self.__engine = st.session_state.regex_engine \
+            if 'regex_engine' in st.session_state else "auto"
+        self.__timeout = st.session_state.search_timeout \
+            if st.session_state.get('search_timeout') else None
         # ignore case for regular expression (user)
         self.__ignore_case = st.session_state["ignore_case"] \
             if "ignore_case" in st.session_state else False
@@ -88,15 +101,39 @@ class SearchAlign:
         # summarise src lines
         self.__aggr_src = st.session_state.aggr_src \
             if 'aggr_src' in st.session_state else None
+        # search memory-mapped file for large files (user)
+        self.__mapped = st.session_state.mapped \
+            if 'mapped' in st.session_state else False
+        # number of processes searching the file in parallel (user)
+        self.__workers = st.session_state.workers \
+            if 'workers' in st.session_state else 1
+        # narrow search with trigram index (user)
+        self.__trigrams = st.session_state.trigrams \
+            if 'trigrams' in st.session_state else False
+        # take annotations of parsed files from columnar store (user)
+        self.__columnar = st.session_state.columnar \
+            if 'columnar' in st.session_state else False
+        # memory limit in MB for statistics of unparsed files, 0 for no limit (user)
+        self.__memory_limit = st.session_state.memory_limit * 1024 ** 2 \
+            if st.session_state.get('memory_limit') else None
+        # memory in MB for alignment files kept loaded between searches (user)
+        self.__pool_memory = st.session_state.pool_memory \
+            if 'pool_memory' in st.session_state else CorpusPool.MAX_BYTES // 1024 ** 2
+        # run searches in worker processes with memory and CPU limits (user)
+        self.__isolated = st.session_state.isolated \
+            if 'isolated' in st.session_state else False
+        # memory limit in MB of a search in a worker process, 0 for no limit (user)
+        self.__worker_memory = st.session_state.worker_memory * 1024 ** 2 \
+            if st.session_state.get('worker_memory') else None
+        # CPU time limit in seconds of a search in a worker process, 0 for no limit (user)
+        self.__worker_cpu = st.session_state.worker_cpu \
+            if st.session_state.get('worker_cpu') else None
+        # url of a local search server which runs the searches (user)
+        self.__server = st.session_state.search_server.strip() \
+            if st.session_state.get('search_server', "").strip() else None
         # show info
         self.__show_messages = st.session_state.show_messages \
             if 'show_messages' in st.session_state else None
-        # handle paths for info
-        self.__path_stats = ""
-        self.__path_qual = ""
-        self.__path_quant = ""
-        self.__search_text = "The alignments are being searched. " \
-                             "Please wait a moment ☕."
         # create needed paths
         self.__handle_paths()
         # list of generated files to choose from
@@ -123,6 +160,41 @@ class SearchAlign:
             self.__gen_path = self.__gen_path_hard
         self.__src_path = os.path.join(data_dir, "language_pairs")
 
+    def __server_error(self, error):
+        if isinstance(error, ValueError):
+            # the server answered, but did not accept the request
+            st.error(f"The search server {self.__server} refused the request: {error}")
+            return
+        styled = f"""
+                <div style="background-color: rgba(255, 165, 0, 0.8);
+                 padding: 10px;
+                 border-radius: 5px;
+                 color: black;">
+                    <b>Error:</b>
+                    <br>
+                    The search server {self.__server} could not be reached ({error}).
+                    <br>
+                    Please start it with <b>python -m model.search_server</b>
+                    or leave the field Search Server empty.
+                </div>
+                """
+        st.markdown(styled, unsafe_allow_html=True)
+
+    def __danger_warning(self):
+        # warn before searching regexes which can backtrack exponentially
+        if not self.__regex:
+            return
+        danger = PatternAnalysis.get_danger(self.__regex)
+        if danger is None:
+            return
+        engine = RegexEngine.choose(self.__regex, self.__engine)
+        if engine == "re":
+            advice = "Please set a time limit or install the package regex (pip install regex)."
+        else:
+            advice = f"It is searched with the engine {engine}."
+        st.warning(f"The regular expression contains {danger}, searching it can take "
+                   f"very long on some lines. {advice}")
+
     @staticmethod
     def __no_matches():
         styled = f"""
@@ -181,9 +253,13 @@ class SearchAlign:
         # Get the list of files in the directory
         file_list = os.listdir(directory)
         # Iterate through the files
-        for filename in file_list:
+        for filename in list(file_list):
             if filename == "-":
                 continue  # Skip deleting files named "-"
+            if filename.endswith(AlignmentIndex.SIDECAR_SUFFIX):
+                # Remove directories with sidecar files from the file_list
+                file_list.remove(filename)
+                continue
             filepath = os.path.join(directory, filename)
             # Check if file is empty
             if os.path.getsize(filepath) == 0:
@@ -214,7 +290,7 @@ class SearchAlign:
 
     def __parse_file_name(self):
         pattern = re.compile(
-            r'_(\w{2})_(\w{2})_(\d+)(_parsed)?(_normal)?\.txt')
+            r'_(\w{2})_(\w{2})_(\d+)(_parsed)?(_normal)?\.txt(?:\.gz|\.zst|\.bgz)?')
         match = pattern.search(self.__search_file)
         if match:
             self.__search_src = match.group(1)
@@ -358,6 +434,11 @@ class SearchAlign:
                 st.text_input("Regular Expression (Python) for Searching the Data", key="regex")
             with col6:
                 st.checkbox("Make Search Case-Insensitive", key="ignore_case")
+            st.file_uploader("Or Upload a List of Regular Expressions (one per Line)",
+                             type=["txt"], key="regex_file",
+                             help="All regular expressions are searched in one pass "
+                                  "through the file. Files are created for each of them.")
+            self.__danger_warning()
             add_vertical_space(1)
             self.__no_regex()
             add_vertical_space(1)
@@ -375,111 +456,255 @@ class SearchAlign:
                     st.number_input(label="Number of Lines for Pre-Context", value=1, key="pre_context")
                     st.number_input(label="Number of Lines for Post-Context", value=1, key="post_context")
                     st.checkbox("Keep Annotations for Context", value=True, key="anno")
+                st.checkbox("Save Memory for Large Files", value=False, key="mapped",
+                            help="Searches the file without loading it into memory. "
+                                 "Only matches and their context are read.")
+                st.number_input(label="Number of Processes for Searching", value=1, min_value=1,
+                                max_value=os.cpu_count() or 1, key="workers",
+                                help="Large files can be searched in parallel on several cores.")
+                st.checkbox("Use Trigram Index", value=False, key="trigrams",
+                            help="Builds an index of the file once to search "
+                                 "only lines which can contain a match.")
+                if self.__parse_search == "parsed":
+                    st.checkbox("Use Columnar Store for Annotations", value=False, key="columnar",
+                                help="Converts the annotations of the file once into arrays "
+                                     "which are read instead of parsing the lines again.")
+                else:
+                    st.number_input(label="Memory Limit for Statistics in MB", value=0, min_value=0,
+                                    key="memory_limit",
+                                    help="Counts beyond the limit are stored on the hard drive, "
+                                         "the matches found are still kept in memory. "
+                                         "0 keeps all counts in memory.")
+                st.selectbox("Regex Engine", RegexEngine.get_available(), key="regex_engine",
+                             help="auto searches regular expressions which can take very "
+                                  "long on some lines with regex if installed, which can "
+                                  "be stopped. re2 needs linear time but matches \\w and "
+                                  "\\b only for ASCII characters.")
+                st.number_input(label="Time Limit for a Search in Seconds", value=0, min_value=0,
+                                key="search_timeout",
+                                help="The search is stopped after the limit. 0 for no limit.")
+                st.text_input("Search Server", value="", key="search_server",
+                              placeholder=f"http://127.0.0.1:{PORT}",
+                              help="Searches are run by a search server started with "
+                                   "python -m model.search_server, which keeps the files "
+                                   "loaded for all users. Leave empty to search here.")
+                if self.__server is None:
+                    st.number_input(label="Memory for Loaded Files in MB",
+                                    value=CorpusPool.MAX_BYTES // 1024 ** 2, min_value=0,
+                                    key="pool_memory",
+                                    help="Searched files are kept in memory for the next "
+                                         "searches, the least recently used files are dropped "
+                                         "first. 0 loads the file again for every search.")
+                    st.checkbox("Run Searches in Separate Processes", value=False, key="isolated",
+                                help="A search which needs too much memory or time is "
+                                     "stopped without affecting the app.")
+                    if self.__isolated:
+                        st.number_input(label="Memory Limit for a Search in MB", value=0,
+                                        min_value=0, key="worker_memory",
+                                        help="The search is stopped if its process uses more "
+                                             "memory. 0 for no limit.")
+                        st.number_input(label="CPU Time Limit for a Search in Seconds", value=0,
+                                        min_value=0, key="worker_cpu",
+                                        help="The search is stopped if its process uses more "
+                                             "CPU time. 0 for no limit.")
                 st.checkbox("Show Paths for Created Files", value=True, key="show_messages")
                 add_vertical_space(3)
                 st.button("Do the Search!", key="search",
                           on_click=self.__call_search_func)
 
+    @staticmethod
+    @st.cache_resource
+    def __get_jobs():
+        # one pool of background searches shared by all sessions
+        return SearchJobs(max_workers=max(2, (os.cpu_count() or 2) // 2))
+
+    @staticmethod
+    @st.cache_resource
+    def __get_pool():
+        # loaded alignment files shared by all sessions and reruns
+        return CorpusPool()
+
+    @staticmethod
+    @st.cache_resource
+    def __get_workers():
+        # worker processes for isolated searches, one for every background search
+        return SearchWorkers(processes=max(2, (os.cpu_count() or 2) // 2))
+
+    def __get_runner(self):
+        # searches run on the search server in thin-client mode
+        if self.__server is not None:
+            return SearchClient(self.__server)
+        return self.__get_jobs()
+
+    def __get_settings(self):
+        # everything a search job needs, jobs must not read the session state
+        settings = SearchRunner.get_settings(
+            self.__search_path, self.__regex, self.__search_path_results,
+            l1=str(self.__search_src).strip(), l2=str(self.__search_trg).strip(),
+            lang_mode=self.__lang_mode, mono_lang=str(self.__mono_lang).strip(),
+            caseinsensitive=self.__ignore_case, stats=self.__stats, context=self.__context,
+            parsed=False if self.__parse_search == "normal" else True,
+            pre_context=self.__pre_context, post_context=self.__post_context,
+            anno=self.__anno, mapped=self.__mapped, workers=self.__workers,
+            trigrams=self.__trigrams, columnar=self.__columnar,
+            memory_limit=self.__memory_limit, engine=self.__engine, timeout=self.__timeout,
+            show_messages=self.__show_messages)
+        if self.__regex_file is not None:
+            settings["regexes"] = BatchSearch.read_regexes(
+                self.__regex_file.getvalue().decode("utf-8"))
+        return settings
+
     def __call_search_func(self):
         scroll_top()
-        with st.spinner(self.__search_text):
-            time.sleep(5)
-            parse_param = False if self.__parse_search == "normal" else True
-            if not self.__stats and not self.__context:
-                self.__no_selection()
-            if self.__lang_mode == "monolingual":
-                mono_param = True if self.__mono_lang == self.__search_src \
-                    else False
-                if self.__context:
-                    mono_context = MonolingualContext(
-                        path=self.__search_path,
-                        regex=self.__regex,
-                        pre_context=self.__pre_context,
-                        post_context=self.__post_context,
-                        anno=True if self.__anno else False,
-                        src=mono_param,
-                        caseinsensitive=st.session_state["ignore_case"]
-                    )
-                    matches = mono_context.get_matches_context()
-                    if len(matches) > 0:
-                        self.__path_qual = mono_context.write_context_qual_mono(
-                            lang=str(self.__mono_lang).strip(),
-                            root_path=self.__search_path_results)
-                        self.__path_quant = mono_context.write_context_quant_mono(
-                            lang=str(self.__mono_lang).strip(),
-                            root_path=self.__search_path_results)
-
-                    else:
-                        scroll_top()
-                        self.__no_matches()
-                        return
-                if self.__stats:
-                    mono_matches = MonolingualStats(path=self.__search_path,
-                                                    regex=self.__regex,
-                                                    src=mono_param,
-                                                    parsed=parse_param,
-                                                    caseinsensitive=st.session_state["ignore_case"]
-                                                    )
-                    counts = mono_matches.get_counts()
-                    if counts:
-                        self.__path_stats = mono_matches.write_monolingual_stats(
-                            lang=str(self.__mono_lang).strip(),
-                            root_path=self.__search_path_results)
-                    else:
-                        scroll_top()
-                        self.__no_matches()
-                        return
-            elif self.__lang_mode == "bilingual":
-                if self.__context:
-                    bil_context = BilingualContext(
-                        path=self.__search_path,
-                        regex=self.__regex,
-                        pre_context=self.__pre_context,
-                        post_context=self.__post_context,
-                        anno=self.__anno,
-                        caseinsensitive=st.session_state["ignore_case"]
-                    )
-                    matches = bil_context.get_matches_context()
-                    if len(matches) > 0:
-                        self.__path_qual = bil_context.write_context_qual_bil(
-                            l1=str(self.__search_src).strip(), l2=str(self.__search_trg).strip(),
-                            root_path=self.__search_path_results)
-                        self.__path_quant = bil_context.write_context_quant_bil(
-                            l1=str(self.__search_src).strip(), l2=str(self.__search_trg).strip(),
-                            root_path=self.__search_path_results)
-                    else:
-                        scroll_top()
-                        self.__no_matches()
-                        return
-                if self.__stats:
-                    bil_matches = BilingualStats(path=self.__search_path,
-                                                 regex=self.__regex, src_aggregate=True,
-                                                 parsed=parse_param,
-                                                 caseinsensitive=st.session_state["ignore_case"])
-                    counts = bil_matches.get_counts()
-                    if counts:
-                        self.__path_stats = bil_matches.write_bilingual_stats(
-                            l1=str(self.__search_src).strip(),
-                            l2=str(self.__search_trg).strip(),
-                            root_path=self.__search_path_results)
-                    else:
-                        scroll_top()
-                        self.__no_matches()
-                        return
-        self.__messages()
-
-    def __messages(self):
+        if not self.__stats and not self.__context:
+            self.__no_selection()
+            return
+        settings = self.__get_settings()
+        if self.__server is not None:
+            try:
+                job_id = self.__get_runner().submit(settings)
+            except (OSError, ValueError) as error:
+                self.__server_error(error)
+                return
+        elif self.__isolated:
+            # every worker process keeps its own loaded files
+            job_id = self.__get_jobs().submit(self.__get_workers().run,
+                                              SearchRunner.get_function(settings), settings,
+                                              memory_limit=self.__worker_memory,
+                                              cpu_limit=self.__worker_cpu)
+        else:
+            pool = self.__get_pool()
+            pool.set_max_bytes(self.__pool_memory * 1024 ** 2)
+            job_id = self.__get_jobs().submit(SearchRunner.get_function(settings), settings,
+                                              pool=pool)
+        if settings["regexes"] is not None:
+            label = f"{len(settings['regexes'])} regular expressions"
+        else:
+            label = settings["regex"]
+        self.__add_job(job_id, f"{label} in {os.path.basename(settings['search_path'])}")
+
+    @staticmethod
+    def __add_job(job_id, label):
+        st.session_state.setdefault("search_jobs", []).append(job_id)
+        st.session_state.setdefault("search_job_labels", {})[job_id] = label
+
+    def __call_runner(self, function, job_id):
+        # the search server can be stopped or restarted between two reruns
+        try:
+            return function(job_id)
+        except KeyError:
+            # search is unknown, e.g. to a restarted server
+            return None
+        except (OSError, ValueError) as error:
+            self.__server_error(error)
+            return None
+
+    def __cancel_job(self, job_id):
+        self.__call_runner(self.__get_runner().cancel, job_id)
+
+    def __resubmit(self, job_id):
+        labels = st.session_state.get("search_job_labels", {})
+        new_id = self.__call_runner(self.__get_runner().resubmit, job_id)
+        if new_id is not None:
+            self.__add_job(new_id, labels.get(job_id, ""))
+
+    def __remove_job(self, job_id):
+        self.__call_runner(self.__get_runner().remove, job_id)
+        st.session_state["search_jobs"].remove(job_id)
+
+    def __show_jobs(self):
+        """ Show progress and results of the searches of this session
+
+        @return: True if a search is still running
+        """
+        jobs = self.__get_runner()
+        try:
+            job_ids = [job_id for job_id in st.session_state.get("search_jobs", [])
+                       if jobs.has_job(job_id)]
+        except (OSError, ValueError) as error:
+            self.__server_error(error)
+            return False
+        st.session_state["search_jobs"] = job_ids
+        labels = st.session_state.get("search_job_labels", {})
+        running = False
+        for job_id in reversed(job_ids):
+            status = self.__call_runner(jobs.get_status, job_id)
+            if status is None:
+                continue
+            add_vertical_space(1)
+            st.markdown(f"**Search {job_id}** ({labels.get(job_id, '')}): {status['state']}")
+            if status["state"] in ("queued", "running"):
+                running = True
+                fraction = status["lines"] / status["total"] if status["total"] else 0.0
+                st.progress(min(fraction, 1.0),
+                            text=f"{status['stage']}: {status['lines']:,} lines scanned, "
+                                 f"{status['matches']:,} matches found")
+                st.button("Cancel", key=f"cancel_{job_id}", on_click=self.__cancel_job,
+                          args=(job_id,))
+                continue
+            if status["state"] == "done":
+                self.__show_result(status["result"])
+            elif status["state"] == "failed":
+                st.error(f"The search failed: {status['error']}")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.button("Search Again", key=f"resubmit_{job_id}", on_click=self.__resubmit,
+                          args=(job_id,))
+            with col2:
+                st.button("Remove", key=f"remove_{job_id}", on_click=self.__remove_job,
+                          args=(job_id,))
+        return running
+
+    def __show_result(self, result):
+        if "batch" in result:
+            if not any(result["batch"].values()):
+                self.__no_matches()
+            elif result["show_messages"]:
+                self.__message_file_creation_batch(result["batch"])
+        elif result["no_matches"]:
+            self.__no_matches()
+        else:
+            self.__messages(result)
+
+    @staticmethod
+    def __message_file_creation_batch(paths):
+        created = "<br>".join(f"{os.path.abspath(path)}"
+                              for regex_paths in paths.values()
+                              for path in regex_paths)
+        without = "<br>".join(regex for regex, regex_paths in paths.items()
+                              if not regex_paths)
+        styled = f"""
+              <div style="background-color: rgba(50, 205, 50, 0.5);
+              padding: 10px; 
+              border-radius: 5px;
+              color: black;">
+                  <b>The search was successful</b>.
+                  <br>
+                  <br>
+                  The following files have been generated:
+                  <br>
+                  {created}
+                  <br>
+                  <br>
+                  There are no search results for:
+                  <br>
+                  {without if without else "-"}
+              </div>
+              """
+        st.markdown(styled, unsafe_allow_html=True)
+
+    def __messages(self, result):
         # only show messages and paths if selected
-        if self.__show_messages:
-            scroll_top()
-            if self.__context and self.__stats:
-                self.__message_file_creation_all(path_stats=self.__path_stats,
-                                                 path_quant=self.__path_quant,
-                                                 path_qual=self.__path_qual)
-            elif self.__stats:
-                self.__message_file_creation_stats(path=self.__path_stats)
-            elif self.__context:
-                self.__message_file_creation_context(path_qual=self.__path_qual, path_quant=self.__path_quant)
+        if result["show_messages"]:
+            if result["context"] and result["stats"]:
+                self.__message_file_creation_all(path_stats=result["path_stats"],
+                                                 path_quant=result["path_quant"],
+                                                 path_qual=result["path_qual"])
+            elif result["stats"]:
+                self.__message_file_creation_stats(path=result["path_stats"])
+            elif result["context"]:
+                self.__message_file_creation_context(path_qual=result["path_qual"],
+                                                     path_quant=result["path_quant"])
 
     @staticmethod
     def __assign_paths_harddrive(st, source_files=True):
@@ -514,6 +739,10 @@ class SearchAlign:
         info_external_hard_drive(st, page="search")
         add_vertical_space(2)
         self.__handle_search()
+        # poll running searches until they are finished
+        if self.__show_jobs():
+            time.sleep(1)
+            st.rerun()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import unittest
 import pandas as pd
 from model.bilingual_context import BilingualContext
 from model.bilingual_statistics import BilingualStats
+from model.processing import Preprocessing, Processing
 
 
 class BilContextMethods(unittest.TestCase):
@@ -33,5 +34,46 @@ class TestCombo(unittest.TestCase):
         self.assertEqual(len(bil_context), bil_stats['Count_Alignment'].sum())
 
 
+class TestPositions(unittest.TestCase):
+    def test_context_positions(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        context = BilingualContext(path=path, regex=r"Comment", pre_context=2, post_context=2,
+                                   anno=True)
+        path_context = context.write_context_quant_bil(l1="French", l2="Spanish",
+                                                       root_path="../data/search_results/")
+        bil_context = pd.read_csv(path_context).fillna("")
+        # (src) lines with their file pairs
+        text_list = Preprocessing(path).get_text_list()
+        blocks, labels = Processing.get_block_map(text_list)
+        src_lines = [(line.strip("\n"), labels[blocks[index]])
+                     for index, line in enumerate(text_list) if line.startswith("(src)")]
+        for _, row in bil_context.iterrows():
+            pre, match, post = [[line for line in row[column].split("\n") if line]
+                                for column in bil_context.columns[1:4]]
+            lines = pre + match + post
+            # repeated lines must not be taken from another position in the file
+            self.assertTrue(any([line for line, _ in src_lines[start:start + len(lines)]] == lines
+                                and src_lines[start + len(pre)][1] == row["Files"]
+                                for start in range(len(src_lines) - len(lines) + 1)))
+
+
+class TestStreaming(unittest.TestCase):
+    def test_streaming_stats(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        for src_aggregate in (False, True):
+            path_stats = BilingualStats(path=path, regex=r"Comment", src_aggregate=src_aggregate
+                                        ).write_bilingual_stats(l1="French", l2="Spanish",
+                                                                root_path="../data/search_results/")
+            bil_stats = pd.read_csv(path_stats)
+            # small limit to spill partial counts to disk
+            path_streaming = BilingualStats(path=path, regex=r"Comment",
+                                            src_aggregate=src_aggregate, memory_limit=1000
+                                            ).write_bilingual_stats(l1="French", l2="Spanish",
+                                                                    root_path="../data/search_results/")
+            streaming_stats = pd.read_csv(path_streaming)
+
+            pd.testing.assert_frame_equal(bil_stats, streaming_stats)
+
+
 if __name__ == "__main__":
     unittest.main()
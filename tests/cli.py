@@ -0,0 +1,39 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from model.monolingual_statistics import MonolingualStats
+from model import cli
+
+
+class TestCli(unittest.TestCase):
+    def test_cli_search(self):
+        # corpus, manifest and results in a temporary directory
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy("../data/generated/alignments_fr_es_500_parsed.txt", path)
+            path_stats = MonolingualStats(path=path, regex=r"Comment", parsed=True, src=True
+                                          ).write_monolingual_stats(lang="French",
+                                                                    root_path=directory)
+            mono_stats = pd.read_csv(path_stats)
+            manifest = os.path.join(directory, "manifest.csv")
+            pd.DataFrame({"file": ["alignments_fr_es_500_parsed.txt"] * 2,
+                          "regex": [r"Comment", r"zzz"], "mode": ["monolingual"] * 2,
+                          "lang": ["fr"] * 2, "context": [False] * 2}).to_csv(manifest, index=False)
+            with contextlib.redirect_stdout(io.StringIO()):
+                failed = cli.main(["search", manifest, "--gen-path", directory,
+                                   "--root-path", directory])
+            cli_stats = pd.read_csv(path_stats)
+
+            self.assertEqual(failed, 0)
+            pd.testing.assert_frame_equal(mono_stats, cli_stats)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
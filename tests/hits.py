@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from model.alignment_index import AlignmentIndex
+from model.hit_list import HitList
+from model.monolingual_context import MonolingualContext
+from model.regex_engine import RegexEngine
+from model.search_runner import SearchRunner
+
+
+class TestHits(unittest.TestCase):
+    def test_hits_context(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        path_hits = HitList.write_hit_list(HitList.get_path(path, r"Comment", r'\(src\)="[0-9]+">'),
+                                           path, r"Comment", r'\(src\)="[0-9]+">')
+        # hit lists of regexes with the same file name part are kept apart
+        self.assertNotEqual(path_hits, HitList.get_path(path, r"Comment.", r'\(src\)="[0-9]+">'))
+        hits = HitList.find(path_hits, path, r"Comment", r'\(src\)="[0-9]+">')
+        self.assertIsNotNone(hits)
+        self.assertIsNone(HitList.find(path_hits, path, r"Comment", r'\(src\)="[0-9]+">',
+                                       caseinsensitive=True))
+        # other window sizes are written from the hit list alone
+        path_context = MonolingualContext(path=path, regex=r"Comment", pre_context=3,
+                                          post_context=1, anno=False
+                                          ).write_context_quant_mono(lang="French",
+                                                                     root_path="../data/search_results/")
+        mono_context = pd.read_csv(path_context)
+        path_hits_context = MonolingualContext(path=path, regex=r"Comment", pre_context=3,
+                                               post_context=1, anno=False, search=hits
+                                               ).write_context_quant_mono(lang="French",
+                                                                          root_path="../data/search_results/")
+        hits_context = pd.read_csv(path_hits_context)
+
+        pd.testing.assert_frame_equal(mono_context, hits_context)
+
+    @unittest.skipIf("re2" not in RegexEngine.get_available(), "re2 is not installed")
+    def test_hits_engines(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy("../data/generated/alignments_fr_es_500_parsed.txt", path)
+
+            def run(engine):
+                # re2 matches \b and \w only for ASCII characters, so not before é
+                settings = SearchRunner.get_settings(path, r"\bé\w+", directory, l1="French",
+                                                     l2="Spanish", lang_mode="monolingual",
+                                                     context=False, engine=engine)
+                result = SearchRunner.run(settings)
+                return None if result["no_matches"] else pd.read_csv(result["path_stats"])
+
+            self.assertIsNone(run("re2"))
+            cached_stats = run("re")
+            shutil.rmtree(f"{path}{AlignmentIndex.SIDECAR_SUFFIX}")
+            self.assertIsNotNone(cached_stats)
+            pd.testing.assert_frame_equal(cached_stats, run("re"))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
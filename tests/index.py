@@ -0,0 +1,224 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import unittest
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from model.alignment_index import AlignmentIndex
+from model.annotation_index import AnnotationIndex
+from model.block_container import BlockContainer
+from model.columnar_store import ColumnarStore
+from model.corpus_pool import CorpusPool
+from model.mapped_search import MappedSearch
+from model.monolingual_statistics import MonolingualStats
+from model.pattern_analysis import PatternAnalysis
+from model.processing import Preprocessing, Processing
+from model.regex_engine import RegexEngine, RegexTimeout
+
+
+class IndexMethods(unittest.TestCase):
+    path = "../data/generated/alignments_fr_es_500_parsed.txt"
+
+    def test_read_lines(self):
+        index = AlignmentIndex(self.path)
+        with open(self.path, "r", encoding="utf-8") as file_in:
+            lines = [line.strip("\n") for line in file_in]
+        self.assertEqual(index.get_line_count(), len(lines))
+        numbers = [len(lines) - 1, 0, len(lines) // 2]
+        self.assertEqual(index.read_lines(numbers), [lines[i] for i in numbers])
+
+    def test_segment_ranges(self):
+        index = AlignmentIndex(self.path)
+        with open(self.path, "r", encoding="utf-8") as file_in:
+            lines = [line.strip("\n") for line in file_in]
+        src = [i for i, line in enumerate(lines) if line.startswith("(src)")]
+        first, last = index.get_segment_ranges(src)
+        for line, start, end in zip(src, first, last):
+            self.assertTrue(lines[start - 1].startswith("="))
+            self.assertTrue(lines[end + 1].startswith("="))
+            self.assertFalse(any(elem.startswith("=") for elem in lines[start:end + 1]))
+            self.assertTrue(start <= line <= end)
+
+    def test_line_numbers(self):
+        search = MappedSearch(self.path)
+        count = search.get_index().get_line_count()
+        self.assertEqual(search.get_line(-1), search.get_line(count - 1))
+        self.assertEqual(search.get_line(-count), search.get_line(0))
+        for number in (count, -count - 1):
+            with self.assertRaises(IndexError):
+                search.get_line(number)
+        self.assertEqual(AlignmentIndex.get_pattern_kind(re.compile(r'\(trg\)="[0-9]+">')),
+                         AlignmentIndex.TRG)
+        with self.assertRaises(ValueError):
+            AlignmentIndex.get_pattern_kind(re.compile(r'\(src\)'))
+
+    def test_rebuild_on_change(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy(self.path, path)
+            sidecar = AlignmentIndex.sidecar_path(path, "segments.npz")
+            self.assertFalse(os.path.exists(os.path.dirname(sidecar)))
+            count = AlignmentIndex(path).get_line_count()
+            self.assertTrue(os.path.exists(sidecar))
+            with open(path, "a", encoding="utf-8") as file_out:
+                file_out.write("(src)=\"1\">Oui\n")
+            self.assertEqual(AlignmentIndex(path).get_line_count(), count + 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_trigram_candidates(self):
+        search = MappedSearch(self.path)
+        indexed = MappedSearch(self.path, trigrams=True)
+        last = search.get_index().get_line_count()
+        for regex, caseinsensitive in [("Comment", False), ("comment", True),
+                                       ("Qu(oi|e)", False), ("a.c", False)]:
+            self.assertEqual(
+                indexed.search_range(regex, caseinsensitive, AlignmentIndex.SRC, 0, last),
+                search.search_range(regex, caseinsensitive, AlignmentIndex.SRC, 0, last))
+
+    def test_annotation_lines(self):
+        index = AnnotationIndex(self.path)
+        with open(self.path, "r", encoding="utf-8") as file_in:
+            lines = [line.strip("\n") for line in file_in]
+        expected = [i for i, line in enumerate(lines)
+                    if line.startswith("(src)") and "_#NOUN_#diable" in line]
+        found = [i for i in index.get_lines({"lemma": "diable", "POS": "NOUN"})
+                 if lines[i].startswith("(src)")]
+        self.assertEqual(found, expected)
+        # exactly one of regex and query
+        for kwargs in ({}, {"regex": "diable", "query": {"lemma": "diable"}}):
+            with self.assertRaises(ValueError):
+                MonolingualStats(path=self.path, **kwargs)
+        for query in ("diable", {}):
+            with self.assertRaises(ValueError):
+                index.get_lines(query)
+
+    def test_columnar_annotations(self):
+        store = ColumnarStore(self.path)
+        with open(self.path, "r", encoding="utf-8") as file_in:
+            lines = [line.strip("\n") for line in file_in]
+        for number, line in enumerate(lines):
+            if not line.startswith("(src)") and not line.startswith("(trg)"):
+                self.assertFalse(store.is_regular(number))
+                continue
+            text = line[line.index(">") + 1:]
+            self.assertEqual(store.get_annotations(number),
+                             AnnotationIndex.split_annotations(text))
+            self.assertEqual(store.get_line_key(number),
+                             " ".join(elem.split("_#")[0] for elem in line.split()))
+
+    def test_compressed_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt.gz")
+            with open(self.path, "rb") as file_in, gzip.open(path, "wb") as file_out:
+                shutil.copyfileobj(file_in, file_out)
+            lines = Preprocessing(self.path).get_raw_text_list()
+            self.assertEqual(Preprocessing(path).get_raw_text_list(), lines)
+            numbers = [len(lines) - 1, 0, len(lines) // 2]
+            self.assertEqual(AlignmentIndex(path).read_lines(numbers), [lines[i] for i in numbers])
+            self.assertEqual(MappedSearch(path).get_lines(numbers),
+                             MappedSearch(self.path).get_lines(numbers))
+            # worker processes map the same decompressed copy
+            self.assertEqual(MonolingualStats(path=path, regex=r"Comment", mapped=True,
+                                              workers=2).get_counts(),
+                             MonolingualStats(path=self.path, regex=r"Comment").get_counts())
+        finally:
+            shutil.rmtree(directory)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt.zst")
+            with open(self.path, "rb") as file_in, zstandard.open(path, "wb") as file_out:
+                shutil.copyfileobj(file_in, file_out)
+            lines = Preprocessing(self.path).get_raw_text_list()
+            self.assertEqual(Preprocessing(path).get_raw_text_list(), lines)
+            numbers = [len(lines) - 1, 0, len(lines) // 2]
+            self.assertEqual(AlignmentIndex(path).read_lines(numbers), [lines[i] for i in numbers])
+            self.assertEqual(MappedSearch(path).get_lines(numbers),
+                             MappedSearch(self.path).get_lines(numbers))
+            self.assertEqual(MonolingualStats(path=path, regex=r"Comment", parsed=True).get_counts(),
+                             MonolingualStats(path=self.path, regex=r"Comment",
+                                              parsed=True).get_counts())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_block_container(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = BlockContainer.write_container(
+                self.path, os.path.join(directory, "alignments_fr_es_500_parsed.txt.bgz"),
+                block_size=4096)
+            container = BlockContainer(path)
+            lines = Preprocessing(self.path).get_raw_text_list()
+            self.assertGreater(container.get_block_count(), 1)
+            self.assertEqual(Preprocessing(path).get_raw_text_list(), lines)
+            numbers = [len(lines) - 1, 0, len(lines) // 2]
+            self.assertEqual(container.read_lines(numbers), [lines[i] for i in numbers])
+            # blocks end after separators
+            starts = [i for i in range(1, len(lines)) if container.get_blocks([i])[0] !=
+                      container.get_blocks([i - 1])[0]]
+            self.assertTrue(all(lines[i - 1].startswith("=") for i in starts))
+            self.assertEqual(MappedSearch(path).get_lines(numbers),
+                             MappedSearch(self.path).get_lines(numbers))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_corpus_pool(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy(self.path, path)
+            pool = CorpusPool()
+            corpus = pool.get(path, Preprocessing)
+            self.assertIs(pool.get(path, Preprocessing), corpus)
+            self.assertIsNot(pool.get(path, MappedSearch, workers=1), corpus)
+            self.assertEqual(pool.get_size(), corpus.get_memory_size() +
+                             pool.get(path, MappedSearch, workers=1).get_memory_size())
+            # least recently used corpus is dropped first
+            pool.get(path, Preprocessing)
+            pool.set_max_bytes(corpus.get_memory_size())
+            self.assertEqual(len(pool), 1)
+            self.assertIs(pool.get(path, Preprocessing), corpus)
+            # changed file is loaded again
+            with open(path, "a", encoding="utf-8") as file_out:
+                file_out.write("(src)=\"1\">Oui\n")
+            changed = pool.get(path, Preprocessing)
+            self.assertIsNot(changed, corpus)
+            self.assertEqual(len(changed.get_raw_text_list()), len(corpus.get_raw_text_list()) + 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_regex_engines(self):
+        self.assertIsNotNone(PatternAnalysis.get_danger(r"(\w+\s?)*!"))
+        self.assertIsNotNone(PatternAnalysis.get_danger(r"(a|ab)*c"))
+        self.assertIsNone(PatternAnalysis.get_danger(r"Comment (vas|allez)-\w+"))
+        # re2 matches \w only for ASCII characters and is never chosen by auto
+        self.assertIn(RegexEngine.choose(r"(\w+\s?)*!"), ("regex", "re"))
+        self.assertEqual(RegexEngine.choose(r"(\w+\s?)*!", "re2"), "re2")
+        text_list = Preprocessing(self.path).get_text_list()
+        src_pattern = re.compile(r'\(src\)="[0-9]+">')
+        expected = Processing.get_matches_index_files(text_list, r"Comment", src_pattern)
+        for engine in RegexEngine.get_available():
+            self.assertEqual(Processing.get_matches_index_files(
+                text_list, r"Comment", src_pattern, engine=engine, timeout=60), expected)
+
+    @unittest.skipIf("regex" not in RegexEngine.get_available(), "regex is not installed")
+    def test_regex_timeout(self):
+        # backtracks exponentially on the long line
+        text_list = ["# fr/1.xml.gz\n", "(src)=\"1\">" + "a" * 40 + "\n"]
+        src_pattern = re.compile(r'\(src\)="[0-9]+">')
+        with self.assertRaises(RegexTimeout):
+            Processing.get_matches_index_files(text_list, r"(a|aa)+b", src_pattern,
+                                               engine="regex", timeout=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
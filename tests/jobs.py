@@ -0,0 +1,32 @@
+import time
+import unittest
+from model.monolingual_statistics import MonolingualStats
+from model.search_session import SearchSession
+from model.search_jobs import JobCancelled, JobProgress, SearchJobs
+
+
+class TestJobs(unittest.TestCase):
+    def test_job_stats(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        counts = MonolingualStats(path=path, regex=r"Comment", parsed=True).get_counts()
+        jobs = SearchJobs(max_workers=1)
+        job_id = jobs.submit(lambda progress: MonolingualStats(
+            path=path, regex=r"Comment", parsed=True,
+            search=SearchSession(path, progress=progress)).get_counts())
+        while jobs.get_status(job_id)["state"] in ("queued", "running"):
+            time.sleep(0.01)
+        status = jobs.get_status(job_id)
+
+        self.assertEqual(status["state"], "done")
+        self.assertEqual(status["result"], counts)
+        self.assertEqual(status["lines"], status["total"])
+
+    def test_job_cancelled(self):
+        progress = JobProgress()
+        progress.cancel()
+        with self.assertRaises(JobCancelled):
+            SearchSession("../data/generated/alignments_fr_es_500_parsed.txt", progress=progress)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from model.line_table import InternedLines, LineTable
+from model.processing import Preprocessing, Processing
+
+
+class TestLineTable(unittest.TestCase):
+    def test_interned_counts(self):
+        text_list = Preprocessing("../data/generated/alignments_fr_es_500_parsed.txt").get_text_list()
+        matches = [line for line in text_list if line.startswith("(src)")]
+        table = LineTable()
+        ids = table.add_all(matches)
+        # same counts in same order as counting the strings
+        self.assertEqual(list(Processing.get_counts(ids, [table]).items()),
+                         list(Processing.get_counts(matches).items()))
+        pairs = list(zip(matches, reversed(matches)))
+        pair_ids = [[table.add(src), table.add(trg)] for src, trg in pairs]
+        self.assertEqual(list(Processing.get_counts(pair_ids, [table, table]).items()),
+                         list(Processing.get_counts(pairs).items()))
+
+    def test_interned_lines(self):
+        with open("../data/generated/alignments_fr_es_500_parsed.txt", encoding="utf-8") as file_in:
+            lines = file_in.read().split("\n")
+        interned = InternedLines.from_lines(lines)
+        body = next(line for line in lines if line.startswith("(src)")).split(">", 1)[1]
+        # same body under another line number is stored once
+        renumbered = InternedLines.from_lines(lines + ['(src)="99999">' + body])
+
+        self.assertEqual(interned, lines)
+        self.assertEqual(interned[5:9], lines[5:9])
+        self.assertEqual(interned[-1], lines[-1])
+        self.assertEqual(renumbered.map_bodies(str.upper)[-1],
+                         '(src)="99999">' + body.upper())
+        self.assertLess(renumbered.get_memory_size() - interned.get_memory_size(), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
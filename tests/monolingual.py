@@ -1,7 +1,16 @@
+import ast
+import os
+import re
+import shutil
+import tempfile
 import unittest
 import pandas as pd
+from model.bilingual_context import BilingualContext
 from model.monolingual_context import MonolingualContext
 from model.monolingual_statistics import MonolingualStats
+from model.batch_search import BatchSearch
+from model.processing import Preprocessing, Processing
+from model.search_session import SearchSession
 
 
 class BilContextMethods(unittest.TestCase):
@@ -27,5 +36,163 @@ class TestCombo(unittest.TestCase):
         self.assertEqual(len(mono_context), mono_stats['Count_Match'].sum())
 
 
+class TestMapped(unittest.TestCase):
+    def test_mapped_context(self):
+        path_context = MonolingualContext(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                          regex=r"Comment", pre_context=4, post_context=5, anno=True
+                                          ).write_context_quant_mono(lang="French",
+                                                                     root_path="../data/search_results/")
+        mono_context = pd.read_csv(path_context)
+        path_mapped = MonolingualContext(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                         regex=r"Comment", pre_context=4, post_context=5, anno=True,
+                                         mapped=True
+                                         ).write_context_quant_mono(lang="French",
+                                                                    root_path="../data/search_results/")
+        mapped_context = pd.read_csv(path_mapped)
+
+        pd.testing.assert_frame_equal(mono_context, mapped_context)
+
+    def test_parallel_files(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        directory = tempfile.mkdtemp()
+        files = {}
+        try:
+            for workers, trigrams in ((1, False), (2, False), (2, True)):
+                name = os.path.join(directory, f"parallel_{workers}_{trigrams}")
+                context = BilingualContext(path=path, regex=r"Comment|diable", pre_context=2,
+                                           post_context=2, anno=True, mapped=True,
+                                           workers=workers, trigrams=trigrams)
+                stats = MonolingualStats(path=path, regex=r"Comment|diable", parsed=False,
+                                         mapped=True, workers=workers, trigrams=trigrams)
+                paths = [context.write_context_qual_bil("French", "Spanish", path=f"{name}.txt"),
+                         context.write_context_quant_bil("French", "Spanish", path=f"{name}.csv"),
+                         stats.write_monolingual_stats("French", path=f"{name}_stats.csv")]
+                files[workers, trigrams] = []
+                for elem in paths:
+                    with open(elem, "rb") as file_in:
+                        files[workers, trigrams].append(file_in.read())
+        finally:
+            shutil.rmtree(directory)
+
+        # parallel searches write byte-identical files
+        self.assertEqual(files[2, False], files[1, False])
+        self.assertEqual(files[2, True], files[1, False])
+
+
+class TestBatch(unittest.TestCase):
+    def test_batch_stats(self):
+        path_stats = MonolingualStats(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                      regex=r"Comment", parsed=True, src=True
+                                      ).write_monolingual_stats(lang="French",
+                                                                root_path="../data/search_results/")
+        mono_stats = pd.read_csv(path_stats)
+        paths = BatchSearch("../data/generated/alignments_fr_es_500_parsed.txt",
+                            [r"Comment", r"diable", r"zzz"]
+                            ).write_monolingual(lang="French", root_path="../data/search_results/",
+                                                context=False, parsed=True)
+        batch_stats = pd.read_csv(paths[r"Comment"][0])
+
+        pd.testing.assert_frame_equal(mono_stats, batch_stats)
+        self.assertEqual(paths[r"zzz"], [])
+
+    def test_batch_file_names(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        # both regexes are "Comment" without special characters
+        paths = BatchSearch(path, [r"Comment.", r"Comment"]
+                            ).write_monolingual(lang="French", root_path="../data/search_results/",
+                                                parsed=True)
+        batch_stats = {regex: pd.read_csv(paths[regex][2]) for regex in paths}
+
+        self.assertEqual(len(set(paths[r"Comment."]) | set(paths[r"Comment"])), 6)
+        for regex in paths:
+            path_stats = MonolingualStats(path=path, regex=regex, parsed=True, src=True
+                                          ).write_monolingual_stats(lang="French",
+                                                                    root_path="../data/search_results/")
+            self.assertEqual(paths[regex][2], path_stats)
+            pd.testing.assert_frame_equal(batch_stats[regex], pd.read_csv(path_stats))
+
+
+class TestSession(unittest.TestCase):
+    def test_session_context(self):
+        path_context = MonolingualContext(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                          regex=r"Comment", pre_context=2, post_context=3, anno=False
+                                          ).write_context_quant_mono(lang="French",
+                                                                     root_path="../data/search_results/")
+        mono_context = pd.read_csv(path_context)
+        session = SearchSession("../data/generated/alignments_fr_es_500_parsed.txt")
+        # statistics search first, context takes matches from the session
+        MonolingualStats(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                         regex=r"Comment", parsed=True, search=session)
+        path_session = MonolingualContext(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                          regex=r"Comment", pre_context=2, post_context=3, anno=False,
+                                          search=session
+                                          ).write_context_quant_mono(lang="French",
+                                                                     root_path="../data/search_results/")
+        session_context = pd.read_csv(path_session)
+
+        pd.testing.assert_frame_equal(mono_context, session_context)
+
+
+class TestFilePairs(unittest.TestCase):
+    def test_file_pairs_unparsed(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        text_list = Preprocessing(path).get_text_list()
+        matches, _, files = Processing.get_matches_index_files(
+            text_list, r"Comment", re.compile(r'\(src\)="[0-9]+">'))
+        expected = {}
+        for match, file in zip(Processing.remove_annotation(matches, nested=False), files):
+            expected.setdefault(match, set()).add(file)
+        path_stats = MonolingualStats(path=path, regex=r"Comment", parsed=False, src=True
+                                      ).write_monolingual_stats(lang="French",
+                                                                root_path="../data/search_results/")
+        mono_stats = pd.read_csv(path_stats, keep_default_na=False)
+        file_pairs = [ast.literal_eval(elem) for elem in mono_stats["File_Pairs"]]
+
+        self.assertEqual(dict(zip(mono_stats["Match French"], file_pairs)), expected)
+        self.assertEqual(mono_stats["File_Count"].tolist(), [len(elem) for elem in file_pairs])
+        self.assertGreater(mono_stats["File_Count"].max(), 1)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_streaming_stats(self):
+        path_stats = MonolingualStats(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                      regex=r"Comment", parsed=False, src=True
+                                      ).write_monolingual_stats(lang="French",
+                                                                root_path="../data/search_results/")
+        mono_stats = pd.read_csv(path_stats)
+        # small limit to spill partial counts to disk
+        path_streaming = MonolingualStats(path="../data/generated/alignments_fr_es_500_parsed.txt",
+                                          regex=r"Comment", parsed=False, src=True,
+                                          memory_limit=1000
+                                          ).write_monolingual_stats(lang="French",
+                                                                    root_path="../data/search_results/")
+        streaming_stats = pd.read_csv(path_streaming)
+
+        pd.testing.assert_frame_equal(mono_stats, streaming_stats)
+        self.assertGreater(mono_stats["File_Count"].max(), 1)
+
+
+class TestContextWindows(unittest.TestCase):
+    def test_context_files(self):
+        path = "../data/generated/alignments_fr_es_500_parsed.txt"
+        path_context = MonolingualContext(path=path, regex=r"Comment", pre_context=50,
+                                          post_context=50, anno=True
+                                          ).write_context_quant_mono(lang="French",
+                                                                     root_path="../data/search_results/")
+        mono_context = pd.read_csv(path_context).fillna("")
+        # lines of every file pair
+        text_list = Preprocessing(path).get_text_list()
+        blocks, labels = Processing.get_block_map(text_list)
+        file_lines = {}
+        for index, line in enumerate(text_list):
+            file_lines.setdefault(labels[blocks[index]], set()).add(line.strip("\n"))
+        for pre, post, files in zip(mono_context.iloc[:, 1], mono_context.iloc[:, 3],
+                                    mono_context["Files"]):
+            # context does not reach into other files
+            for line in pre.split("\n") + post.split("\n"):
+                if line:
+                    self.assertIn(line, file_lines[files])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import pandas as pd
+from model.monolingual_statistics import MonolingualStats
+from model.search_runner import SearchRunner
+from model.search_server import SearchClient, SearchServer
+
+
+class TestServer(unittest.TestCase):
+    def test_server_stats(self):
+        # copy of the corpus, so no hit list of another test is reused
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy("../data/generated/alignments_fr_es_500_parsed.txt", path)
+            path_stats = MonolingualStats(path=path, regex=r"Comment", parsed=True, src=True
+                                          ).write_monolingual_stats(lang="French",
+                                                                    root_path=directory)
+            mono_stats = pd.read_csv(path_stats)
+            server = SearchServer(port=0, root_paths=(directory,), data_paths=(directory,))
+            server.start()
+            try:
+                client = SearchClient(server.get_url())
+                settings = SearchRunner.get_settings(path, r"Comment", directory,
+                                                     l1="French", l2="Spanish",
+                                                     lang_mode="monolingual", context=False,
+                                                     parsed=True)
+                job_id = client.submit(settings)
+                while client.get_status(job_id)["state"] in ("queued", "running"):
+                    time.sleep(0.01)
+                status = client.get_status(job_id)
+                self.assertEqual(status["state"], "done")
+                self.assertEqual(client.get_server_status()["corpora"], 1)
+                client.remove(job_id)
+                self.assertFalse(client.has_job(job_id))
+                # settings are checked before the search is started
+                with self.assertRaises(ValueError):
+                    client.submit(dict(settings, root_path=".."))
+                with self.assertRaises(ValueError):
+                    client.submit({key: value for key, value in settings.items() if key != "l1"})
+                # only alignment files in the data paths are searched
+                with self.assertRaises(ValueError):
+                    client.submit(dict(settings, search_path=os.path.abspath(__file__)))
+            finally:
+                server.shutdown()
+            server_stats = pd.read_csv(status["result"]["path_stats"])
+
+            pd.testing.assert_frame_equal(mono_stats, server_stats)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
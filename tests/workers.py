@@ -0,0 +1,52 @@
+import ast
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from model.monolingual_statistics import MonolingualStats
+from model.search_jobs import JobCancelled, JobProgress
+from model.search_runner import SearchRunner
+from model.search_workers import SearchWorkers, WorkerLimitExceeded
+
+
+class TestWorkers(unittest.TestCase):
+    def test_worker_stats(self):
+        # copy of the corpus, so no hit list of another test is reused
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "alignments_fr_es_500_parsed.txt")
+            shutil.copy("../data/generated/alignments_fr_es_500_parsed.txt", path)
+            path_stats = MonolingualStats(path=path, regex=r"Comment", parsed=True, src=True
+                                          ).write_monolingual_stats(lang="French",
+                                                                    root_path=directory)
+            mono_stats = pd.read_csv(path_stats)
+            workers = SearchWorkers(processes=1)
+            try:
+                settings = SearchRunner.get_settings(path, r"Comment", directory,
+                                                     l1="French", l2="Spanish",
+                                                     lang_mode="monolingual", context=False,
+                                                     parsed=True)
+                # far less memory than the worker process needs, stopped before the
+                # search has written its hit list
+                with self.assertRaises(WorkerLimitExceeded):
+                    workers.run(SearchRunner.run, settings, memory_limit=1024 ** 2)
+                progress = JobProgress()
+                progress.cancel()
+                with self.assertRaises(JobCancelled):
+                    workers.run(SearchRunner.run, settings, progress=progress)
+                result = workers.run(SearchRunner.run, settings, progress=JobProgress())
+            finally:
+                workers.shutdown()
+            worker_stats = pd.read_csv(result["path_stats"])
+            # sets of file pairs are written in the order of the worker's string hashes
+            for stats in (mono_stats, worker_stats):
+                stats["File_Pairs"] = stats["File_Pairs"].map(ast.literal_eval)
+
+            pd.testing.assert_frame_equal(mono_stats, worker_stats)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()